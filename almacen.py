@@ -0,0 +1,518 @@
+import os
+import sys
+import json
+import mmap
+import time
+import zlib
+import struct
+import threading
+from collections import OrderedDict
+
+################################################
+# Parámetros del almacén de bloques
+################################################
+
+# Bytes máximos de cada segmento antes de abrir el siguiente
+TAMANO_SEGMENTO = 64 * 1024 * 1024
+# Bloques escritos entre fsync
+LOTE_FSYNC = 32
+# Segundos máximos entre fsync mientras se escriben bloques
+INTERVALO_FSYNC = 1
+
+# Registro en segmento: longitud y CRC32 del contenido, seguidos del contenido
+FORMATO_REGISTRO = struct.Struct(">II")
+# Entrada del índice por altura: segmento, desplazamiento y longitud del contenido
+FORMATO_INDICE = struct.Struct(">IQI")
+
+NOMBRE_INDICE = "indice.dat"
+
+# Bloques decodificados del almacén que se mantienen en memoria
+MAXIMO_CACHE_BLOQUES = 256
+# Bloques cargados y descartados en reorganizaciones que se conservan para las copias anteriores
+MAXIMO_BLOQUES_CONSERVADOS = 1024
+
+
+def guardar_json(ruta_archivo, datos):
+    """Función para escribir un archivo JSON junto al almacén, con reemplazo atómico
+
+    Args:
+        ruta_archivo (string): Ruta del archivo
+        datos (dict): Contenido
+    """
+
+    ruta_temporal = ruta_archivo + ".tmp"
+
+    with open(ruta_temporal, "w", encoding="utf-8") as archivo:
+        json.dump(datos, archivo, separators=(',', ':'), ensure_ascii=False)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+
+    # Nunca queda un archivo a medias
+    os.replace(ruta_temporal, ruta_archivo)
+
+
+def cargar_json(ruta_archivo):
+    """Función para leer un archivo JSON junto al almacén
+
+    Args:
+        ruta_archivo (string): Ruta del archivo
+
+    Returns:
+        dict: Contenido, None si no existe o está dañado
+    """
+
+    try:
+        with open(ruta_archivo, encoding="utf-8") as archivo:
+            return json.load(archivo)
+    except (OSError, ValueError):
+        return None
+
+
+class AlmacenBloques:
+    def __init__(self, ruta, tamano_segmento=TAMANO_SEGMENTO, lote_fsync=LOTE_FSYNC, intervalo_fsync=INTERVALO_FSYNC):
+        """Inicializador del almacén de bloques en disco, segmentado y de solo añadido.
+        Al abrirse recupera el estado tras un cierre abrupto, descartando la escritura incompleta.
+
+        Args:
+            ruta (string): Directorio del almacén
+            tamano_segmento (integer, optional): Bytes máximos por segmento. Por defecto TAMANO_SEGMENTO.
+            lote_fsync (integer, optional): Bloques entre fsync. Por defecto LOTE_FSYNC.
+            intervalo_fsync (float, optional): Segundos máximos entre fsync. Por defecto INTERVALO_FSYNC.
+        """
+
+        self.ruta = ruta
+        self.tamano_segmento = tamano_segmento
+        self.lote_fsync = lote_fsync
+        self.intervalo_fsync = intervalo_fsync
+
+        # Índice en memoria: (segmento, desplazamiento, longitud) por altura
+        self._indice = []
+        # Segmentos proyectados en memoria para lectura
+        self._proyecciones = {}
+        self._pendientes = 0
+        self._ultimo_fsync = time.monotonic()
+        self._lock = threading.RLock()
+
+        os.makedirs(ruta, exist_ok=True)
+        self._recuperar()
+
+        self._archivo_indice = open(self._ruta_indice(), "ab")
+        self._segmento = self._indice[-1][0] if self._indice else 0
+        self._archivo_segmento = open(
+            self._ruta_segmento(self._segmento), "ab")
+
+    def _ruta_segmento(self, segmento):
+        return os.path.join(self.ruta, f"segmento-{segmento:06d}.dat")
+
+    def _ruta_indice(self):
+        return os.path.join(self.ruta, NOMBRE_INDICE)
+
+    ################################################
+    # Recuperación
+    ################################################
+
+    def _recuperar(self):
+        """Función para cargar el índice y dejar los segmentos coherentes con él
+        """
+
+        # 1 - Índice persistido, sin la entrada incompleta final
+        if os.path.exists(self._ruta_indice()):
+            with open(self._ruta_indice(), "rb") as archivo:
+                datos = archivo.read()
+            completos = len(datos) - len(datos) % FORMATO_INDICE.size
+            self._indice = [entrada for entrada in FORMATO_INDICE.iter_unpack(
+                datos[:completos])]
+
+        # 2 - Descartar entradas que apuntan a datos no escritos o dañados
+        while self._indice and not self._es_registro_valido(*self._indice[-1]):
+            self._indice.pop()
+
+        # 3 - Recorrer los registros escritos después de la última entrada
+        if self._indice:
+            segmento, desplazamiento, longitud = self._indice[-1]
+            posicion = desplazamiento + longitud
+        else:
+            segmento, posicion = 0, 0
+
+        while os.path.exists(self._ruta_segmento(segmento)):
+            with open(self._ruta_segmento(segmento), "rb") as archivo:
+                datos = archivo.read()
+
+            while posicion + FORMATO_REGISTRO.size <= len(datos):
+                longitud, crc = FORMATO_REGISTRO.unpack_from(datos, posicion)
+                inicio = posicion + FORMATO_REGISTRO.size
+
+                if inicio + longitud > len(datos) or zlib.crc32(datos[inicio:inicio + longitud]) != crc:
+                    break
+
+                self._indice.append((segmento, inicio, longitud))
+                posicion = inicio + longitud
+
+            # Escritura incompleta: se trunca el segmento y se descartan los posteriores
+            if posicion < len(datos):
+                os.truncate(self._ruta_segmento(segmento), posicion)
+                self._eliminar_segmentos_desde(segmento + 1)
+                break
+
+            segmento += 1
+            posicion = 0
+
+        # 4 - Índice en disco igual al recuperado
+        with open(self._ruta_indice(), "wb") as archivo:
+            for entrada in self._indice:
+                archivo.write(FORMATO_INDICE.pack(*entrada))
+            archivo.flush()
+            os.fsync(archivo.fileno())
+
+    def _es_registro_valido(self, segmento, desplazamiento, longitud):
+        """Función que comprueba un registro contra su CRC
+
+        Returns:
+            bool: True o False
+        """
+
+        try:
+            with open(self._ruta_segmento(segmento), "rb") as archivo:
+                archivo.seek(desplazamiento - FORMATO_REGISTRO.size)
+                cabecera = archivo.read(FORMATO_REGISTRO.size)
+                contenido = archivo.read(longitud)
+        except (OSError, ValueError):
+            return False
+
+        if len(cabecera) != FORMATO_REGISTRO.size or len(contenido) != longitud:
+            return False
+
+        return FORMATO_REGISTRO.unpack(cabecera) == (longitud, zlib.crc32(contenido))
+
+    def _eliminar_segmentos_desde(self, segmento):
+        """Función para eliminar un segmento y todos los posteriores
+
+        Args:
+            segmento (integer): Primer segmento a eliminar
+        """
+
+        while os.path.exists(self._ruta_segmento(segmento)):
+            self._cerrar_proyeccion(segmento)
+            os.remove(self._ruta_segmento(segmento))
+            segmento += 1
+
+    ################################################
+    # Escritura
+    ################################################
+
+    def anadir(self, contenido):
+        """Función para añadir un bloque codificado al final del almacén
+
+        Args:
+            contenido (bytes): Bloque codificado
+
+        Returns:
+            integer: Altura del bloque añadido
+        """
+
+        with self._lock:
+            # Segmento lleno, se abre el siguiente
+            if self._archivo_segmento.tell() > 0 and self._archivo_segmento.tell() + FORMATO_REGISTRO.size + len(contenido) > self.tamano_segmento:
+                self.sincronizar()
+                self._archivo_segmento.close()
+                self._segmento += 1
+                self._archivo_segmento = open(
+                    self._ruta_segmento(self._segmento), "ab")
+
+            inicio = self._archivo_segmento.tell() + FORMATO_REGISTRO.size
+            self._archivo_segmento.write(FORMATO_REGISTRO.pack(
+                len(contenido), zlib.crc32(contenido)) + contenido)
+
+            entrada = (self._segmento, inicio, len(contenido))
+            self._archivo_indice.write(FORMATO_INDICE.pack(*entrada))
+            self._indice.append(entrada)
+
+            # fsync por lotes o por tiempo
+            self._pendientes += 1
+            if self._pendientes >= self.lote_fsync or time.monotonic() - self._ultimo_fsync >= self.intervalo_fsync:
+                self.sincronizar()
+
+            return len(self._indice) - 1
+
+    def sincronizar(self):
+        """Función para llevar a disco los bloques pendientes, primero los datos y después el índice
+        """
+
+        with self._lock:
+            self._archivo_segmento.flush()
+            os.fsync(self._archivo_segmento.fileno())
+            self._archivo_indice.flush()
+            os.fsync(self._archivo_indice.fileno())
+
+            self._pendientes = 0
+            self._ultimo_fsync = time.monotonic()
+
+    def truncar(self, altura):
+        """Función para descartar los bloques desde una altura, para reorganizaciones
+
+        Args:
+            altura (integer): Primera altura a descartar
+        """
+
+        with self._lock:
+            if altura >= len(self._indice):
+                return
+
+            segmento, desplazamiento, _ = self._indice[altura]
+
+            self._archivo_segmento.close()
+            self._cerrar_proyeccion(segmento)
+            os.truncate(self._ruta_segmento(segmento),
+                        desplazamiento - FORMATO_REGISTRO.size)
+            self._eliminar_segmentos_desde(segmento + 1)
+
+            del self._indice[altura:]
+            self._archivo_indice.flush()
+            os.truncate(self._ruta_indice(), altura * FORMATO_INDICE.size)
+
+            self._segmento = segmento
+            self._archivo_segmento = open(
+                self._ruta_segmento(segmento), "ab")
+            self.sincronizar()
+
+    ################################################
+    # Lectura
+    ################################################
+
+    def _obtener_proyeccion(self, segmento, fin):
+        """Función para obtener la proyección en memoria de un segmento que cubra hasta un desplazamiento
+
+        Args:
+            segmento (integer): Segmento
+            fin (integer): Desplazamiento final necesario
+
+        Returns:
+            mmap.mmap: Proyección del segmento
+        """
+
+        proyeccion = self._proyecciones.get(segmento)
+
+        # El segmento activo crece, se vuelve a proyectar si no cubre el registro
+        if proyeccion is None or len(proyeccion) < fin:
+            if segmento == self._segmento:
+                self._archivo_segmento.flush()
+            self._cerrar_proyeccion(segmento)
+
+            with open(self._ruta_segmento(segmento), "rb") as archivo:
+                proyeccion = mmap.mmap(
+                    archivo.fileno(), 0, access=mmap.ACCESS_READ)
+            self._proyecciones[segmento] = proyeccion
+
+        return proyeccion
+
+    def _cerrar_proyeccion(self, segmento):
+        proyeccion = self._proyecciones.pop(segmento, None)
+        if proyeccion is not None:
+            proyeccion.close()
+
+    def leer(self, altura):
+        """Función para leer un bloque codificado
+
+        Args:
+            altura (integer): Altura del bloque
+
+        Returns:
+            bytes: Bloque codificado
+        """
+
+        with self._lock:
+            segmento, desplazamiento, longitud = self._indice[altura]
+            proyeccion = self._obtener_proyeccion(
+                segmento, desplazamiento + longitud)
+
+            return proyeccion[desplazamiento:desplazamiento + longitud]
+
+    def __iter__(self):
+        for altura in range(len(self)):
+            yield self.leer(altura)
+
+    def __len__(self):
+        return len(self._indice)
+
+    def cerrar(self):
+        """Función para llevar a disco lo pendiente y cerrar los archivos
+        """
+
+        with self._lock:
+            self.sincronizar()
+            self._archivo_segmento.close()
+            self._archivo_indice.close()
+
+            for segmento in list(self._proyecciones):
+                self._cerrar_proyeccion(segmento)
+
+
+################################################
+# Lectura perezosa de la Blockchain
+################################################
+
+
+class LectorBloques:
+    def __init__(self, almacen, decodificar, maximo_cache=MAXIMO_CACHE_BLOQUES, maximo_conservados=MAXIMO_BLOQUES_CONSERVADOS):
+        """Inicializador del lector de los bloques cargados de un almacén, que se decodifican
+        al leerlos y con una caché de los últimos leídos. Lo comparten la Blockchain y sus copias.
+
+        Args:
+            almacen (AlmacenBloques): Almacén de bloques
+            decodificar (function): Construye un bloque a partir de su contenido codificado
+            maximo_cache (integer, optional): Bloques decodificados en caché. Por defecto MAXIMO_CACHE_BLOQUES.
+            maximo_conservados (integer, optional): Bloques descartados conservados. Por defecto MAXIMO_BLOQUES_CONSERVADOS.
+        """
+
+        self.almacen = almacen
+        self.decodificar = decodificar
+        self.maximo_cache = maximo_cache
+        self.maximo_conservados = maximo_conservados
+
+        # Altura -> bloque, los bloques cargados no cambian mientras siguen en el almacén
+        self._cache = OrderedDict()
+        # Altura -> bloque cargado y descartado del almacén, aún en copias anteriores de la Blockchain
+        self._conservados = OrderedDict()
+        # Primera altura descartada del almacén, desde ella ya no se leen los bloques cargados
+        self._descartados_desde = None
+        self._lock = threading.Lock()
+
+    def leer(self, altura):
+        """Función para obtener un bloque cargado
+
+        Args:
+            altura (integer): Altura del bloque
+
+        Returns:
+            Bloque: Bloque decodificado
+
+        Raises:
+            LookupError: Bloque descartado del almacén y ya no conservado
+        """
+
+        with self._lock:
+            bloque = self._conservados.get(altura)
+            if bloque is not None:
+                self._conservados.move_to_end(altura)
+                return bloque
+
+            bloque = self._cache.get(altura)
+            if bloque is not None:
+                self._cache.move_to_end(altura)
+                return bloque
+
+            # En el almacén ya hay otro bloque a esa altura
+            if self._descartados_desde is not None and altura >= self._descartados_desde:
+                raise LookupError(
+                    f"Bloque {altura} descartado del almacén en una reorganización")
+
+            # Se lee con el lock, antes de que se pueda descartar del almacén
+            contenido = self.almacen.leer(altura)
+
+        bloque = self.decodificar(contenido)
+
+        with self._lock:
+            self._cache[altura] = bloque
+            while len(self._cache) > self.maximo_cache:
+                self._cache.popitem(last=False)
+
+        return bloque
+
+    def conservar(self, desde, hasta):
+        """Función para guardar en memoria bloques cargados antes de descartarlos del almacén,
+        como máximo los maximo_conservados más altos y expulsando los conservados hace más tiempo
+
+        Args:
+            desde (integer): Primera altura descartada
+            hasta (integer): Altura siguiente a la última
+        """
+
+        bloques = [(altura, self.leer(altura))
+                   for altura in range(max(desde, hasta - self.maximo_conservados), hasta)]
+
+        with self._lock:
+            self._conservados.update(bloques)
+            while len(self._conservados) > self.maximo_conservados:
+                self._conservados.popitem(last=False)
+
+            if self._descartados_desde is None or desde < self._descartados_desde:
+                self._descartados_desde = desde
+
+
+class SecuenciaBloques:
+    def __init__(self, lector=None, cargados=0, bloques=None):
+        """Inicializador de la Blockchain en memoria: los primeros bloques, cargados del almacén,
+        solo se leen al accederlos y el resto se guardan como objetos. Se modifica como una lista,
+        añadiendo bloques o descartando un sufijo.
+
+        Args:
+            lector (LectorBloques, optional): Lector de los bloques cargados. Por defecto ninguno.
+            cargados (integer, optional): Bloques iniciales leídos del almacén. Por defecto 0.
+            bloques (list, optional): Bloques posteriores. Por defecto ninguno.
+        """
+
+        self.lector = lector
+        self.cargados = cargados
+        self._bloques = bloques if bloques is not None else []
+
+    def _leer(self, altura):
+        if altura < self.cargados:
+            return self.lector.leer(altura)
+
+        return self._bloques[altura - self.cargados]
+
+    def __len__(self):
+        return self.cargados + len(self._bloques)
+
+    def __getitem__(self, posicion):
+        if isinstance(posicion, slice):
+            return [self._leer(altura) for altura in range(*posicion.indices(len(self)))]
+
+        if posicion < 0:
+            posicion += len(self)
+        if not 0 <= posicion < len(self):
+            raise IndexError("Altura fuera de la Blockchain")
+
+        return self._leer(posicion)
+
+    def __iter__(self):
+        for altura in range(len(self)):
+            yield self._leer(altura)
+
+    def __delitem__(self, posicion):
+        if not isinstance(posicion, slice) or posicion.stop is not None or posicion.step is not None:
+            raise TypeError("Solo se puede descartar un sufijo de la Blockchain")
+
+        desde = posicion.indices(len(self))[0]
+
+        # Las copias anteriores aún pueden leer los bloques cargados que se descartan
+        if desde < self.cargados:
+            self.lector.conservar(desde, self.cargados)
+            self.cargados = desde
+            self._bloques = []
+        else:
+            del self._bloques[desde - self.cargados:]
+
+    def append(self, bloque):
+        self._bloques.append(bloque)
+
+    def extend(self, bloques):
+        self._bloques.extend(bloques)
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + sys.getsizeof(self._bloques)
+
+    def copia(self, hasta=None):
+        """Función para obtener una copia de la Blockchain o de un prefijo sin leer los bloques cargados
+
+        Args:
+            hasta (integer, optional): Bloques del prefijo. Por defecto todos.
+
+        Returns:
+            SecuenciaBloques: Copia independiente de los cambios posteriores
+        """
+
+        hasta = len(self) if hasta is None else min(hasta, len(self))
+        cargados = min(self.cargados, hasta)
+
+        return SecuenciaBloques(self.lector, cargados, self._bloques[:hasta - cargados])
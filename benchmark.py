@@ -0,0 +1,525 @@
+import io
+import sys
+import json
+import time
+import tempfile
+import platform
+import argparse
+import contextlib
+from datetime import datetime
+from configparser import ConfigParser
+from blockchain import Bloque, Blockchain
+from minado import NUCLEOS, TAMANO_LOTE, obtener_nucleo
+from firmas import VerificadorFirmas, verificar_firma, mensaje_transaccion
+from red import ClienteNodos
+from serializacion import CacheSerializacion, flujo_ndjson, TAMANO_PAGINA
+
+################################################
+# Parámetros del benchmark
+################################################
+
+# Dificultad de las Blockchains de prueba, baja para generarlas rápido
+DIFICULTAD_PRUEBA = 1
+# Longitudes de Blockchain medidas en la validación
+LONGITUDES_VALIDACION = [100, 1000, 5000]
+# Nodos simulados y bloques nuevos por ronda de consenso
+NODOS_CONSENSO = 3
+BLOQUES_NUEVOS_CONSENSO = 5
+# Diferencia relativa tolerada frente a la base antes de marcar una regresión
+TOLERANCIA = 0.2
+# Cartera de pruebas que firma las transacciones de las Blockchains de prueba
+CARTERA_PRUEBA = "configuracion/carteras/emisor.ini"
+# Resultados de referencia guardados en el repositorio, generados con los parámetros por defecto
+ARCHIVO_BASE = "benchmark-base.json"
+
+
+@contextlib.contextmanager
+def silenciar():
+    """Función para descartar la salida por consola de la Blockchain mientras se mide
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def medir_operaciones(funcion, segundos):
+    """Función para medir cuántas veces por segundo se ejecuta una función
+
+    Args:
+        funcion (function): Función sin argumentos
+        segundos (float): Duración mínima de la medición
+
+    Returns:
+        float: Operaciones por segundo
+    """
+
+    operaciones = 0
+    inicio = time.perf_counter()
+
+    while time.perf_counter() - inicio < segundos:
+        funcion()
+        operaciones += 1
+
+    return operaciones / (time.perf_counter() - inicio)
+
+
+def medir_segundos(funcion, repeticiones):
+    """Función para medir la mejor duración de varias ejecuciones de una función
+
+    Args:
+        funcion (function): Función sin argumentos
+        repeticiones (integer): Ejecuciones
+
+    Returns:
+        float: Segundos de la ejecución más rápida
+    """
+
+    mejor = float("inf")
+
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+
+    return mejor
+
+
+################################################
+# Micro-benchmark de núcleos de hash
+################################################
+
+
+def crear_bloque_prueba(version=2):
+    """Función para crear un bloque sintético sobre el que medir
+
+    Args:
+        version (integer, optional): Versión de cabecera. Por defecto 2.
+
+    Returns:
+        Bloque: Bloque de prueba
+    """
+
+    transacciones = [["De: Red blockchain", "Para: Nadie", "Cantidad: 50",
+                      "Concepto: Transaccion benchmark", "Fecha: Indeterminado"]]
+    bloque = Bloque(1, transacciones)
+    bloque.construir_cabecera("0" * 64, transacciones, 1, version)
+
+    return bloque
+
+
+def medir_nucleo(nombre, segundos=2, tamano_lote=TAMANO_LOTE, version=2):
+    """Función para medir los hashes por segundo de un núcleo de hash
+
+    Args:
+        nombre (string): Nombre del núcleo
+        segundos (float, optional): Duración mínima de la medición. Por defecto 2.
+        tamano_lote (integer, optional): Nonces por llamada al núcleo. Por defecto TAMANO_LOTE.
+        version (integer, optional): Versión de cabecera. Por defecto 2.
+
+    Returns:
+        float: Hashes por segundo
+    """
+
+    nucleo = obtener_nucleo(nombre)
+    # Dificultad inalcanzable para recorrer siempre el lote completo
+    contexto = nucleo.preparar(crear_bloque_prueba(version), 64)
+
+    intentos = 0
+    inicio = time.perf_counter()
+
+    while time.perf_counter() - inicio < segundos:
+        _, calculados = nucleo.evaluar_lote(contexto, intentos, tamano_lote)
+        intentos += calculados
+
+    return intentos / (time.perf_counter() - inicio)
+
+
+################################################
+# Blockchains y nodos de prueba
+################################################
+
+
+def crear_nodo(numero_minero="1-1", dificultad=DIFICULTAD_PRUEBA):
+    """Función para crear un nodo sin red, solo con el bloque Génesis
+
+    Args:
+        numero_minero (string, optional): Número de minero. Por defecto "1-1".
+        dificultad (integer, optional): Dificultad. Por defecto DIFICULTAD_PRUEBA.
+
+    Returns:
+        Blockchain: Nodo de prueba
+    """
+
+    cartera = ConfigParser()
+    cartera.read(CARTERA_PRUEBA)
+
+    with silenciar():
+        return Blockchain(dificultad, "localhost", 0, [], numero_minero,
+                          cartera.get("configuracion", "direccion_cartera"),
+                          cartera.get("configuracion", "clave_privada_cartera"))
+
+
+def minar_bloques(nodo, cantidad):
+    """Función para minar bloques con una transacción firmada y la recompensa
+
+    Args:
+        nodo (Blockchain): Nodo que mina
+        cantidad (integer): Bloques a minar
+    """
+
+    with silenciar():
+        for _ in range(cantidad):
+            nodo.anadir_nueva_transaccion(nodo.direccion_minero, nodo.clave_privada_minero,
+                                          nodo.direccion_minero, "1", "Transaccion benchmark")
+            nodo.anadir_transaccion_recompensa()
+            nodo.minar()
+
+
+_nodos_prueba = {}
+
+
+def obtener_nodo_prueba(longitud):
+    """Función para obtener un nodo con una Blockchain de prueba de al menos una longitud,
+    generada una sola vez por ejecución
+
+    Args:
+        longitud (integer): Bloques mínimos, sin contar el Génesis
+
+    Returns:
+        Blockchain: Nodo de prueba
+    """
+
+    nodo = _nodos_prueba.setdefault("nodo", crear_nodo())
+
+    if len(nodo.blockchain) - 1 < longitud:
+        print(f"| Generando Blockchain de prueba de {longitud} bloques...")
+        minar_bloques(nodo, longitud - len(nodo.blockchain) + 1)
+
+    return nodo
+
+
+class RespuestaSimulada:
+    def __init__(self, contenido, estado=200, cabeceras=None):
+        """Inicializador de una respuesta de un nodo simulado, con la interfaz de requests.Response usada en la sincronización
+
+        Args:
+            contenido (bytes): Cuerpo
+            estado (integer, optional): Código de estado. Por defecto 200.
+            cabeceras (dict, optional): Cabeceras. Por defecto ninguna.
+        """
+
+        self.content = contenido
+        self.status_code = estado
+        self.headers = cabeceras or {}
+
+    def iter_lines(self):
+        return iter(self.content.split(b"\n"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        return False
+
+
+class ClienteNodosSimulado(ClienteNodos):
+    def __init__(self, nodos):
+        """Inicializador de un cliente que responde en el propio proceso con las rutas de sincronización
+        de unos nodos simulados, sin red pero con la misma serialización
+
+        Args:
+            nodos (dict): Nodo simulado (Blockchain) por URL
+        """
+
+        super().__init__(list(nodos))
+        self.nodos = nodos
+
+    def obtener(self, url_nodo, ruta, params=None, stream=False):
+        nodo = self.nodos[url_nodo]
+        params = params or {}
+
+        if ruta == "/cabeceras":
+            return RespuestaSimulada(json.dumps([bloque.a_dict_cabecera()
+                                                 for bloque in nodo.obtener_bloques(params.get("desde", 0))]).encode())
+
+        if ruta == "/flujo":
+            desde, hash_previo = params.get("desde", 0), None
+            if "cursor" in params:
+                altura, hash_previo = params["cursor"].split(":", 1)
+                desde = int(altura) + 1
+
+            pagina = nodo.obtener_pagina_bloques(
+                desde, params.get("limite", TAMANO_PAGINA), hash_previo)
+            if pagina is None:
+                return RespuestaSimulada(b"", 409)
+
+            bloques, siguiente = pagina
+            return RespuestaSimulada(b"".join(flujo_ndjson(bloques)), 200,
+                                     {"X-Cursor-Siguiente": siguiente} if siguiente else {})
+
+        if ruta == "/blockchain":
+            return RespuestaSimulada(nodo.serializar_blockchain()[0])
+
+        return RespuestaSimulada(b"", 404)
+
+
+################################################
+# Casos del benchmark
+################################################
+
+
+def caso_nucleos(args):
+    resultados = {}
+
+    for nombre in args.nucleos:
+        try:
+            resultados[f"{nombre}_hashes_por_segundo"] = round(
+                medir_nucleo(nombre, args.segundos, args.lote))
+        except ValueError as error:
+            print(f"| {nombre}: no disponible ({error})")
+
+    return resultados
+
+
+def caso_hash(args):
+    resultados = {}
+
+    for version in (1, 2):
+        bloque = crear_bloque_prueba(version)
+        resultados[f"calcular_hash_v{version}_por_segundo"] = round(
+            medir_operaciones(bloque.calcular_hash, args.segundos))
+
+    # Prueba de trabajo completa de un bloque, con la dificultad de prueba
+    nodo = crear_nodo()
+    bloque = crear_bloque_prueba()
+
+    def prueba_de_trabajo():
+        bloque.cabecera["nonce"] = 0
+        nodo.prueba_de_trabajo(bloque, False)
+
+    with silenciar():
+        resultados["prueba_de_trabajo_por_segundo"] = round(
+            medir_operaciones(prueba_de_trabajo, args.segundos), 1)
+    nodo.motor_minado.cerrar()
+
+    return resultados
+
+
+def caso_validacion(args):
+    resultados = {}
+    nodo = obtener_nodo_prueba(max(args.longitudes))
+    validador = crear_nodo("2-1")
+
+    for longitud in args.longitudes:
+        cadena = nodo.obtener_bloques()[:longitud + 1]
+
+        # Copias de otro nodo, sin bloques validados antes
+        def validar():
+            validador._bloques_validados.clear()
+            if not validador.es_blockchain_valida([Bloque.desde_dict(bloque.a_dict()) for bloque in cadena]):
+                raise RuntimeError("Blockchain de prueba no válida")
+
+        segundos = medir_segundos(validar, args.repeticiones)
+        resultados[f"validacion_{longitud}_bloques_por_segundo"] = round(
+            longitud / segundos)
+
+    return resultados
+
+
+def caso_serializacion(args):
+    nodo = obtener_nodo_prueba(max(args.longitudes))
+    cadena = nodo.obtener_bloques()
+
+    def serializar_en_frio(comprimir):
+        CacheSerializacion().respuesta(cadena, 0, comprimir)
+
+    cache = CacheSerializacion()
+    cache.respuesta(cadena, 0, True)
+
+    return {"bloques": len(cadena),
+            "serializacion_fria_segundos": round(medir_segundos(lambda: serializar_en_frio(False), args.repeticiones), 4),
+            "serializacion_fria_gzip_segundos": round(medir_segundos(lambda: serializar_en_frio(True), args.repeticiones), 4),
+            "serializacion_cache_por_segundo": round(medir_operaciones(lambda: cache.respuesta(cadena, 0, True), args.segundos))}
+
+
+def caso_firmas(args):
+    nodo = crear_nodo()
+    campos = (nodo.direccion_minero, nodo.direccion_minero,
+              "1", "Transaccion benchmark")
+    firma, fecha = nodo.firmar_transaccion_ECDSA(
+        nodo.clave_privada_minero, *campos)
+    mensaje = mensaje_transaccion(*campos, fecha)
+
+    lote = [(nodo.direccion_minero, firma, mensaje)] * 256
+    verificador = VerificadorFirmas(1)
+
+    resultados = {"firmas_por_segundo": round(medir_operaciones(lambda: nodo.firmar_transaccion_ECDSA(nodo.clave_privada_minero, *campos), args.segundos)),
+                  "verificaciones_por_segundo": round(medir_operaciones(lambda: verificar_firma(nodo.direccion_minero, firma, mensaje), args.segundos)),
+                  "verificaciones_lote_por_segundo": round(len(lote) * medir_operaciones(lambda: verificador.verificar_lote(lote), args.segundos))}
+
+    verificador.cerrar()
+
+    return resultados
+
+
+def caso_consenso(args):
+    base = obtener_nodo_prueba(max(args.longitudes)).obtener_bloques()
+    nodos = {}
+
+    # Nodos simulados con la Blockchain de prueba y bloques nuevos propios
+    for numero in range(args.nodos):
+        nodo = crear_nodo(f"{numero + 2}-1")
+        nodo.reemplazar_blockchain(base)
+        minar_bloques(nodo, BLOQUES_NUEVOS_CONSENSO)
+        nodos[f"http://nodo-{numero + 2}"] = nodo
+
+    local = crear_nodo()
+    local.cliente_nodos = ClienteNodosSimulado(nodos)
+
+    def ronda_con_bloques_nuevos():
+        local.reemplazar_blockchain(base)
+        local.blockchains_nodos.limpiar()
+        local._bloques_validados.clear()
+        if not local.consenso():
+            raise RuntimeError("El consenso no ha adoptado los bloques nuevos")
+
+    resultados = {"ronda_con_bloques_nuevos_segundos": round(medir_segundos(ronda_con_bloques_nuevos, args.repeticiones), 4),
+                  "ronda_sin_cambios_segundos": round(medir_segundos(local.consenso, args.repeticiones), 4)}
+
+    local.cliente_nodos.cerrar()
+
+    return resultados
+
+
+def caso_informes(args):
+    try:
+        import procesador
+    except ImportError as error:
+        print(f"| informes: no disponible ({error})")
+        return {}
+
+    nodo = obtener_nodo_prueba(max(args.longitudes))
+    datos = [bloque.a_dict() for bloque in nodo.obtener_bloques()]
+
+    with tempfile.TemporaryDirectory() as ruta:
+        return {"bloques": len(datos),
+                "informe_json_segundos": round(medir_segundos(lambda: procesador.crear_informe_json(ruta, datos), args.repeticiones), 4),
+                "informe_xlsx_segundos": round(medir_segundos(lambda: procesador.crear_informe_xlsx(ruta, datos), args.repeticiones), 4)}
+
+
+CASOS = {"nucleos": caso_nucleos, "hash": caso_hash, "validacion": caso_validacion,
+         "serializacion": caso_serializacion, "firmas": caso_firmas, "consenso": caso_consenso,
+         "informes": caso_informes}
+
+
+################################################
+# Resultados y comparación con la base
+################################################
+
+
+def es_mejor_mayor(metrica):
+    """Función que indica si un valor mayor de la métrica es mejor: tasas por segundo sí, duraciones no
+
+    Args:
+        metrica (string): Nombre de la métrica
+
+    Returns:
+        bool: True o False
+    """
+
+    return metrica.endswith("_por_segundo")
+
+
+def comparar_resultados(resultados, base, tolerancia=TOLERANCIA):
+    """Función para comparar unos resultados con los de la base
+
+    Args:
+        resultados (dict): Métricas por caso
+        base (dict): Métricas por caso de la base
+        tolerancia (float, optional): Diferencia relativa tolerada. Por defecto TOLERANCIA.
+
+    Returns:
+        list: Regresiones (caso, métrica, valor de la base, valor actual, cambio relativo)
+    """
+
+    regresiones = []
+
+    for caso, metricas in resultados.items():
+        for metrica, valor in metricas.items():
+            anterior = base.get(caso, {}).get(metrica)
+
+            # Métricas informativas, sin sentido de mejor o peor
+            if not anterior or not (es_mejor_mayor(metrica) or metrica.endswith("_segundos")):
+                continue
+
+            cambio = (valor - anterior) / anterior
+            if (cambio < -tolerancia) if es_mejor_mayor(metrica) else (cambio > tolerancia):
+                regresiones.append(
+                    (caso, metrica, anterior, valor, round(cambio, 3)))
+
+    return regresiones
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Benchmark sin red de los puntos críticos del nodo",
+        epilog=f"Comparar con la base: python benchmark.py -base {ARCHIVO_BASE}. "
+               f"Crear o renovar la base, en la misma máquina y con los parámetros por defecto: "
+               f"python benchmark.py -salida {ARCHIVO_BASE}")
+    parser.add_argument("-casos", "--casos", nargs="+", default=list(CASOS), choices=list(CASOS),
+                        help="Casos a medir. Por defecto todos")
+    parser.add_argument("-nucleos", "--nucleos", nargs="+", default=list(NUCLEOS),
+                        help="Núcleos a medir. Por defecto todos")
+    parser.add_argument("-s", "--segundos", type=float, default=2,
+                        help="[float] Segundos de medición de cada tasa. Por defecto 2")
+    parser.add_argument("-lote", "--lote", type=int, default=TAMANO_LOTE,
+                        help=f"[int] Nonces por lote. Por defecto {TAMANO_LOTE}")
+    parser.add_argument("-longitudes", "--longitudes", type=int, nargs="+", default=LONGITUDES_VALIDACION,
+                        help=f"[int] Longitudes de Blockchain a validar. Por defecto {LONGITUDES_VALIDACION}")
+    parser.add_argument("-repeticiones", "--repeticiones", type=int, default=3,
+                        help="[int] Repeticiones de cada duración, se toma la mejor. Por defecto 3")
+    parser.add_argument("-nodos", "--nodos", type=int, default=NODOS_CONSENSO,
+                        help=f"[int] Nodos simulados en el consenso. Por defecto {NODOS_CONSENSO}")
+    parser.add_argument("-salida", "--salida",
+                        help="Archivo .json donde guardar los resultados")
+    parser.add_argument("-base", "--base",
+                        help=f"Archivo .json de resultados anteriores con el que comparar, como {ARCHIVO_BASE}")
+    parser.add_argument("-tolerancia", "--tolerancia", type=float, default=TOLERANCIA,
+                        help=f"[float] Diferencia relativa tolerada frente a la base. Por defecto {TOLERANCIA}")
+    args = parser.parse_args()
+
+    print("|------ BENCHMARK ------|")
+
+    resultados = {}
+
+    for caso in args.casos:
+        print(f"|------ {caso.upper()} ------|")
+        resultados[caso] = CASOS[caso](args)
+
+        for metrica, valor in resultados[caso].items():
+            print(f"| {metrica}: {valor}")
+
+    informe = {"fecha": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+               "plataforma": platform.platform(), "resultados": resultados}
+
+    if args.salida:
+        with open(args.salida, "w") as archivo:
+            json.dump(informe, archivo, indent=4)
+        print(f"\nResultados guardados en {args.salida}")
+
+    if args.base:
+        with open(args.base) as archivo:
+            base = json.load(archivo)["resultados"]
+
+        regresiones = comparar_resultados(
+            resultados, base, args.tolerancia)
+
+        print(
+            f"\n|------ COMPARACIÓN CON {args.base} (tolerancia {args.tolerancia:.0%}) ------|")
+        for caso, metrica, anterior, valor, cambio in regresiones:
+            print(f"| REGRESIÓN {caso}.{metrica}: {anterior} -> {valor} ({cambio:+.1%})")
+
+        if regresiones:
+            sys.exit(1)
+
+        print("| Sin regresiones")
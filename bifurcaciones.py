@@ -0,0 +1,115 @@
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+################################################
+# Parámetros del almacén de bifurcaciones
+################################################
+
+# Segundos que se conserva una bifurcación sin volver a verla
+EDAD_MAXIMA = 600
+# Bytes estimados máximos de bloques propios de las bifurcaciones
+PRESUPUESTO_MEMORIA = 64 * 1024 * 1024
+
+
+class AlmacenBifurcaciones:
+    def __init__(self, edad_maxima=EDAD_MAXIMA, presupuesto_memoria=PRESUPUESTO_MEMORIA):
+        """Inicializador del almacén de Blockchains de otros nodos, una entrada por bifurcación
+
+        Args:
+            edad_maxima (float, optional): Segundos máximos sin ver una bifurcación. Por defecto EDAD_MAXIMA.
+            presupuesto_memoria (integer, optional): Bytes máximos estimados. Por defecto PRESUPUESTO_MEMORIA.
+        """
+
+        self.edad_maxima = edad_maxima
+        self.presupuesto_memoria = presupuesto_memoria
+
+        # Hash del último bloque -> (Blockchain, instante, bytes estimados)
+        self._bifurcaciones = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def anadir(self, blockchain, altura_ancestro=-1):
+        """Función para añadir o refrescar una bifurcación
+
+        Args:
+            blockchain (list): Blockchain del nodo
+            altura_ancestro (integer, optional): Altura del último bloque compartido con la Blockchain
+                propia, los bloques hasta ella no ocupan memoria extra. Por defecto ninguno.
+        """
+
+        hash_final = blockchain[-1].hash
+
+        with self._lock:
+            # Bifurcación ya conocida, solo se refresca
+            if hash_final in self._bifurcaciones:
+                blockchain, _, tamano = self._bifurcaciones.pop(hash_final)
+            else:
+                tamano = sys.getsizeof(blockchain) + sum(
+                    self._tamano_bloque(bloque) for bloque in blockchain[altura_ancestro + 1:])
+                self._bytes += tamano
+
+            self._bifurcaciones[hash_final] = (
+                blockchain, time.monotonic(), tamano)
+
+            self._expulsar()
+
+    def _tamano_bloque(self, bloque):
+        """Función para estimar la memoria de un bloque
+
+        Args:
+            bloque (Bloque): Bloque a estimar
+
+        Returns:
+            integer: Bytes estimados
+        """
+
+        # Calculado a partir de las transacciones, el tamaño declarado por el nodo no es fiable
+        return bloque.tamano_codificacion()
+
+    def _expulsar(self):
+        """Función para expulsar bifurcaciones por edad y por presupuesto de memoria, las más antiguas primero
+        """
+
+        limite = time.monotonic() - self.edad_maxima
+
+        while self._bifurcaciones:
+            hash_final, (_, instante, tamano) = next(
+                iter(self._bifurcaciones.items()))
+
+            if instante >= limite and self._bytes <= self.presupuesto_memoria:
+                break
+
+            del self._bifurcaciones[hash_final]
+            self._bytes -= tamano
+
+    def limpiar(self):
+        """Función para vaciar el almacén
+        """
+
+        with self._lock:
+            self._bifurcaciones.clear()
+            self._bytes = 0
+
+    def estadisticas(self):
+        """Función para obtener el tamaño del almacén
+
+        Returns:
+            dict: Número de bifurcaciones y bytes estimados
+        """
+
+        with self._lock:
+            self._expulsar()
+            return {"bifurcaciones": len(self._bifurcaciones), "bytes": self._bytes}
+
+    def __iter__(self):
+        with self._lock:
+            self._expulsar()
+            blockchains = [blockchain for blockchain, _,
+                           _ in self._bifurcaciones.values()]
+
+        return iter(blockchains)
+
+    def __len__(self):
+        return len(self._bifurcaciones)
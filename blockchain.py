@@ -1,16 +1,241 @@
+import os
 import copy
 import time
-import requests
 import threading
 import json
-import base64
-import ecdsa
+import struct
 
 from requests.exceptions import ConnectionError
 from datetime import datetime
 from flask import Flask, request
-from pympler import asizeof
 from hashlib import new, sha256
+from minado import MotorMinado, NUCLEO_POR_DEFECTO
+from red import ClienteNodos
+from bifurcaciones import AlmacenBifurcaciones
+from merkle import ArbolMerkle, hash_transaccion, serializar_transaccion
+from firmas import VerificadorFirmas, verificar_firma, firmar_mensaje, mensaje_transaccion
+from almacen import AlmacenBloques, LectorBloques, SecuenciaBloques, cargar_json, guardar_json
+from indices import IndicesBlockchain, campos_transaccion, cantidad_transaccion
+from mempool import Mempool, es_transaccion_red
+from estado import EstadoSaldos
+from serializacion import CacheSerializacion, TAMANO_PAGINA, TAMANO_PAGINA_EXPLORADOR, leer_ndjson
+from validacion import ValidadorBlockchain, UMBRAL_PARALELO, motivo_invalidez
+from metricas import RegistroMetricas
+from collections import OrderedDict
+
+
+################################################
+# Cabecera binaria
+################################################
+
+# Versión 1: hash sobre la representación en texto de la cabecera (cadenas antiguas)
+VERSION_CABECERA_LEGACY = 1
+# Versión 2: hash sobre la codificación binaria de longitud fija
+VERSION_CABECERA = 2
+
+# version, hash_previo, raiz_merkle, timestamp, dificultad | nonce
+FORMATO_PREFIJO_CABECERA = struct.Struct(">I32s32sdI")
+FORMATO_NONCE = struct.Struct(">Q")
+# Longitud de cada transacción y número de transacciones en la codificación del bloque
+FORMATO_LONGITUD = struct.Struct(">I")
+
+# El tamaño de un bloque es el de su codificación compacta: cabecera binaria, número de transacciones
+# y cada transacción canónica precedida de su longitud. El nodo guarda y envía la forma JSON, más larga,
+# así que es una medida del contenido independiente del formato de envío, no los bytes en la red
+
+# Bytes de un bloque sin transacciones: cabecera y contador de transacciones
+TAMANO_BLOQUE_VACIO = FORMATO_PREFIJO_CABECERA.size + \
+    FORMATO_NONCE.size + FORMATO_LONGITUD.size
+# Bytes máximos de la codificación de un bloque, minado o recibido
+TAMANO_MAXIMO_BLOQUE = 1024 * 1024
+
+# Cabeceras pedidas hacia atrás en el primer intento de búsqueda del ancestro común
+VENTANA_ANCESTRO = 16
+# Árboles Merkle de bloques conservados para pruebas de inclusión
+MAXIMO_ARBOLES_CACHE = 128
+# Bloques de otros nodos ya validados conservados por hash
+MAXIMO_BLOQUES_VALIDADOS = 4096
+# Bytes máximos de la codificación de los bloques validados conservados
+PRESUPUESTO_BLOQUES_VALIDADOS = 32 * 1024 * 1024
+# Hashes de bloques anunciados recordados para no reenviarlos en bucle
+MAXIMO_BLOQUES_VISTOS = 4096
+# Trabajo acumulado por altura guardado junto al almacén de bloques
+NOMBRE_TRABAJO = "trabajo.json"
+
+
+def hash_con_midstate(midstate, nonce):
+    """Función para calcular el doble SHA256 de una cabecera binaria a partir de su midstate
+
+    Args:
+        midstate (hashlib.sha256): SHA256 con el prefijo constante de la cabecera ya procesado
+        nonce (integer): Nonce a añadir al final de la cabecera
+
+    Returns:
+        string: Hash de bloque
+    """
+
+    primer_hash = midstate.copy()
+    primer_hash.update(FORMATO_NONCE.pack(nonce))
+
+    return sha256(primer_hash.digest()).hexdigest()
+
+
+def calcular_raiz_merkle(transacciones, version, arbol_merkle=None):
+    """Función para calcular la raíz Merkle de unas transacciones según la versión de cabecera
+
+    Args:
+        transacciones (list): Transacciones
+        version (integer): Versión de cabecera
+        arbol_merkle (ArbolMerkle, optional): Árbol ya construido cuyas primeras hojas son las transacciones. Por defecto se construye.
+
+    Returns:
+        string: Raíz Merkle
+    """
+
+    # La versión antigua mantiene la raíz ficticia sobre el texto de las transacciones
+    if version == VERSION_CABECERA_LEGACY:
+        return sha256(str(transacciones).encode()).hexdigest()
+
+    if arbol_merkle is None:
+        arbol_merkle = ArbolMerkle(transacciones)
+
+    return arbol_merkle.raiz(len(transacciones))
+
+
+def trabajo_bloque(bloque):
+    """Función para calcular el trabajo de un bloque: hashes esperados para cumplir su dificultad.
+    La dificultad declarada solo es fiable en bloques validados, que deben declarar la de la Blockchain
+
+    Args:
+        bloque (Bloque): Bloque
+
+    Returns:
+        integer: Trabajo del bloque
+    """
+
+    # Cada cero hexadecimal inicial multiplica por 16 los intentos
+    return 16 ** bloque.cabecera["dificultad"]
+
+
+def tamano_transaccion(transaccion):
+    """Función para calcular los bytes que ocupa una transacción en la codificación del bloque
+
+    Args:
+        transaccion (list): Transacción
+
+    Returns:
+        integer: Bytes de la transacción
+    """
+
+    return FORMATO_LONGITUD.size + len(serializar_transaccion(transaccion))
+
+
+################################################
+# Cabecera
+################################################
+
+
+class Cabecera:
+    """Cabecera de bloque almacenada como la estructura binaria empaquetada.
+    Se accede por campo como un diccionario, con los hashes en hexadecimal.
+    """
+
+    __slots__ = ("_datos",)
+
+    # Campo -> (formato, desplazamiento) dentro de la estructura
+    CAMPOS = {"version": (struct.Struct(">I"), 0),
+              "hash_previo": (struct.Struct(">32s"), 4),
+              "raiz_merkle": (struct.Struct(">32s"), 36),
+              "timestamp": (struct.Struct(">d"), 68),
+              "dificultad": (struct.Struct(">I"), 76),
+              "nonce": (FORMATO_NONCE, FORMATO_PREFIJO_CABECERA.size)}
+    CAMPOS_HASH = ("hash_previo", "raiz_merkle")
+
+    def __init__(self, version, hash_previo, raiz_merkle, timestamp, dificultad, nonce=0):
+        """Inicializador de Cabecera
+
+        Args:
+            version (integer): Versión de cabecera
+            hash_previo (string): Hash del bloque anterior
+            raiz_merkle (string): Raíz Merkle de las transacciones
+            timestamp (float): Timestamp de creación
+            dificultad (integer): Dificultad de la blockchain
+            nonce (integer, optional): Nonce. Por defecto 0.
+        """
+
+        hash_previo = bytes.fromhex(hash_previo)
+        raiz_merkle = bytes.fromhex(raiz_merkle)
+
+        # Hashes de longitud distinta a 32 bytes no caben en la estructura
+        if len(hash_previo) != 32 or len(raiz_merkle) != 32:
+            raise ValueError("Cabecera con hashes no válidos")
+
+        # Campos fuera del rango de la estructura, como una dificultad negativa o un nonce de más de 64 bits
+        try:
+            self._datos = bytearray(FORMATO_PREFIJO_CABECERA.pack(
+                version, hash_previo, raiz_merkle, timestamp, dificultad) + FORMATO_NONCE.pack(nonce))
+        except struct.error as error:
+            raise ValueError(f"Cabecera con campos no válidos: {error}") from error
+
+    def __getitem__(self, campo):
+        formato, desplazamiento = self.CAMPOS[campo]
+        valor = formato.unpack_from(self._datos, desplazamiento)[0]
+
+        return valor.hex() if campo in self.CAMPOS_HASH else valor
+
+    def __setitem__(self, campo, valor):
+        formato, desplazamiento = self.CAMPOS[campo]
+
+        if campo in self.CAMPOS_HASH:
+            valor = bytes.fromhex(valor)
+            if len(valor) != 32:
+                raise ValueError(f"{campo} debe tener 32 bytes")
+
+        try:
+            formato.pack_into(self._datos, desplazamiento, valor)
+        except struct.error as error:
+            raise ValueError(f"{campo} no válido: {error}") from error
+
+    def prefijo(self):
+        """Función para obtener la parte constante de la cabecera binaria, todo salvo el nonce
+
+        Returns:
+            bytes: Prefijo de la cabecera
+        """
+
+        return bytes(self._datos[:FORMATO_PREFIJO_CABECERA.size])
+
+    def serializar(self):
+        """Función para obtener la cabecera binaria, con el nonce en los bytes finales
+
+        Returns:
+            bytes: Cabecera binaria
+        """
+
+        return bytes(self._datos)
+
+    def a_dict(self):
+        """Función para obtener la cabecera en su forma JSON
+
+        Returns:
+            dict: Cabecera
+        """
+
+        return {campo: self[campo] for campo in self.CAMPOS}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        """Función para construir una cabecera a partir de su forma JSON
+
+        Args:
+            datos (dict): Cabecera
+
+        Returns:
+            Cabecera: Cabecera construida
+        """
+
+        return cls(datos["version"], datos["hash_previo"], datos["raiz_merkle"],
+                   datos["timestamp"], datos["dificultad"], datos["nonce"])
 
 
 ################################################
@@ -19,20 +244,29 @@ from hashlib import new, sha256
 
 
 class Bloque:
+    """Bloque compacto con campos fijos, hash en bytes y cabecera empaquetada.
+    La forma JSON solo se construye en los extremos de la API con a_dict y desde_dict.
+    """
+
+    __slots__ = ("indice", "tamano", "cabecera", "contador_transacciones", "transacciones",
+                 "_hash", "tiempo_minado", "potencia_computacion", "minado_por")
+
     def __init__(self, indice, transacciones, attr=None):
         """Inicializador de Bloque
 
         Args:
             indice (integer): Índice de bloque
             transacciones (list): Listado de transacciones
-            attr (Block, optional): Objeto a transformar en bloque. Por defecto no existe.
+            attr (dict, optional): Bloque en forma JSON a transformar en bloque. Por defecto no existe.
         """
 
         if attr is None:
             # Parámetros necesarios
             self.indice = indice
-            self.tamano = ""
-            self.cabecera = ""
+            self.tamano = TAMANO_BLOQUE_VACIO + \
+                sum(tamano_transaccion(transaccion)
+                    for transaccion in transacciones)
+            self.cabecera = None
             self.contador_transacciones = len(transacciones)
             self.transacciones = transacciones
 
@@ -44,27 +278,144 @@ class Bloque:
 
         # Construir bloque a partir de objeto
         else:
-            for key, value in attr.items():
-                setattr(self, key, value)
+            self.indice = attr["indice"]
+            self.cabecera = Cabecera.desde_dict(attr["cabecera"])
+            self.hash = attr["hash"]
+            self.tamano = attr.get("tamano", "")
+            self.contador_transacciones = attr.get(
+                "contador_transacciones", "")
+            self.transacciones = attr.get("transacciones", [])
+            self.tiempo_minado = attr.get("tiempo_minado", "")
+            self.potencia_computacion = attr.get("potencia_computacion", "")
+            self.minado_por = attr.get("minado_por", "")
+
+    @property
+    def hash(self):
+        return self._hash.hex()
+
+    @hash.setter
+    def hash(self, valor):
+        self._hash = bytes.fromhex(valor)
+
+    @classmethod
+    def desde_dict(cls, datos):
+        """Función para construir un bloque a partir de su forma JSON
+
+        Args:
+            datos (dict): Bloque en forma JSON
+
+        Returns:
+            Bloque: Bloque construido
+        """
+
+        return cls(0, 0, datos)
+
+    def a_dict(self):
+        """Función para obtener el bloque en su forma JSON
+
+        Returns:
+            dict: Bloque en forma JSON
+        """
+
+        return {"indice": self.indice, "tamano": self.tamano, "cabecera": self.cabecera.a_dict(),
+                "contador_transacciones": self.contador_transacciones, "transacciones": self.transacciones,
+                "hash": self.hash, "tiempo_minado": self.tiempo_minado,
+                "potencia_computacion": self.potencia_computacion, "minado_por": self.minado_por}
+
+    def a_dict_cabecera(self):
+        """Función para obtener solo el índice, el hash y la cabecera en forma JSON
+
+        Returns:
+            dict: Cabecera de bloque en forma JSON
+        """
 
-    def construir_cabecera(self, hash_previo, transacciones_raiz_merkle, dificultad):
+        return {"indice": self.indice, "hash": self.hash, "cabecera": self.cabecera.a_dict()}
+
+    def construir_cabecera(self, hash_previo, transacciones_raiz_merkle, dificultad, version=VERSION_CABECERA, arbol_merkle=None):
         """Función para construir la cabecera de bloque y establecerla
 
         Args:
             hash_previo (string): Hash del bloque anterior
-            transacciones_raiz_merkle (list): Listado de transacciones a almacenar en arbol merkle ficticio
+            transacciones_raiz_merkle (list): Listado de transacciones a almacenar en el árbol merkle
             dificultad (integer): Dificultad actual de la blockchain
+            version (integer, optional): Versión de cabecera. Por defecto VERSION_CABECERA.
+            arbol_merkle (ArbolMerkle, optional): Árbol ya construido cuyas primeras hojas son las transacciones. Por defecto se construye.
 
         Returns:
             list: Cabecera
         """
 
+        raiz_merkle = calcular_raiz_merkle(
+            transacciones_raiz_merkle, version, arbol_merkle)
+
         # Establecer cabecera
-        self.cabecera = {"version": 1, "hash_previo": hash_previo, "raiz_merkle": sha256(
-            str(transacciones_raiz_merkle).encode()).hexdigest(), "timestamp": time.time(), "dificultad": dificultad, "nonce": 0}
+        self.cabecera = Cabecera(
+            version, hash_previo, raiz_merkle, time.time(), dificultad)
 
         return self.cabecera
 
+    def raiz_merkle_transacciones(self):
+        """Función para calcular la raíz Merkle de las transacciones del bloque según la versión de su cabecera
+
+        Returns:
+            string: Raíz Merkle
+        """
+
+        return calcular_raiz_merkle(self.transacciones, self.cabecera["version"])
+
+    def prefijo_cabecera(self):
+        """Función para obtener la parte constante de la cabecera binaria, todo salvo el nonce
+
+        Returns:
+            bytes: Prefijo de la cabecera
+        """
+
+        return self.cabecera.prefijo()
+
+    def serializar_cabecera(self):
+        """Función para obtener la cabecera binaria, con el nonce en los bytes finales
+
+        Returns:
+            bytes: Cabecera binaria
+        """
+
+        return self.cabecera.serializar()
+
+    def preparar_hash(self):
+        """Función para obtener una función de hash por nonce, reutilizando el midstate del prefijo
+
+        Returns:
+            function: Recibe un nonce y devuelve el hash de bloque con ese nonce
+        """
+
+        # Cabecera antigua, se conserva el cálculo sobre texto
+        if self.cabecera["version"] == VERSION_CABECERA_LEGACY:
+            cabecera = self.cabecera.a_dict()
+
+            def calcular(nonce):
+                cabecera["nonce"] = nonce
+                return sha256(str(sha256(json.dumps(str(cabecera)).encode()).hexdigest()).encode()).hexdigest()
+
+            return calcular
+
+        midstate = sha256(self.prefijo_cabecera())
+
+        return lambda nonce: hash_con_midstate(midstate, nonce)
+
+    def hash_cabecera(self):
+        """Función para calcular el hash de bloque sin establecerlo
+
+        Returns:
+            string: Hash de bloque
+        """
+
+        # Doble SHA256 de la cabecera, en texto para la versión antigua
+        if self.cabecera["version"] == VERSION_CABECERA_LEGACY:
+            return sha256(str(
+                sha256(json.dumps(str(self.cabecera.a_dict())).encode()).hexdigest()).encode()).hexdigest()
+
+        return sha256(sha256(self.serializar_cabecera()).digest()).hexdigest()
+
     def calcular_hash(self):
         """Función para calcular el hash de bloque y establecerlo
 
@@ -72,21 +423,48 @@ class Bloque:
             string: Hash de bloque
         """
 
-        # Establecer doble SHA256 de la cabecera
-        self.hash = sha256(str(
-            sha256(json.dumps(str(self.cabecera)).encode()).hexdigest()).encode()).hexdigest()
+        self.hash = self.hash_cabecera()
 
         return self.hash
 
+    def anadir_transaccion(self, transaccion, tamano=None):
+        """Función para añadir una transacción al bloque actualizando su tamaño
+
+        Args:
+            transaccion (list): Transacción a añadir
+            tamano (integer, optional): Bytes de la transacción si ya se conocen. Por defecto se calculan.
+
+        Returns:
+            integer: Tamaño del bloque
+        """
+
+        self.transacciones.append(transaccion)
+        self.contador_transacciones += 1
+        self.tamano += tamano_transaccion(
+            transaccion) if tamano is None else tamano
+
+        return self.tamano
+
+    def tamano_codificacion(self):
+        """Función para calcular el tamaño del bloque a partir de su contenido, sin fiarse del declarado
+
+        Returns:
+            integer: Tamaño del bloque
+        """
+
+        return TAMANO_BLOQUE_VACIO + \
+            sum(tamano_transaccion(transaccion)
+                for transaccion in self.transacciones)
+
     def calcular_tamano(self):
-        """Función para calcular el tamaño del bloque y establecerlo
+        """Función para calcular el tamaño del bloque, la longitud de su codificación canónica, y establecerlo
 
         Returns:
             integer: Tamaño del bloque
         """
 
         # Establecer tamaño
-        self.tamano = asizeof.asizeof(self)
+        self.tamano = self.tamano_codificacion()
 
         return self.tamano
 
@@ -97,7 +475,7 @@ class Bloque:
 
 class Blockchain():
 
-    def __init__(self, dificultad, ip, puerto, listado_nodos, numero_minero, direccion_minero, clave_privada_minero):
+    def __init__(self, dificultad, ip, puerto, listado_nodos, numero_minero, direccion_minero, clave_privada_minero, trabajadores=1, cabecera_legacy=False, nucleo=NUCLEO_POR_DEFECTO, tamano_maximo_bloque=TAMANO_MAXIMO_BLOQUE, ruta_datos=None, comprobar_saldos=False):
         """Inicializador de la Blockchain
 
         Args:
@@ -108,6 +486,12 @@ class Blockchain():
             numero_minero (integer): Número identificativo del minero
             direccion_minero (string): Dirección de la cartera del minero, utilizada para la transacción recompensa
             clave_privada_minero (string): Clave privada de la cartera del minero, utilizada para la transacción recompensa
+            trabajadores (integer, optional): Número de procesos de minado. Por defecto 1.
+            cabecera_legacy (bool, optional): Minar con la cabecera antigua en texto. Por defecto False.
+            nucleo (string, optional): Núcleo de hash del minado: python. Por defecto python.
+            tamano_maximo_bloque (integer, optional): Bytes máximos de un bloque minado, los recibidos se limitan a TAMANO_MAXIMO_BLOQUE. Por defecto TAMANO_MAXIMO_BLOQUE.
+            ruta_datos (string, optional): Directorio del almacén de bloques en disco. Por defecto sin persistencia.
+            comprobar_saldos (bool, optional): Rechazar en el mempool las transacciones sin saldo suficiente. Por defecto False.
         """
 
         # Parametros
@@ -115,19 +499,75 @@ class Blockchain():
         self.ip = ip
         self.puerto = puerto
         self.listado_nodos = listado_nodos
+        # Telemetría del nodo en formato Prometheus
+        self.metricas = RegistroMetricas()
+        self.cliente_nodos = ClienteNodos(
+            listado_nodos, metricas=self.metricas)
         self.numero_minero = numero_minero.split("-")[0]
         self.direccion_minero = direccion_minero
         self.clave_privada_minero = clave_privada_minero
-        # Transacciones
-        self.transacciones_no_confirmadas = []
+        self.version_cabecera = VERSION_CABECERA_LEGACY if cabecera_legacy else VERSION_CABECERA
+        self.tamano_maximo_bloque = min(tamano_maximo_bloque, TAMANO_MAXIMO_BLOQUE)
+        # Transacciones no confirmadas
+        self.mempool = Mempool()
+        # Árboles Merkle de bloques para pruebas de inclusión
+        self._arboles_bloques = OrderedDict()
         # Blockchain propia
-        self.blockchain = []
-        # Otras blockchains
-        self.blockchains_nodos = []
+        self.blockchain = SecuenciaBloques()
+        # Índices por hash, transacción y dirección
+        self.indices = IndicesBlockchain()
+        # Saldos por dirección
+        self.estado = EstadoSaldos()
+        self.comprobar_saldos = comprobar_saldos
+        # Trabajo acumulado hasta cada altura
+        self._trabajo = []
+        # Serialización de la Blockchain para los nodos
+        self.serializacion = CacheSerializacion()
+        # Bloques ya validados por hash, para no repetir la prueba de trabajo, con su tamaño
+        self._bloques_validados = OrderedDict()
+        self._bytes_validados = 0
+        self._lock_validados = threading.Lock()
+        # Otras blockchains, una por bifurcación y con memoria acotada
+        self.blockchains_nodos = AlmacenBifurcaciones()
         # Multithreading
         self._lock = threading.Lock()
-        # Inicio creación bloque Génesis
-        self.generar_bloque_genesis()
+        self._lock_blockchain = threading.RLock()
+        # Aviso de cambios en la Blockchain, para los eventos del explorador
+        self._aviso_cambios = threading.Condition(self._lock_blockchain)
+        self.version_blockchain = 0
+        # Sincronización en segundo plano
+        self.cancelar_minado = threading.Event()
+        self._detener_sincronizacion = threading.Event()
+        self._despertar_sincronizacion = threading.Event()
+        self._hilo_sincronizacion = None
+        # Difusión de bloques, hashes ya vistos
+        self._bloques_vistos = OrderedDict()
+        self._lock_vistos = threading.Lock()
+        # Minado en paralelo
+        self.motor_minado = MotorMinado(trabajadores, nucleo)
+        # Verificación de firmas en paralelo
+        self.verificador_firmas = VerificadorFirmas(trabajadores)
+        # Validación de Blockchains largas en paralelo
+        self.validador = ValidadorBlockchain(trabajadores)
+        self.intentos_ultima_prueba = 0
+        # Almacén de bloques en disco
+        self.almacen = AlmacenBloques(ruta_datos) if ruta_datos else None
+
+        # Estructuras derivadas de la Blockchain, actualizadas en este orden tras cada cambio
+        self._observadores = []
+        for observador in (self.indices.actualizar, self.estado.actualizar, self.actualizar_trabajo,
+                           self.serializacion.actualizar, self.persistir_bloques, self.mempool.actualizar,
+                           self.depurar_mempool, self.avisar_cambios):
+            self.registrar_observador(observador)
+
+        self.crear_metricas()
+
+        # Blockchain persistida o, si no la hay, creación bloque Génesis
+        if self.almacen is not None and len(self.almacen):
+            self.cargar_blockchain()
+        else:
+            self.generar_bloque_genesis()
+            self.registrar_cambios(0)
 
     def generar_bloque_genesis(self):
         """Función que inicializa el bloque Génesis
@@ -142,7 +582,7 @@ class Blockchain():
         genesis_block = Bloque(0,
                                [self.obtener_transaccion_genesis()])
         genesis_block.construir_cabecera(
-            "0000000000000000000000000000000000000000000000000000000000000000", self.obtener_transaccion_genesis(), self.dificultad)
+            "0000000000000000000000000000000000000000000000000000000000000000", self.obtener_transaccion_genesis(), self.dificultad, VERSION_CABECERA_LEGACY)
         genesis_block.cabecera["timestamp"] = 1654065166.5091279
         genesis_block.cabecera["nonce"] = 4266222
         genesis_block.hash = "0000000000000000000000000000000000000000000000000000000000000001"
@@ -157,6 +597,263 @@ class Blockchain():
 
         print("¡Bloque génesis generado!\n")
 
+    ################################################
+    # Funciones de persistencia
+    ################################################
+
+    def cargar_blockchain(self):
+        """Función que carga la Blockchain desde el almacén de bloques en disco. Los bloques se leen
+        de la proyección en memoria al accederlos; los índices, los saldos y el trabajo se cargan
+        de lo guardado al cerrar y solo se completan con los bloques posteriores
+        """
+
+        print(
+            f"|------ CARGANDO BLOCKCHAIN... ------|\n| Dificultad: {self.dificultad}\t | Puerto: {self.puerto} | Bloques: {len(self.almacen)} |")
+
+        lector = LectorBloques(
+            self.almacen, lambda contenido: Bloque.desde_dict(json.loads(contenido)))
+        self.blockchain = SecuenciaBloques(lector, len(self.almacen))
+
+        self.indices.cargar(self.almacen.ruta, self.blockchain)
+        self.estado.cargar(self.almacen.ruta, self.blockchain)
+        self.cargar_trabajo()
+
+        print(f"¡Blockchain cargada hasta el bloque {self.ultimo_bloque.indice}!\n")
+
+    def crear_metricas(self):
+        """Función para crear las métricas del nodo. Los contadores se actualizan al minar y en el consenso,
+        los indicadores del estado y los hashes del motor de minado se calculan solo al consultarlos
+        """
+
+        self.metricas.contador("hashes_total", "Hashes calculados en las pruebas de trabajo",
+                               funcion=self.motor_minado.hashes_totales)
+        self.metricas.indicador("hashrate", "Hashes por segundo del motor de minado",
+                                funcion=self.motor_minado.hashrate)
+        self._bloques_minados = self.metricas.contador(
+            "bloques_minados_total", "Bloques minados y añadidos a la Blockchain propia")
+        self._bloques_huerfanos = self.metricas.contador(
+            "bloques_huerfanos_total", "Bloques descartados de la Blockchain propia en reorganizaciones")
+        self._reorganizaciones = self.metricas.contador(
+            "reorganizaciones_total", "Reorganizaciones de la Blockchain propia")
+        self._duracion_consenso = self.metricas.histograma(
+            "consenso_segundos", "Duración de las rondas de consenso por fase: descarga, eleccion y total", ("fase",))
+        self._duracion_serializacion = self.metricas.histograma(
+            "serializacion_segundos", "Duración de la serialización de la Blockchain para los nodos", ("tipo",))
+
+        self.metricas.indicador("altura", "Altura del último bloque de la Blockchain propia",
+                                funcion=lambda: self.ultimo_bloque.indice)
+        self.metricas.indicador("trabajo_acumulado", "Trabajo acumulado de la Blockchain propia",
+                                funcion=self.obtener_trabajo)
+        self.metricas.indicador("mempool_transacciones", "Transacciones no confirmadas en el mempool",
+                                funcion=lambda: self.mempool.estadisticas()["transacciones"])
+        self.metricas.indicador("mempool_bytes", "Bytes de las transacciones no confirmadas en el mempool",
+                                funcion=lambda: self.mempool.estadisticas()["bytes"])
+        self.metricas.indicador("bifurcaciones", "Blockchains de otros nodos guardadas",
+                                funcion=lambda: self.blockchains_nodos.estadisticas()["bifurcaciones"])
+
+        self.registrar_observador(self.medir_cambios)
+
+    def medir_cambios(self, blockchain, desde, huerfanos=()):
+        """Función para contar los bloques descartados en cada cambio de la Blockchain
+
+        Args:
+            blockchain (list): Blockchain propia
+            desde (integer): Primera altura que ha cambiado
+            huerfanos (list, optional): Bloques descartados. Por defecto ninguno.
+        """
+
+        if huerfanos:
+            self._bloques_huerfanos.incrementar(len(huerfanos))
+            self._reorganizaciones.incrementar()
+
+    def registrar_observador(self, observador):
+        """Función para registrar una función a la que se avisa tras cada cambio de la Blockchain,
+        con el lock de la Blockchain tomado y después de las ya registradas
+
+        Args:
+            observador (function): Recibe la Blockchain, la primera altura que ha cambiado y los bloques descartados
+        """
+
+        self._observadores.append(observador)
+
+    def registrar_cambios(self, desde, huerfanos=()):
+        """Función para avisar a los observadores tras cambiar la Blockchain, solo cambia el sufijo desde una altura
+
+        Args:
+            desde (integer): Primera altura que ha cambiado
+            huerfanos (list, optional): Bloques descartados desde esa altura. Por defecto ninguno.
+        """
+
+        with self._lock_blockchain:
+            for observador in self._observadores:
+                observador(self.blockchain, desde, huerfanos)
+
+    def actualizar_trabajo(self, blockchain, desde, huerfanos=()):
+        """Función para dejar el trabajo acumulado igual a la Blockchain a partir de una altura
+
+        Args:
+            blockchain (list): Blockchain propia
+            desde (integer): Primera altura que ha cambiado
+            huerfanos (list, optional): Bloques descartados. Por defecto ninguno.
+        """
+
+        del self._trabajo[desde:]
+
+        for bloque in blockchain[len(self._trabajo):]:
+            self._trabajo.append(
+                (self._trabajo[-1] if self._trabajo else 0) + trabajo_bloque(bloque))
+
+    def depurar_mempool(self, blockchain, desde, huerfanos=()):
+        """Función para quitar del mempool, si se comprueban los saldos, las transacciones
+        recuperadas de bloques descartados que gastan saldo que ya no existe
+
+        Args:
+            blockchain (list): Blockchain propia
+            desde (integer): Primera altura que ha cambiado
+            huerfanos (list, optional): Bloques descartados. Por defecto ninguno.
+        """
+
+        if self.comprobar_saldos and huerfanos:
+            self.mempool.eliminar(self.mempool.sin_saldo(self.estado.saldo))
+
+    def avisar_cambios(self, blockchain, desde, huerfanos=()):
+        """Función para despertar a los que esperan cambios de la Blockchain
+        """
+
+        with self._aviso_cambios:
+            self.version_blockchain += 1
+            self._aviso_cambios.notify_all()
+
+    def esperar_cambios(self, version, espera=None):
+        """Función para esperar a que cambie la Blockchain
+
+        Args:
+            version (integer): Última versión conocida de la Blockchain
+            espera (float, optional): Segundos máximos de espera. Por defecto sin límite.
+
+        Returns:
+            integer: Versión actual de la Blockchain, igual a la conocida si no ha cambiado
+        """
+
+        with self._aviso_cambios:
+            self._aviso_cambios.wait_for(
+                lambda: self.version_blockchain != version, espera)
+            return self.version_blockchain
+
+    def cerrar_almacen(self):
+        """Función para guardar los índices y cerrar el almacén en disco
+        """
+
+        if self.almacen is None:
+            return
+
+        with self._lock_blockchain:
+            ultimo_hash = self.ultimo_bloque.hash
+
+            self.indices.guardar(self.almacen.ruta)
+            self.estado.guardar(self.almacen.ruta, ultimo_hash)
+            guardar_json(os.path.join(self.almacen.ruta, NOMBRE_TRABAJO),
+                         {"hash": ultimo_hash, "trabajo": self._trabajo})
+            self.almacen.cerrar()
+
+    def cargar_trabajo(self):
+        """Función para cargar el trabajo acumulado guardado y completarlo con los bloques posteriores.
+        Si no coincide con la Blockchain, se recalcula desde el génesis.
+        """
+
+        guardado = cargar_json(os.path.join(
+            self.almacen.ruta, NOMBRE_TRABAJO)) or {"hash": None, "trabajo": []}
+        altura = len(guardado["trabajo"])
+
+        if 0 < altura <= len(self.blockchain) and self.blockchain[altura - 1].hash == guardado["hash"]:
+            self._trabajo = guardado["trabajo"]
+        else:
+            self._trabajo = []
+
+        self.actualizar_trabajo(self.blockchain, len(self._trabajo))
+
+    def persistir_bloques(self, blockchain, desde, huerfanos=()):
+        """Función para dejar el almacén en disco igual a la Blockchain a partir de una altura
+
+        Args:
+            blockchain (list): Blockchain propia
+            desde (integer): Primera altura a escribir, las posteriores en disco se descartan
+            huerfanos (list, optional): Bloques descartados. Por defecto ninguno.
+        """
+
+        if self.almacen is None:
+            return
+
+        self.almacen.truncar(desde)
+        for bloque in blockchain[desde:]:
+            self.almacen.anadir(json.dumps(
+                bloque.a_dict(), separators=(',', ':'), ensure_ascii=False).encode())
+
+    def altura_divergencia(self, blockchain):
+        """Función para obtener la primera altura en la que otra Blockchain difiere de la propia.
+        Al estar los bloques enlazados por hash, coinciden todos hasta esa altura y ninguno después,
+        así que basta con buscarla en el índice por hash con saltos crecientes y búsqueda binaria.
+
+        Args:
+            blockchain (list): Blockchain válida a comparar
+
+        Returns:
+            integer: Primera altura distinta
+        """
+
+        def coincide(altura):
+            return self.indices.altura(blockchain[altura].hash) == altura
+
+        with self._lock_blockchain:
+            # 1 - Saltos hacia atrás desde el final, las bifurcaciones suelen ser cortas
+            fallo = min(len(self.blockchain), len(blockchain))
+            altura = fallo - 1
+            salto = 1
+
+            while altura >= 0 and not coincide(altura):
+                fallo = altura
+                altura -= salto
+                salto *= 2
+
+            # 2 - Búsqueda binaria entre el último bloque que coincide y el primero que no
+            acierto = max(altura, -1)
+
+            while fallo - acierto > 1:
+                medio = (acierto + fallo) // 2
+                if coincide(medio):
+                    acierto = medio
+                else:
+                    fallo = medio
+
+            return fallo
+
+    def obtener_trabajo(self):
+        """Función para obtener el trabajo acumulado de la Blockchain propia
+
+        Returns:
+            integer: Trabajo acumulado
+        """
+
+        with self._lock_blockchain:
+            return self._trabajo[-1] if self._trabajo else 0
+
+    def trabajo_acumulado(self, blockchain):
+        """Función para calcular el trabajo acumulado de una Blockchain, usando el de la propia
+        hasta la altura en la que difieren
+
+        Args:
+            blockchain (list): Blockchain válida
+
+        Returns:
+            integer: Trabajo acumulado
+        """
+
+        with self._lock_blockchain:
+            divergencia = self.altura_divergencia(blockchain)
+            trabajo = self._trabajo[divergencia - 1] if divergencia > 0 else 0
+
+        return trabajo + sum(trabajo_bloque(bloque) for bloque in blockchain[divergencia:])
+
     ################################################
     # Funciones Prueba de Trabajo
     ################################################
@@ -172,29 +869,46 @@ class Blockchain():
             bool: True o False
         """
 
-        return (hash.startswith('0' * self.dificultad) and
-                hash == bloque.calcular_hash())
+        if not hash.startswith('0' * self.dificultad):
+            return False
+
+        # La dificultad declarada cuenta como trabajo en el consenso
+        try:
+            if bloque.cabecera["dificultad"] != self.dificultad:
+                return False
+        except (TypeError, KeyError):
+            return False
+
+        # Sin modificar el bloque validado, el génesis conserva su hash fijo
+        try:
+            return hash == bloque.hash_cabecera()
+        except (ValueError, TypeError, KeyError, struct.error):
+            return False
 
     def prueba_de_trabajo(self, bloque, verificador=True):
         """Función del algoritmo prueba de trabajo
 
         Args:
             bloque (Bloque): Bloque a trabajar
+            verificador (bool, optional): Abortar si la sincronización cancela el minado. Por defecto True.
 
         Returns:
-            string: Hash válido de bloque
+            string: Hash válido de bloque, 0 si otra Blockchain ganadora interrumpe la búsqueda
         """
-        hash_calculado = bloque.calcular_hash()
 
-        while not hash_calculado.startswith('0' * self.dificultad):
-            bloque.cabecera['nonce'] += 1
-            hash_calculado = bloque.calcular_hash()
+        # Comprobación barata del evento, sin red dentro de la búsqueda
+        def detener(intentos):
+            return verificador and self.cancelar_minado.is_set()
 
-            if bloque.cabecera['nonce'] % int(('1' * self.dificultad)) == 0 and verificador:
-                if self.consenso():
-                    return 0
+        nonce, self.intentos_ultima_prueba = self.motor_minado.buscar(
+            bloque, self.dificultad, bloque.cabecera['nonce'], detener)
+
+        if nonce is None:
+            return 0
 
-        return hash_calculado
+        bloque.cabecera['nonce'] = nonce
+
+        return bloque.calcular_hash()
 
     ################################################
     # Funciones de bloque
@@ -207,7 +921,10 @@ class Blockchain():
         Returns:
             Bloque: Último bloque de la Blockchain
         """
-        return self.blockchain[-1]
+
+        # Las reorganizaciones cambian la lista en su sitio
+        with self._lock_blockchain:
+            return self.blockchain[-1]
 
     def anadir_bloque(self, bloque, hash):
         """Función para añadir un bloque a la Blockchain
@@ -220,18 +937,20 @@ class Blockchain():
             bool: True o False
         """
 
-        # Comprobar hash previo de la cabecera
-        hash_previo = self.ultimo_bloque.hash
+        with self._lock_blockchain:
+            # Comprobar hash previo de la cabecera
+            hash_previo = self.ultimo_bloque.hash
 
-        if hash_previo != bloque.cabecera["hash_previo"]:
-            return False
+            if hash_previo != bloque.cabecera["hash_previo"]:
+                return False
 
-        # Comprobar validez hash
-        if not self.es_hash_valido(bloque, hash):
-            return False
+            # Comprobar validez hash
+            if not self.es_hash_valido(bloque, hash):
+                return False
 
-        # Añadir a la Blockchain
-        self.blockchain.append(bloque)
+            # Añadir a la Blockchain
+            self.blockchain.append(bloque)
+            self.registrar_cambios(len(self.blockchain) - 1)
 
         return True
 
@@ -253,62 +972,200 @@ class Blockchain():
         # Comprobar longitud
         if len(clave_privada) == 64:
 
-            firma, fecha = self.firmar_transaccion_ECDSA(clave_privada)
+            firma, fecha = self.firmar_transaccion_ECDSA(
+                clave_privada, emisor, receptor, cantidad, concepto)
 
             transaction = [f"De: {emisor}", f"Para: {receptor}",
-                           f"Cantidad: {cantidad}", f"concepto: {concepto}", f"Fecha: {fecha}"]
+                           f"Cantidad: {cantidad}", f"concepto: {concepto}", f"Fecha: {fecha}", f"Firma: {firma}"]
 
-            if self.verificar_firma(emisor, firma.decode(), fecha):
-                self.transacciones_no_confirmadas.append(transaction)
+            if self.verificar_firma(emisor, firma, mensaje_transaccion(emisor, receptor, cantidad, concepto, fecha)):
+                self.anadir_a_mempool(transaction)
             else:
                 print("Transacción fallida. Firma no válida.")
         else:
             print("¡Dirección errónea o longitud de clave no válida!")
 
-    def firmar_transaccion_ECDSA(self, clave_privada):
-        """Función para firmar una transacción
+    def firmar_transaccion_ECDSA(self, clave_privada, emisor, receptor, cantidad, concepto):
+        """Función para firmar una transacción: emisor, receptor, cantidad, concepto y fecha
 
         Args:
             clave_privada (string): Clave privada utilizada en la transacción
-
-        Returns:
-            string, string: Firma y mensaje codificados
+            emisor (string): Emisor de la transacción
+            receptor (string): Receptor de la transacción
+            cantidad (string): Cantidad de la transacción
+            concepto (string): Concepto de la transacción
+
+        Returns:
+            string, string: Firma en base64 y fecha firmada
         """
 
-        # Obtener el timestamp actual en string, codificarlo y añadirlo a la firma
+        # Obtener el timestamp actual en string y firmarlo junto al resto de campos
         fecha = str(datetime.now())
-        fecha_codificada = fecha.encode()
 
-        clave_firmado = ecdsa.SigningKey.from_string(
-            bytes.fromhex(clave_privada), curve=ecdsa.SECP256k1)
-
-        firma = base64.b64encode(clave_firmado.sign(fecha_codificada))
+        firma = firmar_mensaje(clave_privada, mensaje_transaccion(
+            emisor, receptor, cantidad, concepto, fecha))
 
         return firma, fecha
 
-    def verificar_firma(self, clave_publica, firma, fecha):
+    def verificar_firma(self, clave_publica, firma, mensaje):
         """Función para verificar la firma de una transacción
 
         Args:
             clave_publica (string): Clave pública de la transacción
             firma (string): Firma en base64
-            fecha (string): Fecha firmado
+            mensaje (string): Mensaje firmado, de firmas.mensaje_transaccion
 
         Returns:
             bool: True o False
         """
 
-        clave_publica = (base64.b64decode(clave_publica)).hex()
-        firma = base64.b64decode(firma)
+        # Clave de verificación en caché por dirección
+        return verificar_firma(clave_publica, firma, mensaje)
 
-        comprobar_clave_firmado = ecdsa.VerifyingKey.from_string(
-            bytes.fromhex(clave_publica), curve=ecdsa.SECP256k1)
+    def anadir_transacciones_firmadas(self, transacciones):
+        """Función para añadir un lote de transacciones ya firmadas, verificando las firmas en paralelo
 
-        try:
-            return comprobar_clave_firmado.verify(firma, fecha.encode())
-        except:
+        Args:
+            transacciones (list): Transacciones con emisor, receptor, cantidad, concepto, fecha y firma
+
+        Returns:
+            integer: Número de transacciones añadidas, sin contar las repetidas
+        """
+
+        # Firma sobre todos los campos, una firma no sirve para otro receptor o cantidad
+        firmas = [(transaccion["emisor"], transaccion["firma"],
+                   mensaje_transaccion(transaccion["emisor"], transaccion["receptor"], transaccion["cantidad"],
+                                       transaccion["concepto"], transaccion["fecha"]))
+                  for transaccion in transacciones]
+        validas = self.verificador_firmas.verificar_lote(firmas)
+        anadidas = 0
+
+        for transaccion, valida in zip(transacciones, validas):
+            if not valida:
+                continue
+
+            transaction = [f"De: {transaccion['emisor']}", f"Para: {transaccion['receptor']}",
+                           f"Cantidad: {transaccion['cantidad']}", f"concepto: {transaccion['concepto']}", f"Fecha: {transaccion['fecha']}",
+                           f"Firma: {transaccion['firma']}"]
+
+            if self.anadir_a_mempool(transaction):
+                anadidas += 1
+
+        return anadidas
+
+    def anadir_a_mempool(self, transaccion):
+        """Función para añadir una transacción al mempool si no está ya confirmada ni pendiente
+        y, si se comprueban los saldos, si el emisor tiene saldo para ella y las que ya tiene pendientes
+
+        Args:
+            transaccion (list): Transacción
+
+        Returns:
+            bool: True o False
+        """
+
+        txid = hash_transaccion(transaccion)
+
+        with self._lock_blockchain:
+            if self.indices.transaccion(txid) is not None:
+                return False
+
+            if self.comprobar_saldos and not self.tiene_saldo(transaccion):
+                return False
+
+            # Bajo el lock, para que dos transacciones del mismo emisor no gasten el mismo saldo
+            return self.mempool.anadir(transaccion, txid)
+
+    def tiene_saldo(self, transaccion):
+        """Función que comprueba si el emisor de una transacción puede pagarla
+
+        Args:
+            transaccion (list): Transacción
+
+        Returns:
+            bool: True o False
+        """
+
+        if es_transaccion_red(transaccion):
+            return True
+
+        cantidad = cantidad_transaccion(transaccion)
+        if cantidad is None:
             return False
 
+        emisor = campos_transaccion(transaccion).get("de")
+
+        with self._lock_blockchain:
+            disponible = self.estado.saldo(
+                emisor) - self.mempool.gasto_pendiente(emisor)
+
+        return cantidad <= disponible
+
+    def obtener_saldo(self, direccion):
+        """Función para obtener el saldo de una dirección
+
+        Args:
+            direccion (string): Dirección de la cartera
+
+        Returns:
+            dict: Saldo confirmado, cantidad pendiente de gastar en el mempool y altura del saldo
+        """
+
+        with self._lock_blockchain:
+            return {"direccion": direccion, "saldo": str(self.estado.saldo(direccion)),
+                    "pendiente": str(self.mempool.gasto_pendiente(direccion)),
+                    "altura": len(self.estado) - 1}
+
+    def obtener_prueba_inclusion(self, txid):
+        """Función para obtener la prueba de inclusión Merkle de una transacción confirmada
+
+        Args:
+            txid (string): Hash de la transacción
+
+        Returns:
+            dict: Bloque, raíz Merkle y prueba de inclusión, None si no está en la Blockchain
+        """
+
+        with self._lock_blockchain:
+            ubicacion = self.indices.transaccion(txid)
+            if ubicacion is None:
+                return None
+
+            altura, posicion = ubicacion
+            bloque = self.blockchain[altura]
+
+        # Solo las cabeceras binarias tienen un árbol Merkle real
+        if bloque.cabecera["version"] == VERSION_CABECERA_LEGACY:
+            return None
+
+        arbol = self.obtener_arbol_bloque(bloque)
+
+        return {"txid": txid, "indice": bloque.indice, "hash": bloque.hash,
+                "raiz_merkle": bloque.cabecera["raiz_merkle"], "posicion": posicion, "prueba": arbol.prueba(posicion)}
+
+    def obtener_arbol_bloque(self, bloque):
+        """Función para obtener el árbol Merkle de un bloque, con caché de los más recientes
+
+        Args:
+            bloque (Bloque): Bloque
+
+        Returns:
+            ArbolMerkle: Árbol Merkle de las transacciones del bloque
+        """
+
+        arbol = self._arboles_bloques.get(bloque.hash)
+
+        if arbol is None:
+            arbol = ArbolMerkle(bloque.transacciones)
+
+            with self._lock_blockchain:
+                self._arboles_bloques[bloque.hash] = arbol
+
+                if len(self._arboles_bloques) > MAXIMO_ARBOLES_CACHE:
+                    self._arboles_bloques.popitem(last=False)
+
+        return arbol
+
     def obtener_transaccion_genesis(self):
         """Función para obtener la transacción Genesis por defecto
 
@@ -331,8 +1188,10 @@ class Blockchain():
         """Función para añadir la transacción recompensa al listado de transacciones no confirmadas
         """
 
-        transaction = self.obtener_transaccion_recompensa()
-        self.transacciones_no_confirmadas.append(transaction)
+        # Una sola recompensa pendiente, la del próximo bloque. Bajo el lock, como el resto de cambios del mempool
+        with self._lock_blockchain:
+            self.mempool.anadir_recompensa(
+                self.obtener_transaccion_recompensa())
 
     ################################################
     # Funciones de Consenso
@@ -346,42 +1205,188 @@ class Blockchain():
         """
         # print("\nBuscando consenso...")
 
-        # 1 - Más larga la del minero, por ahora
-        blockchain_mas_larga = self.blockchain
+        inicio = time.perf_counter()
 
-        # 2 - Buscar nuevas blockchains
+        # 1 - Buscar nuevas blockchains, sin bloquear la Blockchain durante la red
         self.encontrar_nuevas_blockchains()
+        descarga = time.perf_counter()
+
+        with self._lock_blockchain:
+            reemplazada = self._elegir_blockchain()
+
+        fin = time.perf_counter()
+        self._duracion_consenso.observar(descarga - inicio, fase="descarga")
+        self._duracion_consenso.observar(fin - descarga, fase="eleccion")
+        self._duracion_consenso.observar(fin - inicio, fase="total")
+
+        return reemplazada
+
+    def _elegir_blockchain(self):
+        """Función que elige la Blockchain ganadora entre la propia y las de los nodos
+
+        Returns:
+            bool: True o False, True si existe otra Blockchain ganadora que no sea la del minero
+        """
+
+        # 2 - La del minero, por ahora
+        blockchain_ganadora = self.blockchain
+        trabajo_ganador = self._trabajo[-1]
 
-        # 3 - Obtener la Blockchain más larga con el menor timestamp
+        # 3 - Obtener la Blockchain con más trabajo acumulado y, a igual trabajo, con el menor timestamp
         for blockchain in self.blockchains_nodos:
-            if(len(blockchain_mas_larga) < len(blockchain)):
-                blockchain_mas_larga = blockchain
-
-            # La Blockchain del minero mide igual que la más larga pero diferente timestamp
-            elif(len(blockchain_mas_larga) == len(blockchain) and (blockchain_mas_larga[-1].cabecera['timestamp'] != blockchain[-1].cabecera['timestamp'])):
-                # Si el timestamp de la más larga es mayor que el comparado
-                if(blockchain_mas_larga[-1].cabecera['timestamp'] > blockchain[-1].cabecera['timestamp']):
-                    blockchain_mas_larga = blockchain
-
-        # 4 - Comparamos la blockchain más larga con la nuestra
-        # La blockchain más larga no es la nuestra
-        if(len(blockchain_mas_larga) > len(self.blockchain)):
-            self.reemplazar_blockchain(blockchain_mas_larga)
-            return True
+            trabajo = self.trabajo_acumulado(blockchain)
 
-        # La Blockchain del minero mide igual que la más larga
-        elif(((len(blockchain_mas_larga) == len(self.blockchain)) and (blockchain_mas_larga[-1].cabecera['timestamp'] != self.ultimo_bloque.cabecera['timestamp']))):
-            # Nuestra blockchain no es la que tiene menor timestamp
-            if(self.ultimo_bloque.cabecera['timestamp'] > blockchain_mas_larga[-1].cabecera['timestamp']):
-                self.reemplazar_blockchain(blockchain_mas_larga)
-                return True
+            if trabajo > trabajo_ganador or (trabajo == trabajo_ganador and blockchain[-1].cabecera['timestamp'] < blockchain_ganadora[-1].cabecera['timestamp']):
+                blockchain_ganadora = blockchain
+                trabajo_ganador = trabajo
 
-        # Si nada de lo anterior sucede, nuestra blockchain es la más larga
-        elif(((len(blockchain_mas_larga) == len(self.blockchain)) and (self.ultimo_bloque.cabecera['timestamp'] == blockchain_mas_larga[-1].cabecera['timestamp']))):
+        # 4 - Si nada de lo anterior sucede, nuestra blockchain es la ganadora
+        if blockchain_ganadora is self.blockchain:
             return False
 
+        self.reemplazar_blockchain(blockchain_ganadora)
+        return True
+
+    def iniciar_sincronizacion(self, intervalo=1):
+        """Función para iniciar el consenso en un hilo en segundo plano
+
+        Args:
+            intervalo (float, optional): Segundos entre rondas de consenso. Por defecto 1.
+        """
+
+        if self._hilo_sincronizacion is not None:
+            return
+
+        self._detener_sincronizacion.clear()
+        self._hilo_sincronizacion = threading.Thread(
+            target=self._bucle_sincronizacion, args=(intervalo,), daemon=True)
+        self._hilo_sincronizacion.start()
+
+    def detener_sincronizacion(self):
+        """Función para detener el hilo de consenso en segundo plano
+        """
+
+        if self._hilo_sincronizacion is None:
+            return
+
+        self._detener_sincronizacion.set()
+        self._despertar_sincronizacion.set()
+        self._hilo_sincronizacion.join()
+        self._hilo_sincronizacion = None
+
+    def _bucle_sincronizacion(self, intervalo):
+        """Función del hilo de sincronización, cancela el minado en curso si gana otra Blockchain
+
+        Args:
+            intervalo (float): Segundos entre rondas de consenso
+        """
+
+        while not self._detener_sincronizacion.is_set():
+            try:
+                if self.consenso():
+                    self.cancelar_minado.set()
+            except Exception as error:
+                print(f"Error en la sincronización: {error}")
+
+            # Espera al intervalo o a un bloque anunciado que no enlaza con el propio
+            self._despertar_sincronizacion.wait(intervalo)
+            self._despertar_sincronizacion.clear()
+
+    ################################################
+    # Funciones de difusión de bloques
+    ################################################
+
+    def marcar_visto(self, hash):
+        """Función para recordar un bloque anunciado
+
+        Args:
+            hash (string): Hash del bloque
+
+        Returns:
+            bool: True si no se había visto antes
+        """
+
+        with self._lock_vistos:
+            if hash in self._bloques_vistos:
+                self._bloques_vistos.move_to_end(hash)
+                return False
+
+            self._bloques_vistos[hash] = True
+            while len(self._bloques_vistos) > MAXIMO_BLOQUES_VISTOS:
+                self._bloques_vistos.popitem(last=False)
+
+            return True
+
+    def anunciar_bloque(self, bloque, origen=None):
+        """Función para enviar un bloque a los nodos, salvo al que lo ha anunciado
+
+        Args:
+            bloque (Bloque): Bloque a anunciar
+            origen (string, optional): URL del nodo que lo ha anunciado. Por defecto ninguno.
+        """
+
+        self.marcar_visto(bloque.hash)
+        self.cliente_nodos.difundir("/bloque", {"bloque": bloque.a_dict(), "origen": f"http://{self.ip}:{self.puerto}"},
+                                    excluir=(origen,))
+
+    def recibir_bloque(self, datos, origen=None):
+        """Función para procesar un bloque anunciado por otro nodo: si enlaza con el último bloque
+        se valida, se añade y se reenvía una vez; si va por delante se reenvía con solo la prueba
+        de trabajo comprobada y se sincroniza con los nodos. La validación se hace sin el lock
+        de la Blockchain, que solo se toma para comprobar de nuevo el enlace y añadirlo
+
+        Args:
+            datos (dict): Bloque en forma JSON
+            origen (string, optional): URL del nodo que lo ha anunciado. Por defecto ninguno.
+
+        Returns:
+            string: Resultado: visto, anadido, invalido, sincronizando o antiguo
+        """
+
+        bloque = Bloque.desde_dict(datos)
+
+        # Solo se marca como visto tras validarlo, un bloque falso no bloquea al verdadero
+        with self._lock_vistos:
+            if bloque.hash in self._bloques_vistos:
+                return "visto"
+
+        ultimo_bloque = self.ultimo_bloque
+
+        if bloque.indice <= ultimo_bloque.indice:
+            return "antiguo"
+
+        # 1 - Enlaza con el último bloque propio: prueba de trabajo, raíz Merkle y firmas sin bloquear la Blockchain
+        if bloque.indice == ultimo_bloque.indice + 1 and bloque.cabecera["hash_previo"] == ultimo_bloque.hash:
+            bloque_validado = self.validar_bloque(bloque)
+
+            if bloque_validado is None:
+                return "invalido"
+
+            # Con el lock, solo si sigue enlazando con el último bloque
+            if not self.anadir_bloque(bloque_validado, bloque_validado.hash):
+                return "visto" if self.obtener_altura(bloque.hash) is not None else "antiguo"
+
+            # El bloque en minado ya no enlaza con el último
+            self.cancelar_minado.set()
+            self.anunciar_bloque(bloque_validado, origen)
+
+            return "anadido"
+
+        # 2 - Bloque por delante o en otra bifurcación, solo se comprueba la prueba de trabajo
+        if not self.es_hash_valido(bloque, bloque.hash):
+            return "invalido"
+
+        if not self.marcar_visto(bloque.hash):
+            return "visto"
+
+        # Se reenvía igualmente, los nodos que van por detrás no cortan la difusión
+        self._despertar_sincronizacion.set()
+        self.anunciar_bloque(bloque, origen)
+
+        return "sincronizando"
+
     def encontrar_nuevas_blockchains(self):
-        """Función para encontrar nuevas Blockchains en los nodos
+        """Función para encontrar nuevas Blockchains en los nodos, descargando solo los bloques nuevos
 
         Returns:
             list: Nodos no listos aún
@@ -389,29 +1394,500 @@ class Blockchain():
 
         nodos_no_listos = []
 
-        for url_nodo in self.listado_nodos:
-            blockchain = []
-            try:
-                # bytes
-                blockchain_exportada = requests.get(
-                    url=url_nodo + "/blockchain", timeout=1).content
-                # bytes a json
-                blockchain_exportada = json.loads(blockchain_exportada)
-                # información a Bloque
-                for bloque in blockchain_exportada:
-                    bloque_copiado = Bloque(0, 0, bloque)
-                    blockchain.append(bloque_copiado)
-                validado = self.es_blockchain_valida(blockchain)
-                if validado:
-                    self.blockchains_nodos.append(blockchain)
-
-            except ConnectionError:
+        # Todos los nodos a la vez, la ronda dura lo que el nodo sano más lento
+        resultados = self.cliente_nodos.repartir(self.sincronizar_nodo)
+
+        for url_nodo, resultado in resultados.items():
+            if isinstance(resultado, ConnectionError):
                 nodos_no_listos.append(url_nodo)
 
+            # Nodo lento o respuesta no válida, se ignora en esta ronda
+            elif isinstance(resultado, Exception):
+                continue
+
+            elif resultado is not None:
+                self.blockchains_nodos.anadir(*resultado)
+
         return nodos_no_listos
 
+    def sincronizar_nodo(self, url_nodo):
+        """Función para obtener la Blockchain de un nodo a partir del ancestro común con la propia.
+        Primero se descargan y validan las cabeceras, después solo los bloques que faltan.
+
+        Args:
+            url_nodo (string): URL del nodo
+
+        Returns:
+            list, integer: Blockchain del nodo y altura del ancestro común, None si no es válida o no aporta bloques nuevos
+        """
+
+        with self._lock_blockchain:
+            blockchain_propia = self.blockchain.copia()
+
+        altura_propia = len(blockchain_propia) - 1
+        ventana = VENTANA_ANCESTRO
+
+        # 1 - Buscar el ancestro común ampliando la ventana de cabeceras hacia atrás
+        while True:
+            desde = max(0, altura_propia - ventana)
+            respuesta = self.cliente_nodos.obtener(
+                url_nodo, "/cabeceras", {"desde": desde})
+
+            # Nodo sin sincronización incremental
+            if respuesta.status_code == 404:
+                return self.descargar_blockchain(url_nodo)
+
+            cabeceras = json.loads(respuesta.content)
+            ancestro = self.buscar_ancestro_comun(blockchain_propia, cabeceras)
+
+            if ancestro is not None or desde == 0:
+                break
+            ventana *= 2
+
+        if ancestro is None:
+            return None
+
+        # 2 - Validar las cabeceras por encima del ancestro antes de pedir los bloques
+        nuevas_cabeceras = [Bloque.desde_dict(cabecera) for cabecera in cabeceras
+                            if cabecera["indice"] > ancestro]
+
+        if not nuevas_cabeceras:
+            return None
+
+        if not self.es_sufijo_valido(blockchain_propia[ancestro], nuevas_cabeceras, False):
+            return None
+
+        # 3 - Descargar solo el sufijo que falta
+        sufijo = self.descargar_bloques(url_nodo, ancestro + 1)
+
+        if sufijo is None or not self.es_sufijo_valido(blockchain_propia[ancestro], sufijo):
+            return None
+
+        blockchain = blockchain_propia.copia(ancestro + 1)
+        blockchain.extend(sufijo)
+
+        return blockchain, ancestro
+
+    def buscar_ancestro_comun(self, blockchain, cabeceras):
+        """Función para encontrar la altura del último bloque compartido con las cabeceras de un nodo
+
+        Args:
+            blockchain (list): Blockchain propia
+            cabeceras (list): Cabeceras del nodo, en orden de altura
+
+        Returns:
+            integer: Altura del ancestro común, None si no está entre las cabeceras
+        """
+
+        for cabecera in reversed(cabeceras):
+            indice = cabecera["indice"]
+            if indice < len(blockchain) and blockchain[indice].hash == cabecera["hash"]:
+                return indice
+
+        return None
+
+    def es_sufijo_valido(self, ancestro, sufijo, memorizar=True):
+        """Función para comprobar que un sufijo de bloques enlaza con el ancestro y es válido.
+        Los bloques ya validados se sustituyen en el sufijo por su copia validada.
+
+        Args:
+            ancestro (Bloque): Último bloque compartido
+            sufijo (list): Bloques (o cabeceras) posteriores al ancestro
+            memorizar (bool, optional): Sustituir y guardar los bloques validados, no con cabeceras sueltas. Por defecto True.
+
+        Returns:
+            bool: True o False
+        """
+
+        hash_previo = ancestro.hash
+        comprobados = set()
+
+        # Muchos bloques sin validar, como en la sincronización inicial: validación en paralelo
+        if memorizar and self.validador.trabajadores > 1:
+            nuevos = [bloque for bloque in sufijo
+                      if self.buscar_bloque_validado(bloque.hash) is None]
+
+            if len(nuevos) >= UMBRAL_PARALELO:
+                if self.validador.validar(nuevos, self.dificultad, True, enlaces=False)["errores"]:
+                    return False
+                comprobados = {id(bloque) for bloque in nuevos}
+
+        for posicion, bloque in enumerate(sufijo):
+            bloque_validado = self.validar_bloque(
+                bloque, memorizar, id(bloque) in comprobados)
+
+            if bloque_validado is None or bloque_validado.indice != ancestro.indice + 1 + posicion:
+                return False
+            if bloque_validado.cabecera["hash_previo"] != hash_previo:
+                return False
+
+            if memorizar:
+                sufijo[posicion] = bloque_validado
+            hash_previo = bloque_validado.hash
+
+        return True
+
+    def validar_bloque(self, bloque, memorizar=True, comprobado=False):
+        """Función para validar un bloque una sola vez por hash: prueba de trabajo y, con el bloque completo,
+        tamaño recalculado, raíz Merkle y firmas
+
+        Args:
+            bloque (Bloque): Bloque (o cabecera) a validar
+            memorizar (bool, optional): Bloque completo, se guarda si es válido. Por defecto True.
+            comprobado (bool, optional): Ya comprobado por el validador en paralelo. Por defecto False.
+
+        Returns:
+            Bloque: Copia ya validada con ese hash o el propio bloque si es válido, None si no es válido
+        """
+
+        bloque_validado = self.buscar_bloque_validado(bloque.hash)
+        if bloque_validado is not None:
+            return bloque_validado
+
+        # Tamaño a partir del contenido, el declarado por el nodo no es fiable
+        if memorizar and bloque.calcular_tamano() > TAMANO_MAXIMO_BLOQUE:
+            return None
+
+        if not comprobado:
+            # Las cabeceras sueltas no tienen transacciones que comprobar
+            if memorizar and motivo_invalidez(bloque, self.dificultad, True) is not None:
+                return None
+            if not memorizar and not self.es_hash_valido(bloque, bloque.hash):
+                return None
+
+        if memorizar:
+            self.memorizar_bloque_validado(bloque)
+
+        return bloque
+
+    def buscar_bloque_validado(self, hash):
+        """Función para obtener la copia ya validada de un bloque
+
+        Args:
+            hash (string): Hash del bloque
+
+        Returns:
+            Bloque: Bloque validado, None si no se ha validado antes
+        """
+
+        with self._lock_validados:
+            entrada = self._bloques_validados.get(hash)
+            if entrada is not None:
+                self._bloques_validados.move_to_end(hash)
+                return entrada[0]
+
+        # Los bloques de la Blockchain propia ya están validados
+        with self._lock_blockchain:
+            altura = self.indices.altura(hash)
+            if altura is not None:
+                return self.blockchain[altura]
+
+        return None
+
+    def memorizar_bloque_validado(self, bloque):
+        """Función para guardar un bloque validado, expulsando los usados hace más tiempo
+        por número de bloques y por bytes de su codificación
+
+        Args:
+            bloque (Bloque): Bloque validado
+        """
+
+        # Tamaño calculado, el declarado en la forma JSON no es fiable
+        tamano = bloque.tamano_codificacion()
+
+        with self._lock_validados:
+            anterior = self._bloques_validados.pop(bloque.hash, None)
+            if anterior is not None:
+                self._bytes_validados -= anterior[1]
+
+            self._bloques_validados[bloque.hash] = (bloque, tamano)
+            self._bytes_validados += tamano
+
+            while len(self._bloques_validados) > MAXIMO_BLOQUES_VALIDADOS or self._bytes_validados > PRESUPUESTO_BLOQUES_VALIDADOS:
+                _, (_, tamano_expulsado) = self._bloques_validados.popitem(last=False)
+                self._bytes_validados -= tamano_expulsado
+
+    def descargar_bloques(self, url_nodo, desde=0):
+        """Función para descargar los bloques de un nodo a partir de una altura, página a página en NDJSON,
+        creando cada bloque según llega sin guardar la respuesta completa
+
+        Args:
+            url_nodo (string): URL del nodo
+            desde (integer, optional): Altura del primer bloque. Por defecto 0.
+
+        Returns:
+            list: Bloques descargados, None si la Blockchain del nodo cambia durante la descarga
+        """
+
+        bloques = []
+        params = {"desde": desde, "limite": TAMANO_PAGINA}
+
+        while params is not None:
+            with self.cliente_nodos.obtener(url_nodo, "/flujo", params, stream=True) as respuesta:
+                # Nodo sin flujo NDJSON
+                if respuesta.status_code == 404:
+                    return [Bloque.desde_dict(bloque) for bloque in json.loads(self.cliente_nodos.obtener(
+                        url_nodo, "/bloques", {"desde": desde}).content)]
+
+                # Cursor no válido tras una reorganización del nodo, se reintenta en la siguiente ronda
+                if respuesta.status_code != 200:
+                    return None
+
+                for datos in leer_ndjson(respuesta.iter_lines()):
+                    bloques.append(Bloque.desde_dict(datos))
+
+                cursor = respuesta.headers.get("X-Cursor-Siguiente")
+
+            params = None if cursor is None else {
+                "cursor": cursor, "limite": TAMANO_PAGINA}
+
+        return bloques
+
+    def descargar_blockchain(self, url_nodo):
+        """Función para descargar la Blockchain completa de un nodo
+
+        Args:
+            url_nodo (string): URL del nodo
+
+        Returns:
+            list, integer: Blockchain del nodo y altura del ancestro común (ninguno), None si no es válida
+        """
+
+        blockchain = []
+
+        # bytes
+        blockchain_exportada = self.cliente_nodos.obtener(
+            url_nodo, "/blockchain").content
+        # bytes a json
+        blockchain_exportada = json.loads(blockchain_exportada)
+        # información a Bloque
+        for bloque in blockchain_exportada:
+            bloque_copiado = Bloque.desde_dict(bloque)
+            blockchain.append(bloque_copiado)
+
+        if self.es_blockchain_valida(blockchain):
+            return blockchain, -1
+
+        return None
+
+    def estadisticas(self):
+        """Función para obtener las estadísticas del nodo
+
+        Returns:
+            dict: Estadísticas del nodo
+        """
+
+        bifurcaciones = self.blockchains_nodos.estadisticas()
+        mempool = self.mempool.estadisticas()
+
+        return {"altura": self.ultimo_bloque.indice,
+                "bifurcaciones": bifurcaciones["bifurcaciones"],
+                "bytes_bifurcaciones": bifurcaciones["bytes"],
+                "mempool": mempool["transacciones"],
+                "bytes_mempool": mempool["bytes"],
+                "expulsadas_mempool": mempool["expulsadas"]}
+
+    def obtener_bloques(self, desde=0):
+        """Función para obtener los bloques a partir de una altura
+
+        Args:
+            desde (integer, optional): Altura del primer bloque. Por defecto 0.
+
+        Returns:
+            list: Bloques desde la altura indicada hasta el último
+        """
+
+        with self._lock_blockchain:
+            return self.blockchain[max(0, desde):]
+
+    def serializar_blockchain(self, comprimir=False):
+        """Función para obtener la Blockchain serializada desde la caché
+
+        Args:
+            comprimir (bool, optional): Cuerpo comprimido con gzip. Por defecto False.
+
+        Returns:
+            bytes, string: Cuerpo JSON y ETag fuerte
+        """
+
+        inicio = time.perf_counter()
+
+        with self._lock_blockchain:
+            blockchain = self.blockchain.copia()
+            generacion = self.serializacion.generacion
+
+        respuesta = self.serializacion.respuesta(
+            blockchain, generacion, comprimir)
+        self._duracion_serializacion.observar(
+            time.perf_counter() - inicio, tipo="blockchain")
+
+        return respuesta
+
+    def serializar_bloques(self, desde=0):
+        """Función para obtener los bloques serializados a partir de una altura desde la caché
+
+        Args:
+            desde (integer, optional): Altura del primer bloque. Por defecto 0.
+
+        Returns:
+            bytes: Listado JSON de los bloques
+        """
+
+        inicio = time.perf_counter()
+
+        with self._lock_blockchain:
+            blockchain = self.blockchain.copia()
+            generacion = self.serializacion.generacion
+
+        fragmentos = self.serializacion.fragmentos(
+            blockchain, generacion, max(0, desde))
+        self._duracion_serializacion.observar(
+            time.perf_counter() - inicio, tipo="bloques")
+
+        return fragmentos
+
+    def obtener_pagina_bloques(self, desde, limite, hash_previo=None):
+        """Función para obtener una página de bloques y el cursor de la siguiente
+
+        Args:
+            desde (integer): Altura del primer bloque
+            limite (integer): Bloques máximos de la página
+            hash_previo (string, optional): Hash que debe tener el bloque anterior, el del cursor. Por defecto no se comprueba.
+
+        Returns:
+            list, string: Bloques y cursor "altura:hash" del último si hay más, None si el cursor ya no es válido
+        """
+
+        desde = max(0, desde)
+
+        with self._lock_blockchain:
+            if hash_previo is not None and (desde == 0 or desde > len(self.blockchain) or self.blockchain[desde - 1].hash != hash_previo):
+                return None
+
+            bloques = self.blockchain[desde:desde + max(1, limite)]
+            cursor = None
+            if bloques and desde + len(bloques) < len(self.blockchain):
+                cursor = f"{bloques[-1].indice}:{bloques[-1].hash}"
+
+        return bloques, cursor
+
+    def obtener_pagina_explorador(self, antes=None, limite=TAMANO_PAGINA_EXPLORADOR):
+        """Función para obtener una página de bloques del explorador, de los más nuevos a los más antiguos
+
+        Args:
+            antes (integer, optional): Altura siguiente al primer bloque de la página. Por defecto desde el último bloque.
+            limite (integer, optional): Bloques máximos de la página. Por defecto TAMANO_PAGINA_EXPLORADOR.
+
+        Returns:
+            list, integer: Bloques y altura a usar como "antes" en la página siguiente, None si no hay más
+        """
+
+        with self._lock_blockchain:
+            hasta = len(self.blockchain) if antes is None else min(
+                max(0, antes), len(self.blockchain))
+            desde = max(0, hasta - max(1, limite))
+
+            bloques = self.blockchain[desde:hasta][::-1]
+
+        return bloques, (desde if desde > 0 else None)
+
+    def obtener_bloques_posteriores(self, hash):
+        """Función para obtener los bloques posteriores a uno de la Blockchain
+
+        Args:
+            hash (string): Hash del bloque
+
+        Returns:
+            list: Bloques posteriores en orden de altura, None si el bloque ya no está en la Blockchain
+        """
+
+        with self._lock_blockchain:
+            altura = self.indices.altura(hash)
+
+            if altura is None:
+                return None
+
+            return self.blockchain[altura + 1:]
+
+    def obtener_altura(self, hash):
+        """Función para obtener la altura de un bloque de la Blockchain a partir de su hash
+
+        Args:
+            hash (string): Hash del bloque
+
+        Returns:
+            integer: Altura del bloque, None si no está en la Blockchain
+        """
+
+        with self._lock_blockchain:
+            return self.indices.altura(hash)
+
+    def obtener_bloque(self, hash=None, altura=None):
+        """Función para obtener un bloque de la Blockchain por su hash o por su altura
+
+        Args:
+            hash (string, optional): Hash del bloque. Por defecto ninguno.
+            altura (integer, optional): Altura del bloque. Por defecto ninguna.
+
+        Returns:
+            Bloque: Bloque, None si no está en la Blockchain
+        """
+
+        with self._lock_blockchain:
+            if hash is not None:
+                altura = self.indices.altura(hash)
+
+            if altura is None or not 0 <= altura < len(self.blockchain):
+                return None
+
+            return self.blockchain[altura]
+
+    def obtener_transaccion(self, txid):
+        """Función para obtener una transacción confirmada por su id
+
+        Args:
+            txid (string): Id de la transacción
+
+        Returns:
+            dict: Transacción y bloque que la contiene, None si no está en la Blockchain
+        """
+
+        with self._lock_blockchain:
+            ubicacion = self.indices.transaccion(txid)
+            if ubicacion is None:
+                return None
+
+            altura, posicion = ubicacion
+            bloque = self.blockchain[altura]
+
+            return {"txid": txid, "indice": bloque.indice, "hash": bloque.hash,
+                    "posicion": posicion, "transaccion": bloque.transacciones[posicion]}
+
+    def obtener_transacciones_direccion(self, direccion, desde=0, limite=None):
+        """Función para obtener las transacciones confirmadas de una dirección
+
+        Args:
+            direccion (string): Dirección de la cartera
+            desde (integer, optional): Primera transacción a devolver. Por defecto 0.
+            limite (integer, optional): Transacciones máximas. Por defecto todas.
+
+        Returns:
+            list: Transacciones y bloques que las contienen, en orden de altura
+        """
+
+        with self._lock_blockchain:
+            transacciones = []
+
+            for altura, posicion in self.indices.transacciones_direccion(direccion, desde, limite):
+                bloque = self.blockchain[altura]
+                transacciones.append({"indice": bloque.indice, "hash": bloque.hash, "posicion": posicion,
+                                      "transaccion": bloque.transacciones[posicion]})
+
+            return transacciones
+
     def es_blockchain_valida(self, blockchain):
-        """Función para comprobar si una Blockchain es válida
+        """Función para comprobar si una Blockchain es válida: enlaces de hash previo y prueba de trabajo.
+        Solo se calcula el hash de los bloques no validados antes, el resto se sustituye por su copia validada.
 
         Args:
             blockchain (list): Blockchain a comprobar
@@ -420,21 +1896,59 @@ class Blockchain():
             bool: True o False
         """
 
-        for bloque in blockchain:
-            if not self.es_hash_valido(bloque, bloque.hash):
-                if bloque.indice == 0:
-                    continue
-                return False
+        if not blockchain:
+            return False
+
+        # El génesis tiene un hash fijo que no cumple la prueba de trabajo
+        genesis = self.validar_bloque(blockchain[0]) or blockchain[0]
+        if genesis.indice != 0:
+            return False
+        blockchain[0] = genesis
+
+        sufijo = blockchain[1:]
+        if not self.es_sufijo_valido(genesis, sufijo):
+            return False
+
+        blockchain[1:] = sufijo
+
         return True
 
+    def auditar(self, progreso=None):
+        """Función para validar la Blockchain propia completa: enlaces, prueba de trabajo, raíz Merkle y firmas
+
+        Args:
+            progreso (function, optional): Recibe bloques validados, total y bloques por segundo. Por defecto ninguna.
+
+        Returns:
+            dict: Bloques, segundos, bloques por segundo y errores (índice, motivo)
+        """
+
+        with self._lock_blockchain:
+            blockchain = self.blockchain.copia()
+
+        return self.validador.validar(blockchain, self.dificultad, True, progreso=progreso)
+
     def reemplazar_blockchain(self, blockchain):
-        """Función para reemplazar la Blockchain del minero por otra
+        """Función para reemplazar la Blockchain del minero por otra: se separa el sufijo
+        propio desde el ancestro común y se une el de la otra, el prefijo común no se toca
 
         Args:
-            blockchain (list): Blockchain a reemplazar
+            blockchain (list): Blockchain válida a reemplazar
         """
 
-        self.blockchain = blockchain
+        with self._lock_blockchain:
+            divergencia = self.altura_divergencia(blockchain)
+            sufijo = blockchain[divergencia:]
+
+            if not sufijo and divergencia == len(self.blockchain):
+                return
+
+            huerfanos = self.blockchain[divergencia:]
+            del self.blockchain[divergencia:]
+            self.blockchain.extend(sufijo)
+
+            # Los observadores solo rehacen el sufijo que cambia
+            self.registrar_cambios(divergencia, huerfanos)
 
     ################################################
     # Funciones de minado
@@ -448,43 +1962,54 @@ class Blockchain():
 
         with self._lock:
             inicio = time.time()
-            if not self.transacciones_no_confirmadas:
+            if not len(self.mempool):
                 return False
 
-            # Creación de bloque
-            nuevo_bloque = Bloque(indice=self.ultimo_bloque.indice + 1,
-                                  transacciones=self.transacciones_no_confirmadas
-                                  )
+            # Creación de bloque sobre el último bloque conocido
+            with self._lock_blockchain:
+                self.cancelar_minado.clear()
+
+                nuevo_bloque = Bloque(indice=self.ultimo_bloque.indice + 1,
+                                      transacciones=[]
+                                      )
 
-            nuevo_bloque.construir_cabecera(
-                self.ultimo_bloque.hash, self.transacciones_no_confirmadas, self.dificultad)
+                # Plantilla limitada por tamaño, el resto queda pendiente en el mempool
+                for _, transaccion, tamano in self.mempool.plantilla(self.tamano_maximo_bloque - nuevo_bloque.tamano):
+                    nuevo_bloque.anadir_transaccion(
+                        transaccion, FORMATO_LONGITUD.size + tamano)
+
+                # Raíz Merkle desde el árbol del mempool, la plantilla son sus primeras hojas
+                nuevo_bloque.construir_cabecera(
+                    self.ultimo_bloque.hash, nuevo_bloque.transacciones, self.dificultad, self.version_cabecera,
+                    self.mempool.arbol_merkle)
 
             print(f"\nMinando bloque {(self.ultimo_bloque.indice + 1)}...")
 
+            # Las transacciones salen del mempool solo si el bloque entra en la Blockchain
             self.prueba_de_trabajo(nuevo_bloque, True)
-            self.transacciones_no_confirmadas = []
             fin = time.time()
             total = fin - inicio
 
             # Parámetros experimentales al bloque
             nuevo_bloque.tiempo_minado = round(total, 2)
 
+            # Hashrate agregado de todos los procesos de minado
             potencia_computacion = round(
-                (nuevo_bloque.cabecera['nonce'] / total) / 1000)
+                (self.intentos_ultima_prueba / total) / 1000)
             nuevo_bloque.potencia_computacion = potencia_computacion
             nuevo_bloque.minado_por = self.numero_minero
 
-            nuevo_bloque.calcular_tamano()
-
             # Comprobar que hash es válido y no es 0 por Consenso
             if (self.es_hash_valido(nuevo_bloque, nuevo_bloque.hash)):
-                self.anadir_bloque(nuevo_bloque, nuevo_bloque.hash)
+                if self.anadir_bloque(nuevo_bloque, nuevo_bloque.hash):
+                    self._bloques_minados.incrementar()
+                    # Difusión inmediata, sin esperar a la siguiente ronda de consenso de los nodos
+                    self.anunciar_bloque(nuevo_bloque)
 
                 print(
                     f'¡Hash encontrado! [{"{:.3f}".format(total)}s, {potencia_computacion} Kh/s], nonce: {nuevo_bloque.cabecera["nonce"]}')
 
-            # Consenso final
-            self.consenso()
+            # El consenso se realiza en el hilo de sincronización
 
 
 ################################################
@@ -502,7 +2027,8 @@ class BlockchainMaliciosa(Blockchain):
         Args:
             indice (integer): Índice del bloque a modificar
         """
-        blockchain = copy.deepcopy(self.blockchain)
+        with self._lock_blockchain:
+            blockchain = copy.deepcopy(self.blockchain[:])
         hash_previo = ""
 
         inicio = time.time()
@@ -521,7 +2047,7 @@ class BlockchainMaliciosa(Blockchain):
                 if bloque.indice == indice:
                     nuevo_bloque.transacciones = self.transacciones_maliciosas
                     nuevo_bloque.construir_cabecera(
-                        nuevo_bloque.cabecera["hash_previo"], nuevo_bloque.transacciones, nuevo_bloque.cabecera["dificultad"])
+                        nuevo_bloque.cabecera["hash_previo"], nuevo_bloque.transacciones, nuevo_bloque.cabecera["dificultad"], nuevo_bloque.cabecera["version"])
                     self.prueba_de_trabajo(nuevo_bloque, False)
                     nuevo_bloque.minado_por = self.numero_minero
 
@@ -540,7 +2066,7 @@ class BlockchainMaliciosa(Blockchain):
 
                 self.blockchain_maliciosa.append(nuevo_bloque)
 
-        self.blockchain = self.blockchain_maliciosa
+        self.reemplazar_blockchain(self.blockchain_maliciosa)
 
         print(f'¡Bloque reemplazado! [{"{:.3f}".format(total)}s]')
         print(f"Longitud blockchain maliciosa: {len(self.blockchain)}")
@@ -560,12 +2086,13 @@ class BlockchainMaliciosa(Blockchain):
 
         if len(clave_privada) == 64:
 
-            firma, transaccion = self.firmar_transaccion_ECDSA(clave_privada)
+            firma, fecha = self.firmar_transaccion_ECDSA(
+                clave_privada, emisor, receptor, cantidad, concepto)
 
             transaction = [f"De: {emisor}", f"Para: {receptor}",
-                           f"Cantidad: {cantidad}", f"concepto: {concepto}", f"Fecha: {transaccion}"]
+                           f"Cantidad: {cantidad}", f"concepto: {concepto}", f"Fecha: {fecha}", f"Firma: {firma}"]
 
-            if self.verificar_firma(emisor, firma.decode(), transaccion):
+            if self.verificar_firma(emisor, firma, mensaje_transaccion(emisor, receptor, cantidad, concepto, fecha)):
                 self.transacciones_maliciosas.append(transaction)
             else:
                 print("Transacción fallida. Firma no válida.")
@@ -0,0 +1,170 @@
+import os
+from decimal import Decimal
+
+from almacen import cargar_json, guardar_json
+from indices import campos_transaccion, cantidad_transaccion
+from mempool import EMISOR_RED
+
+################################################
+# Parámetros del estado de saldos
+################################################
+
+# Bloques finales con registro para deshacer, las reorganizaciones más profundas reconstruyen el estado
+MAXIMO_DESHACER = 1000
+
+NOMBRE_SALDOS = "saldos.json"
+
+
+class EstadoSaldos:
+    def __init__(self, maximo_deshacer=MAXIMO_DESHACER):
+        """Inicializador del estado de saldos por dirección, actualizado bloque a bloque.
+        Cada bloque guarda los saldos previos que modifica, de forma que deshacer un sufijo
+        solo recorre ese sufijo. Se actualiza bajo el lock de la Blockchain.
+
+        Args:
+            maximo_deshacer (integer, optional): Bloques finales que se pueden deshacer. Por defecto MAXIMO_DESHACER.
+        """
+
+        self.maximo_deshacer = maximo_deshacer
+
+        # Dirección -> saldo
+        self.saldos = {}
+        # Por altura desde _inicio_deshacer, saldo previo de cada dirección modificada (None si no existía)
+        self._deshacer = []
+        self._inicio_deshacer = 0
+        self._altura = 0
+
+    def aplicar_bloque(self, bloque):
+        """Función para aplicar las transacciones de un bloque al final de la Blockchain
+
+        Args:
+            bloque (Bloque): Bloque a aplicar
+        """
+
+        previos = {}
+
+        for transaccion in bloque.transacciones:
+            cantidad = cantidad_transaccion(transaccion)
+            if cantidad is None:
+                continue
+
+            campos = campos_transaccion(transaccion)
+
+            # La red crea las cantidades de génesis y recompensas, no las descuenta
+            if campos.get("de") != EMISOR_RED:
+                self._sumar(campos.get("de"), -cantidad, previos)
+            self._sumar(campos.get("para"), cantidad, previos)
+
+        self._deshacer.append(previos)
+        self._altura += 1
+
+        # Registros más antiguos que el máximo, ya no se pueden deshacer
+        if len(self._deshacer) > self.maximo_deshacer:
+            del self._deshacer[0]
+            self._inicio_deshacer += 1
+
+    def _sumar(self, direccion, cantidad, previos):
+        """Función para sumar una cantidad al saldo de una dirección, guardando el saldo previo
+        """
+
+        if direccion is None:
+            return
+
+        if direccion not in previos:
+            previos[direccion] = self.saldos.get(direccion)
+
+        self.saldos[direccion] = self.saldos.get(
+            direccion, Decimal(0)) + cantidad
+
+    def revertir(self, altura):
+        """Función para deshacer los bloques desde una altura, del último hacia atrás
+
+        Args:
+            altura (integer): Primera altura a deshacer
+
+        Returns:
+            bool: False si la altura es anterior a los registros guardados y no se ha podido deshacer
+        """
+
+        if altura < self._inicio_deshacer:
+            return False
+
+        while self._altura > altura:
+            for direccion, previo in self._deshacer.pop().items():
+                if previo is None:
+                    del self.saldos[direccion]
+                else:
+                    self.saldos[direccion] = previo
+            self._altura -= 1
+
+        return True
+
+    def actualizar(self, blockchain, desde, huerfanos=()):
+        """Función para dejar los saldos iguales a la Blockchain a partir de una altura
+
+        Args:
+            blockchain (list): Blockchain
+            desde (integer): Primera altura que ha cambiado
+            huerfanos (list, optional): Bloques descartados, se deshacen con los registros guardados. Por defecto ninguno.
+        """
+
+        # Reorganización más profunda que los registros, se reconstruye desde el génesis
+        if not self.revertir(desde):
+            self.saldos = {}
+            self._deshacer = []
+            self._inicio_deshacer = 0
+            self._altura = 0
+
+        for bloque in blockchain[self._altura:]:
+            self.aplicar_bloque(bloque)
+
+    def guardar(self, ruta, hash):
+        """Función para guardar los saldos junto al almacén de bloques, sin los registros para deshacer
+
+        Args:
+            ruta (string): Directorio del almacén
+            hash (string): Hash del último bloque aplicado
+        """
+
+        guardar_json(os.path.join(ruta, NOMBRE_SALDOS),
+                     {"altura": self._altura, "hash": hash,
+                      "saldos": {direccion: str(saldo) for direccion, saldo in self.saldos.items()}})
+
+    def cargar(self, ruta, blockchain):
+        """Función para cargar los saldos guardados y aplicar los bloques posteriores.
+        Si no hay saldos guardados o no coinciden con la Blockchain, se reconstruyen desde el génesis.
+
+        Args:
+            ruta (string): Directorio del almacén
+            blockchain (list): Blockchain cargada del almacén
+        """
+
+        self.saldos = {}
+        self._deshacer = []
+        self._inicio_deshacer = 0
+        self._altura = 0
+
+        guardados = cargar_json(os.path.join(ruta, NOMBRE_SALDOS))
+
+        # Los bloques anteriores a los guardados no se pueden deshacer, una reorganización más profunda los reconstruye
+        if guardados and 0 < guardados["altura"] <= len(blockchain) and blockchain[guardados["altura"] - 1].hash == guardados["hash"]:
+            self.saldos = {direccion: Decimal(saldo)
+                           for direccion, saldo in guardados["saldos"].items()}
+            self._inicio_deshacer = self._altura = guardados["altura"]
+
+        self.actualizar(blockchain, self._altura)
+
+    def saldo(self, direccion):
+        """Función para obtener el saldo confirmado de una dirección
+
+        Args:
+            direccion (string): Dirección de la cartera
+
+        Returns:
+            Decimal: Saldo, 0 si la dirección no ha participado en ninguna transacción
+        """
+
+        return self.saldos.get(direccion, Decimal(0))
+
+    def __len__(self):
+        return self._altura
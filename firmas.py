@@ -0,0 +1,200 @@
+import json
+import base64
+import ecdsa
+import functools
+import concurrent.futures
+
+from hashlib import sha256
+from ecdsa.ellipticcurve import PointJacobi
+from ecdsa.util import sigencode_string_canonize
+
+################################################
+# Parámetros de verificación de firmas
+################################################
+
+# Claves de verificación analizadas conservadas por proceso
+TAMANO_CACHE_CLAVES = 4096
+# Firmas enviadas a cada tarea del pool
+TAMANO_TRAMO = 64
+# Bytes de una firma r || s sobre SECP256k1
+TAMANO_FIRMA = 64
+
+
+def mensaje_transaccion(emisor, receptor, cantidad, concepto, fecha):
+    """Función para obtener el mensaje canónico que se firma en una transacción: todos sus campos,
+    de forma que la firma no sirve para otro receptor, cantidad o concepto
+
+    Args:
+        emisor (string): Emisor de la transacción
+        receptor (string): Receptor de la transacción
+        cantidad (string): Cantidad de la transacción
+        concepto (string): Concepto de la transacción
+        fecha (string): Fecha de la transacción
+
+    Returns:
+        string: Mensaje a firmar
+    """
+
+    return json.dumps([str(emisor), str(receptor), str(cantidad), str(concepto), str(fecha)],
+                      separators=(',', ':'), ensure_ascii=False)
+
+
+def mensaje_campos(campos):
+    """Función para obtener el mensaje firmado de una transacción a partir de sus campos
+
+    Args:
+        campos (dict): Campos de la transacción, como los de indices.campos_transaccion
+
+    Returns:
+        string: Mensaje firmado
+    """
+
+    return mensaje_transaccion(campos.get("de", ""), campos.get("para", ""), campos.get("cantidad", ""),
+                               campos.get("concepto", ""), campos.get("fecha", ""))
+
+
+@functools.lru_cache(maxsize=TAMANO_CACHE_CLAVES)
+def obtener_clave_firma(clave_privada):
+    """Función para obtener la clave de firma de una clave privada, analizada una sola vez
+
+    Args:
+        clave_privada (string): Clave privada en hexadecimal
+
+    Returns:
+        ecdsa.SigningKey: Clave de firma
+    """
+
+    return ecdsa.SigningKey.from_string(bytes.fromhex(clave_privada), curve=ecdsa.SECP256k1)
+
+
+def firmar_mensaje(clave_privada, mensaje):
+    """Función para firmar un mensaje con una firma determinista y canónica (s baja):
+    cada mensaje tiene una sola firma válida, así que no se puede repetir con otro identificador
+
+    Args:
+        clave_privada (string): Clave privada en hexadecimal
+        mensaje (string): Mensaje a firmar
+
+    Returns:
+        string: Firma en base64
+    """
+
+    firma = obtener_clave_firma(clave_privada).sign_deterministic(
+        mensaje.encode(), hashfunc=sha256, sigencode=sigencode_string_canonize)
+
+    return base64.b64encode(firma).decode()
+
+
+@functools.lru_cache(maxsize=TAMANO_CACHE_CLAVES)
+def obtener_clave_verificacion(direccion):
+    """Función para obtener la clave de verificación de una dirección, analizada y precalculada una sola vez
+
+    Args:
+        direccion (string): Dirección de la cartera, clave pública en base64
+
+    Returns:
+        ecdsa.VerifyingKey: Clave de verificación
+    """
+
+    curva = ecdsa.SECP256k1
+    punto = ecdsa.VerifyingKey.from_string(
+        base64.b64decode(direccion), curve=curva).pubkey.point
+
+    # Punto con el orden de la curva, necesario para la tabla de multiplicación precalculada
+    punto = PointJacobi(curva.curve, punto.x(), punto.y(),
+                        1, curva.order, generator=True)
+    clave = ecdsa.VerifyingKey.from_public_point(punto, curve=curva)
+    clave.precompute()
+
+    return clave
+
+
+def verificar_firma(direccion, firma, mensaje):
+    """Función para verificar una firma
+
+    Args:
+        direccion (string): Dirección de la cartera, clave pública en base64
+        firma (string): Firma en base64
+        mensaje (string): Mensaje firmado
+
+    Returns:
+        bool: True o False
+    """
+
+    try:
+        firma = base64.b64decode(firma)
+
+        # Solo la firma canónica, la otra (r, n - s) es igual de válida y daría otro identificador
+        if len(firma) != TAMANO_FIRMA or int.from_bytes(firma[TAMANO_FIRMA // 2:], "big") > ecdsa.SECP256k1.order // 2:
+            return False
+
+        return obtener_clave_verificacion(direccion).verify(firma, mensaje.encode(), hashfunc=sha256)
+    except Exception:
+        return False
+
+
+def verificar_tramo(firmas):
+    """Función para verificar un tramo de firmas en un proceso del pool
+
+    Args:
+        firmas (list): Tuplas (dirección, firma, mensaje)
+
+    Returns:
+        list: True o False por firma
+    """
+
+    return [verificar_firma(*firma) for firma in firmas]
+
+
+################################################
+# Verificador de firmas por lotes
+################################################
+
+
+class VerificadorFirmas:
+    def __init__(self, trabajadores=1, tamano_tramo=TAMANO_TRAMO):
+        """Inicializador del verificador de firmas por lotes
+
+        Args:
+            trabajadores (integer, optional): Número de procesos de verificación. Por defecto 1.
+            tamano_tramo (integer, optional): Firmas por tarea. Por defecto TAMANO_TRAMO.
+        """
+
+        self.trabajadores = max(1, trabajadores)
+        self.tamano_tramo = tamano_tramo
+        self._pool = None
+
+    def verificar_lote(self, firmas):
+        """Función para verificar un lote de firmas repartiéndolo entre los procesos
+
+        Args:
+            firmas (list): Tuplas (dirección, firma, mensaje)
+
+        Returns:
+            list: True o False por firma, en el mismo orden
+        """
+
+        # Lotes pequeños o un solo proceso, sin coste de envío al pool
+        if self.trabajadores == 1 or len(firmas) <= self.tamano_tramo:
+            return verificar_tramo(firmas)
+
+        if self._pool is None:
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.trabajadores)
+
+        tramos = [firmas[inicio:inicio + self.tamano_tramo]
+                  for inicio in range(0, len(firmas), self.tamano_tramo)]
+        resultados = []
+
+        for resultado in self._pool.map(verificar_tramo, tramos):
+            resultados.extend(resultado)
+
+        return resultados
+
+    def cerrar(self):
+        """Función para liberar el pool de procesos
+        """
+
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
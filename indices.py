@@ -0,0 +1,262 @@
+import os
+from decimal import Decimal, InvalidOperation
+
+from almacen import cargar_json, guardar_json
+from merkle import hash_transaccion
+
+################################################
+# Parámetros de los índices
+################################################
+
+NOMBRE_INDICES = "indices.json"
+
+
+def campos_transaccion(transaccion):
+    """Función para obtener los campos de una transacción a partir de sus elementos "Clave: valor"
+
+    Args:
+        transaccion (list): Transacción
+
+    Returns:
+        dict: Campos de la transacción con la clave en minúsculas: de, para, cantidad, concepto, fecha...
+    """
+
+    campos = {}
+
+    for elemento in transaccion:
+        if isinstance(elemento, str) and ": " in elemento:
+            clave, valor = elemento.split(": ", 1)
+            campos[clave.lower()] = valor
+
+    return campos
+
+
+def direcciones_transaccion(transaccion):
+    """Función para obtener las direcciones que participan en una transacción
+
+    Args:
+        transaccion (list): Transacción
+
+    Returns:
+        list: Emisor y receptor, sin repetir
+    """
+
+    campos = campos_transaccion(transaccion)
+    direcciones = []
+
+    for clave in ("de", "para"):
+        if clave in campos and campos[clave] not in direcciones:
+            direcciones.append(campos[clave])
+
+    return direcciones
+
+
+def cantidad_transaccion(transaccion):
+    """Función para obtener la cantidad de una transacción
+
+    Args:
+        transaccion (list): Transacción
+
+    Returns:
+        Decimal: Cantidad, None si falta o no es un número positivo
+    """
+
+    try:
+        cantidad = Decimal(campos_transaccion(transaccion)["cantidad"])
+    except (KeyError, InvalidOperation):
+        return None
+
+    if not cantidad.is_finite() or cantidad <= 0:
+        return None
+
+    return cantidad
+
+
+################################################
+# Índices de la Blockchain
+################################################
+
+
+class IndicesBlockchain:
+    def __init__(self):
+        """Inicializador de los índices de la Blockchain: bloque por hash, transacción por id
+        y transacciones por dirección. La altura es la posición en la Blockchain.
+        Se actualizan bajo el lock de la Blockchain.
+        """
+
+        # Por altura, lo necesario para deshacer el bloque en una reorganización
+        self._hashes = []
+        self._txids = []
+        self._direcciones = []
+
+        # Hash del bloque -> altura
+        self.por_hash = {}
+        # Id de la transacción -> (altura, posición en el bloque)
+        self.por_txid = {}
+        # Dirección -> [(altura, posición en el bloque)], en orden de altura
+        self.por_direccion = {}
+
+    def anadir_bloque(self, bloque):
+        """Función para indexar un bloque al final de la Blockchain
+
+        Args:
+            bloque (Bloque): Bloque a indexar
+        """
+
+        txids = [hash_transaccion(transaccion)
+                 for transaccion in bloque.transacciones]
+        direcciones = [direcciones_transaccion(transaccion)
+                       for transaccion in bloque.transacciones]
+
+        self._indexar(bloque.hash, txids, direcciones)
+
+    def _indexar(self, hash, txids, direcciones):
+        """Función para indexar un bloque a partir de sus datos ya calculados
+
+        Args:
+            hash (string): Hash del bloque
+            txids (list): Id de cada transacción
+            direcciones (list): Direcciones de cada transacción
+        """
+
+        altura = len(self._hashes)
+
+        self._hashes.append(hash)
+        self._txids.append(txids)
+        self._direcciones.append(direcciones)
+
+        self.por_hash[hash] = altura
+
+        for posicion, (txid, direcciones_tx) in enumerate(zip(txids, direcciones)):
+            self.por_txid[txid] = (altura, posicion)
+
+            for direccion in direcciones_tx:
+                self.por_direccion.setdefault(
+                    direccion, []).append((altura, posicion))
+
+    def truncar(self, altura):
+        """Función para desindexar los bloques desde una altura, del último hacia atrás
+
+        Args:
+            altura (integer): Primera altura a desindexar
+        """
+
+        while len(self._hashes) > altura:
+            actual = len(self._hashes) - 1
+            hash = self._hashes.pop()
+            txids = self._txids.pop()
+            direcciones = self._direcciones.pop()
+
+            if self.por_hash.get(hash) == actual:
+                del self.por_hash[hash]
+
+            for txid in txids:
+                if self.por_txid.get(txid, (None,))[0] == actual:
+                    del self.por_txid[txid]
+
+            # Las entradas del bloque son las últimas de cada dirección
+            for direccion in {direccion for direcciones_tx in direcciones for direccion in direcciones_tx}:
+                entradas = self.por_direccion[direccion]
+                while entradas and entradas[-1][0] == actual:
+                    entradas.pop()
+                if not entradas:
+                    del self.por_direccion[direccion]
+
+    def actualizar(self, blockchain, desde, huerfanos=()):
+        """Función para dejar los índices iguales a la Blockchain a partir de una altura
+
+        Args:
+            blockchain (list): Blockchain indexada
+            desde (integer): Primera altura que ha cambiado
+            huerfanos (list, optional): Bloques descartados, se desindexan con lo guardado por altura. Por defecto ninguno.
+        """
+
+        self.truncar(desde)
+
+        for bloque in blockchain[len(self._hashes):]:
+            self.anadir_bloque(bloque)
+
+    ################################################
+    # Consultas
+    ################################################
+
+    def altura(self, hash):
+        """Función para obtener la altura de un bloque
+
+        Args:
+            hash (string): Hash del bloque
+
+        Returns:
+            integer: Altura del bloque, None si no está indexado
+        """
+
+        return self.por_hash.get(hash)
+
+    def transaccion(self, txid):
+        """Función para obtener la ubicación de una transacción
+
+        Args:
+            txid (string): Id de la transacción
+
+        Returns:
+            tuple: Altura del bloque y posición en él, None si no está indexada
+        """
+
+        return self.por_txid.get(txid)
+
+    def transacciones_direccion(self, direccion, desde=0, limite=None):
+        """Función para obtener la ubicación de las transacciones de una dirección
+
+        Args:
+            direccion (string): Dirección de la cartera
+            desde (integer, optional): Primera transacción a devolver. Por defecto 0.
+            limite (integer, optional): Transacciones máximas. Por defecto todas.
+
+        Returns:
+            list: Altura del bloque y posición en él de cada transacción, en orden de altura
+        """
+
+        entradas = self.por_direccion.get(direccion, [])
+        fin = None if limite is None else desde + limite
+
+        return entradas[desde:fin]
+
+    def __len__(self):
+        return len(self._hashes)
+
+    ################################################
+    # Persistencia
+    ################################################
+
+    def guardar(self, ruta):
+        """Función para guardar los índices junto al almacén de bloques
+
+        Args:
+            ruta (string): Directorio del almacén
+        """
+
+        guardar_json(os.path.join(ruta, NOMBRE_INDICES),
+                     {"hashes": self._hashes, "txids": self._txids, "direcciones": self._direcciones})
+
+    def cargar(self, ruta, blockchain):
+        """Función para cargar los índices guardados y completarlos con los bloques posteriores.
+        Si no hay índices guardados o no coinciden con la Blockchain, se reconstruyen.
+
+        Args:
+            ruta (string): Directorio del almacén
+            blockchain (list): Blockchain cargada del almacén
+        """
+
+        self.truncar(0)
+
+        guardados = cargar_json(os.path.join(ruta, NOMBRE_INDICES)) or {
+            "hashes": [], "txids": [], "direcciones": []}
+
+        # Los bloques están enlazados por hash, si coincide el último común coinciden todos los anteriores
+        comunes = min(len(guardados["hashes"]), len(blockchain))
+        if comunes and blockchain[comunes - 1].hash == guardados["hashes"][comunes - 1]:
+            for altura in range(comunes):
+                self._indexar(guardados["hashes"][altura],
+                              guardados["txids"][altura], guardados["direcciones"][altura])
+
+        self.actualizar(blockchain, len(self._hashes))
@@ -0,0 +1,322 @@
+import threading
+from decimal import Decimal
+from collections import OrderedDict
+
+from merkle import ArbolMerkle, hash_transaccion, serializar_transaccion
+from indices import campos_transaccion, cantidad_transaccion
+
+################################################
+# Parámetros del mempool
+################################################
+
+# Transacciones pendientes máximas
+MAXIMO_TRANSACCIONES = 50000
+# Bytes máximos de transacciones pendientes
+MAXIMO_BYTES = 32 * 1024 * 1024
+# Bytes de la longitud que precede a cada transacción en la codificación del bloque
+BYTES_LONGITUD = 4
+# Emisor de las transacciones creadas por la red: génesis y recompensas
+EMISOR_RED = "Red blockchain"
+
+
+def es_transaccion_red(transaccion):
+    """Función que comprueba si una transacción la emite la red, génesis o recompensa
+
+    Args:
+        transaccion (list): Transacción
+
+    Returns:
+        bool: True o False
+    """
+
+    return campos_transaccion(transaccion).get("de") == EMISOR_RED
+
+
+class Mempool:
+    def __init__(self, maximo_transacciones=MAXIMO_TRANSACCIONES, maximo_bytes=MAXIMO_BYTES):
+        """Inicializador del mempool: transacciones no confirmadas sin duplicados, en orden de prioridad
+        y con límites de número y bytes. Sin comisiones, la prioridad es la antigüedad: primero las
+        recuperadas de bloques descartados y después por orden de llegada. Al superar los límites
+        se descartan las de menor prioridad, las más recientes.
+
+        Args:
+            maximo_transacciones (integer, optional): Transacciones máximas. Por defecto MAXIMO_TRANSACCIONES.
+            maximo_bytes (integer, optional): Bytes máximos. Por defecto MAXIMO_BYTES.
+        """
+
+        self.maximo_transacciones = maximo_transacciones
+        self.maximo_bytes = maximo_bytes
+
+        # Id de la transacción -> (transacción, bytes codificada), en orden de prioridad
+        self._transacciones = OrderedDict()
+        self._bytes = 0
+        # Dirección -> cantidad pendiente de gastar en las transacciones del mempool
+        self._gastos = {}
+        # Única recompensa pendiente, siempre la primera de la plantilla
+        self._recompensa = None
+        self.expulsadas = 0
+        # Hojas: la recompensa y las pendientes en orden de prioridad, sus primeras hojas son la plantilla.
+        # Se lee con el lock de la Blockchain, con el que también se modifica el mempool
+        self.arbol_merkle = ArbolMerkle()
+        self._lock = threading.Lock()
+
+    def anadir(self, transaccion, txid=None):
+        """Función para añadir una transacción si no está ya pendiente
+
+        Args:
+            transaccion (list): Transacción
+            txid (string, optional): Id de la transacción, si ya se conoce. Por defecto se calcula.
+
+        Returns:
+            bool: True si se añade, False si está repetida o no cabe
+        """
+
+        if txid is None:
+            txid = hash_transaccion(transaccion)
+        tamano = len(serializar_transaccion(transaccion))
+
+        with self._lock:
+            return self._insertar(txid, transaccion, tamano)
+
+    def _insertar(self, txid, transaccion, tamano):
+        """Función para insertar una transacción al final, con la menor prioridad. Si no cabe se descarta
+
+        Returns:
+            bool: True si se añade, False si está repetida o no cabe
+        """
+
+        if txid in self._transacciones:
+            return False
+
+        if len(self._transacciones) >= self.maximo_transacciones or self._bytes + tamano > self.maximo_bytes:
+            self.expulsadas += 1
+            return False
+
+        self._transacciones[txid] = (transaccion, tamano)
+        self._bytes += tamano
+        self._sumar_gasto(transaccion, 1)
+        self.arbol_merkle.anadir(transaccion, txid)
+
+        return True
+
+    def _expulsar(self):
+        """Función para descartar las transacciones de menor prioridad mientras se superen los límites
+        """
+
+        while len(self._transacciones) > self.maximo_transacciones or self._bytes > self.maximo_bytes:
+            _, (expulsada, tamano_expulsada) = self._transacciones.popitem()
+            self._bytes -= tamano_expulsada
+            self._sumar_gasto(expulsada, -1)
+            self.expulsadas += 1
+
+    def _reconstruir_arbol(self):
+        """Función para construir de nuevo el árbol Merkle tras reordenar las transacciones
+        """
+
+        self.arbol_merkle = ArbolMerkle()
+
+        if self._recompensa is not None:
+            self.arbol_merkle.anadir(self._recompensa[1], self._recompensa[0])
+
+        for txid, (transaccion, _) in self._transacciones.items():
+            self.arbol_merkle.anadir(transaccion, txid)
+
+    def _sumar_gasto(self, transaccion, signo):
+        """Función para sumar o restar la cantidad de una transacción al gasto pendiente de su emisor
+        """
+
+        cantidad = cantidad_transaccion(transaccion)
+        emisor = campos_transaccion(transaccion).get("de")
+
+        if cantidad is None or emisor is None:
+            return
+
+        gasto = self._gastos.get(emisor, Decimal(0)) + signo * cantidad
+        if gasto:
+            self._gastos[emisor] = gasto
+        else:
+            del self._gastos[emisor]
+
+    def gasto_pendiente(self, direccion):
+        """Función para obtener la cantidad que una dirección tiene pendiente de gastar en el mempool
+
+        Args:
+            direccion (string): Dirección de la cartera
+
+        Returns:
+            Decimal: Cantidad pendiente
+        """
+
+        with self._lock:
+            return self._gastos.get(direccion, Decimal(0))
+
+    def anadir_recompensa(self, transaccion):
+        """Función para fijar la transacción recompensa del próximo bloque, sustituyendo la anterior
+
+        Args:
+            transaccion (list): Transacción recompensa
+        """
+
+        txid = hash_transaccion(transaccion)
+
+        with self._lock:
+            # Siempre la primera hoja del árbol
+            if self._recompensa is not None:
+                self.arbol_merkle.reemplazar(0, txid)
+            else:
+                self.arbol_merkle.insertar(0, txid)
+
+            self._recompensa = (txid, transaccion,
+                                len(serializar_transaccion(transaccion)))
+
+    def plantilla(self, maximo_bytes):
+        """Función para seleccionar las transacciones del próximo bloque: la recompensa
+        y después las pendientes por orden de prioridad, mientras quepan.
+        Son las primeras hojas de arbol_merkle, que da su raíz sin construir otro árbol
+
+        Args:
+            maximo_bytes (integer): Bytes máximos de las transacciones en la codificación del bloque
+
+        Returns:
+            list: Tuplas (id, transacción, bytes codificada sin la longitud)
+        """
+
+        seleccion = []
+        ocupado = 0
+
+        with self._lock:
+            candidatas = ((txid, transaccion, tamano)
+                          for txid, (transaccion, tamano) in self._transacciones.items())
+            if self._recompensa is not None:
+                candidatas = [self._recompensa, *candidatas]
+
+            for txid, transaccion, tamano in candidatas:
+                if ocupado + BYTES_LONGITUD + tamano > maximo_bytes:
+                    break
+                seleccion.append((txid, transaccion, tamano))
+                ocupado += BYTES_LONGITUD + tamano
+
+        return seleccion
+
+    def eliminar(self, txids):
+        """Función para quitar transacciones ya confirmadas
+
+        Args:
+            txids (iterable): Ids de las transacciones
+        """
+
+        with self._lock:
+            quitadas = set()
+
+            for txid in txids:
+                if self._recompensa is not None and self._recompensa[0] == txid:
+                    self._recompensa = None
+                    quitadas.add(txid)
+
+                eliminada = self._transacciones.pop(txid, None)
+                if eliminada is not None:
+                    self._bytes -= eliminada[1]
+                    self._sumar_gasto(eliminada[0], -1)
+                    quitadas.add(txid)
+
+            if quitadas:
+                self.arbol_merkle.quitar(quitadas)
+
+    def reorganizar(self, huerfanos, confirmados):
+        """Función para actualizar el mempool tras cambiar la Blockchain: se quitan las transacciones
+        de los bloques nuevos y vuelven, por delante, las de los bloques descartados que no están en ellos
+
+        Args:
+            huerfanos (list): Bloques descartados de la Blockchain
+            confirmados (list): Bloques nuevos de la Blockchain
+        """
+
+        txids_confirmados = {hash_transaccion(transaccion)
+                             for bloque in confirmados for transaccion in bloque.transacciones}
+
+        with self._lock:
+            recuperadas = OrderedDict()
+
+            for bloque in huerfanos:
+                for transaccion in bloque.transacciones:
+                    # Las recompensas de bloques descartados no se recuperan
+                    if es_transaccion_red(transaccion):
+                        continue
+
+                    txid = hash_transaccion(transaccion)
+                    if txid not in txids_confirmados and txid not in self._transacciones:
+                        recuperadas[txid] = (
+                            transaccion, len(serializar_transaccion(transaccion)))
+
+            if recuperadas:
+                for txid, (transaccion, tamano) in recuperadas.items():
+                    self._transacciones[txid] = (transaccion, tamano)
+                    self._bytes += tamano
+                    self._sumar_gasto(transaccion, 1)
+
+                # Más antiguas que las pendientes, se minan primero y se descartan las últimas
+                for txid in reversed(recuperadas):
+                    self._transacciones.move_to_end(txid, last=False)
+
+                self._expulsar()
+                self._reconstruir_arbol()
+
+        self.eliminar(txids_confirmados)
+
+    def actualizar(self, blockchain, desde, huerfanos=()):
+        """Función para actualizar el mempool tras cambiar la Blockchain a partir de una altura
+
+        Args:
+            blockchain (list): Blockchain propia
+            desde (integer): Primera altura que ha cambiado
+            huerfanos (list, optional): Bloques descartados desde esa altura. Por defecto ninguno.
+        """
+
+        self.reorganizar(huerfanos, blockchain[desde:])
+
+    def sin_saldo(self, saldo):
+        """Función para obtener las transacciones pendientes que su emisor no puede pagar,
+        acumulando en orden de prioridad las cantidades de cada emisor
+
+        Args:
+            saldo (function): Devuelve el saldo confirmado de una dirección
+
+        Returns:
+            list: Ids de las transacciones sin saldo
+        """
+
+        gastos = {}
+        txids = []
+
+        with self._lock:
+            for txid, (transaccion, _) in self._transacciones.items():
+                cantidad = cantidad_transaccion(transaccion)
+                emisor = campos_transaccion(transaccion).get("de")
+
+                if cantidad is None or emisor is None:
+                    txids.append(txid)
+                    continue
+
+                gasto = gastos.get(emisor, Decimal(0)) + cantidad
+                if gasto > saldo(emisor):
+                    txids.append(txid)
+                else:
+                    gastos[emisor] = gasto
+
+        return txids
+
+    def estadisticas(self):
+        """Función para obtener el tamaño del mempool
+
+        Returns:
+            dict: Transacciones, bytes y transacciones expulsadas
+        """
+
+        with self._lock:
+            return {"transacciones": len(self), "bytes": self._bytes, "expulsadas": self.expulsadas}
+
+    def __contains__(self, txid):
+        return txid in self._transacciones
+
+    def __len__(self):
+        return len(self._transacciones) + (self._recompensa is not None)
@@ -0,0 +1,279 @@
+import json
+from hashlib import sha256
+
+
+def serializar_transaccion(transaccion):
+    """Función para obtener la codificación canónica de una transacción
+
+    Args:
+        transaccion (list): Transacción
+
+    Returns:
+        bytes: Transacción codificada
+    """
+
+    return json.dumps(transaccion, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def hash_transaccion(transaccion):
+    """Función para calcular el hash canónico de una transacción, su identificador
+
+    Args:
+        transaccion (list): Transacción
+
+    Returns:
+        string: Hash de la transacción
+    """
+
+    return sha256(serializar_transaccion(transaccion)).hexdigest()
+
+
+def _hash_nodo(izquierda, derecha):
+    """Función para calcular el hash de un nodo interno a partir de sus hijos
+
+    Args:
+        izquierda (bytes): Hash del hijo izquierdo
+        derecha (bytes): Hash del hijo derecho
+
+    Returns:
+        bytes: Hash del nodo
+    """
+
+    return sha256(izquierda + derecha).digest()
+
+
+def verificar_prueba(txid, prueba, raiz_merkle):
+    """Función para verificar una prueba de inclusión sin descargar el bloque
+
+    Args:
+        txid (string): Hash de la transacción
+        prueba (list): Hermanos desde la hoja hasta la raíz, con su hash y su lado
+        raiz_merkle (string): Raíz Merkle de la cabecera del bloque
+
+    Returns:
+        bool: True o False
+    """
+
+    actual = bytes.fromhex(txid)
+
+    for hermano in prueba:
+        if hermano["lado"] == "derecha":
+            actual = _hash_nodo(actual, bytes.fromhex(hermano["hash"]))
+        else:
+            actual = _hash_nodo(bytes.fromhex(hermano["hash"]), actual)
+
+    return actual.hex() == raiz_merkle
+
+
+################################################
+# Árbol Merkle
+################################################
+
+
+class ArbolMerkle:
+    def __init__(self, transacciones=None):
+        """Inicializador del árbol Merkle, con los niveles internos en caché.
+        Si un nivel tiene un número impar de nodos, el último se empareja consigo mismo.
+        Los niveles internos se recalculan al pedir la raíz, solo desde la primera hoja que ha cambiado.
+
+        Args:
+            transacciones (list, optional): Transacciones iniciales. Por defecto ninguna.
+        """
+
+        # niveles[0] son las hojas, el último nivel la raíz
+        self._niveles = [[]]
+        # Hojas cubiertas por los niveles internos en caché
+        self._validas = 0
+
+        for transaccion in transacciones or []:
+            self.anadir(transaccion)
+
+    def anadir(self, transaccion, txid=None):
+        """Función para añadir una transacción al final, sus nodos se calculan al pedir la raíz
+
+        Args:
+            transaccion (list): Transacción a añadir
+            txid (string, optional): Hash de la transacción, si ya se conoce. Por defecto se calcula.
+
+        Returns:
+            string: Hash de la transacción
+        """
+
+        if txid is None:
+            txid = hash_transaccion(transaccion)
+        self._niveles[0].append(bytes.fromhex(txid))
+
+        return txid
+
+    def insertar(self, posicion, txid):
+        """Función para insertar una hoja, desplazando las siguientes
+
+        Args:
+            posicion (integer): Posición de la nueva hoja
+            txid (string): Hash de la transacción
+        """
+
+        self._niveles[0].insert(posicion, bytes.fromhex(txid))
+        self._validas = min(self._validas, posicion)
+
+    def reemplazar(self, posicion, txid):
+        """Función para cambiar una hoja, recalculando solo los nodos de su camino a la raíz
+
+        Args:
+            posicion (integer): Posición de la hoja
+            txid (string): Hash de la nueva transacción
+        """
+
+        self._niveles[0][posicion] = bytes.fromhex(txid)
+
+        if posicion >= self._validas:
+            return
+
+        indice = posicion
+        cuenta = self._validas
+        nivel = 0
+
+        while cuenta > 1:
+            padre = indice // 2
+            nodos = self._niveles[nivel]
+            izquierda = nodos[2 * padre]
+            derecha = nodos[2 * padre + 1] if 2 * \
+                padre + 1 < cuenta else izquierda
+            self._niveles[nivel + 1][padre] = _hash_nodo(izquierda, derecha)
+
+            indice = padre
+            cuenta = (cuenta + 1) // 2
+            nivel += 1
+
+    def quitar(self, txids):
+        """Función para quitar hojas, las siguientes se desplazan y los nodos de su camino a la raíz
+        se recalculan al pedir la raíz o una prueba
+
+        Args:
+            txids (set): Hashes de las transacciones a quitar
+        """
+
+        quitadas = {bytes.fromhex(txid) for txid in txids}
+        hojas = self._niveles[0]
+
+        for posicion, hoja in enumerate(hojas):
+            if hoja in quitadas:
+                self._niveles[0] = hojas[:posicion] + \
+                    [hoja for hoja in hojas[posicion:] if hoja not in quitadas]
+
+                # Por debajo del número de hojas restantes, los nodos de la última y los niveles
+                # que sobran, calculados con las hojas quitadas, se rehacen en _actualizar
+                self._validas = min(self._validas, posicion,
+                                    max(len(self._niveles[0]) - 1, 0))
+                return
+
+    def _actualizar(self, hasta):
+        """Función para calcular los nodos internos de las primeras hojas, desde la última válida
+        """
+
+        if hasta <= self._validas:
+            return
+
+        desde = self._validas
+        cuenta = hasta
+        nivel = 0
+
+        while cuenta > 1:
+            nodos = self._niveles[nivel]
+            if nivel + 1 == len(self._niveles):
+                self._niveles.append([])
+
+            # Solo cambian los padres de los nodos desde la primera posición no válida
+            superior = self._niveles[nivel + 1]
+            inicio = desde // 2
+            del superior[inicio:]
+
+            for padre in range(inicio, (cuenta + 1) // 2):
+                izquierda = nodos[2 * padre]
+                derecha = nodos[2 * padre + 1] if 2 * \
+                    padre + 1 < cuenta else izquierda
+                superior.append(_hash_nodo(izquierda, derecha))
+
+            desde = inicio
+            cuenta = (cuenta + 1) // 2
+            nivel += 1
+
+        del self._niveles[nivel + 1:]
+        self._validas = hasta
+
+    def raiz(self, hasta=None):
+        """Función para obtener la raíz Merkle de las hojas o de solo las primeras,
+        como la de un bloque con las primeras transacciones del mempool
+
+        Args:
+            hasta (integer, optional): Número de hojas iniciales. Por defecto todas.
+
+        Returns:
+            string: Raíz Merkle
+        """
+
+        if hasta is None:
+            hasta = len(self._niveles[0])
+
+        if not hasta:
+            return sha256(b"").hexdigest()
+
+        self._actualizar(hasta)
+
+        # Los nodos completos están en caché, solo el borde derecho se calcula para estas hojas
+        ultimo = self._niveles[0][hasta - 1]
+        cuenta = hasta
+        nivel = 0
+
+        while cuenta > 1:
+            if (cuenta - 1) % 2:
+                ultimo = _hash_nodo(self._niveles[nivel][cuenta - 2], ultimo)
+            else:
+                ultimo = _hash_nodo(ultimo, ultimo)
+
+            cuenta = (cuenta + 1) // 2
+            nivel += 1
+
+        return ultimo.hex()
+
+    def posicion(self, txid):
+        """Función para obtener la posición de una transacción en el árbol
+
+        Args:
+            txid (string): Hash de la transacción
+
+        Returns:
+            integer: Posición de la hoja, None si no está
+        """
+
+        try:
+            return self._niveles[0].index(bytes.fromhex(txid))
+        except ValueError:
+            return None
+
+    def prueba(self, posicion):
+        """Función para obtener la prueba de inclusión de una hoja
+
+        Args:
+            posicion (integer): Posición de la hoja
+
+        Returns:
+            list: Hermanos desde la hoja hasta la raíz, con su hash y su lado
+        """
+
+        self._actualizar(len(self._niveles[0]))
+        prueba = []
+
+        for nodos in self._niveles[:-1]:
+            hermano = posicion ^ 1
+            if hermano >= len(nodos):
+                hermano = posicion
+
+            prueba.append({"hash": nodos[hermano].hex(),
+                           "lado": "derecha" if posicion % 2 == 0 else "izquierda"})
+            posicion //= 2
+
+        return prueba
+
+    def __len__(self):
+        return len(self._niveles[0])
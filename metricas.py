@@ -0,0 +1,304 @@
+import math
+import threading
+
+################################################
+# Parámetros de las métricas
+################################################
+
+# Límites superiores de los intervalos de los histogramas, en segundos
+LIMITES_POR_DEFECTO = (0.005, 0.01, 0.025, 0.05, 0.1,
+                       0.25, 0.5, 1, 2.5, 5, 10)
+# Prefijo del nombre de las métricas del nodo
+PREFIJO_METRICAS = "blockchain_"
+# Tipo de contenido del formato de texto de Prometheus
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def escapar_etiqueta(valor):
+    """Función para escapar el valor de una etiqueta en el formato de texto de Prometheus
+
+    Args:
+        valor (string): Valor de la etiqueta
+
+    Returns:
+        string: Valor escapado
+    """
+
+    return str(valor).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def formatear_valor(valor):
+    """Función para escribir un valor en el formato de texto de Prometheus
+
+    Args:
+        valor (float): Valor
+
+    Returns:
+        string: Valor escrito
+    """
+
+    if math.isinf(valor):
+        return "+Inf" if valor > 0 else "-Inf"
+
+    if float(valor).is_integer():
+        return str(int(valor))
+
+    return repr(float(valor))
+
+
+class Metrica:
+    tipo = "untyped"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        """Inicializador de una métrica con una serie por cada combinación de valores de sus etiquetas
+
+        Args:
+            nombre (string): Nombre de la métrica
+            ayuda (string): Descripción
+            etiquetas (tuple, optional): Nombres de las etiquetas. Por defecto ninguna.
+        """
+
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+
+        # Valores de las etiquetas -> valor de la serie
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _clave(self, etiquetas):
+        return tuple(str(etiquetas[etiqueta]) for etiqueta in self.etiquetas)
+
+    def _formatear_etiquetas(self, clave, extra=()):
+        pares = list(zip(self.etiquetas, clave)) + list(extra)
+
+        if not pares:
+            return ""
+
+        return "{" + ",".join(f'{etiqueta}="{escapar_etiqueta(valor)}"' for etiqueta, valor in pares) + "}"
+
+    def muestras(self):
+        """Función para obtener las líneas de muestras de la métrica
+
+        Returns:
+            list: Líneas en el formato de texto de Prometheus
+        """
+
+        with self._lock:
+            series = list(self._series.items())
+
+        return [f"{self.nombre}{self._formatear_etiquetas(clave)} {formatear_valor(valor)}" for clave, valor in series]
+
+    def exponer(self):
+        """Función para escribir la métrica completa, con su ayuda y su tipo
+
+        Returns:
+            string: Métrica en el formato de texto de Prometheus
+        """
+
+        lineas = [f"# HELP {self.nombre} {self.ayuda}",
+                  f"# TYPE {self.nombre} {self.tipo}"]
+
+        return "\n".join(lineas + self.muestras())
+
+
+class Contador(Metrica):
+    tipo = "counter"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), funcion=None):
+        """Inicializador de un contador: valor que solo crece
+
+        Args:
+            nombre (string): Nombre de la métrica
+            ayuda (string): Descripción
+            etiquetas (tuple, optional): Nombres de las etiquetas. Por defecto ninguna.
+            funcion (function, optional): Lee el valor de otro contador al exponerlo. Por defecto ninguna.
+        """
+
+        super().__init__(nombre, ayuda, etiquetas)
+        self.funcion = funcion
+
+    def incrementar(self, cantidad=1, **etiquetas):
+        """Función para sumar una cantidad al contador
+
+        Args:
+            cantidad (float, optional): Cantidad, no negativa. Por defecto 1.
+        """
+
+        clave = self._clave(etiquetas)
+
+        with self._lock:
+            self._series[clave] = self._series.get(clave, 0) + cantidad
+
+    def muestras(self):
+        if self.funcion is not None:
+            return [f"{self.nombre} {formatear_valor(self.funcion())}"]
+
+        return super().muestras()
+
+
+class Indicador(Metrica):
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), funcion=None):
+        """Inicializador de un indicador: valor que sube y baja
+
+        Args:
+            nombre (string): Nombre de la métrica
+            ayuda (string): Descripción
+            etiquetas (tuple, optional): Nombres de las etiquetas. Por defecto ninguna.
+            funcion (function, optional): Calcula el valor al exponerlo, sin coste fuera de la consulta. Por defecto ninguna.
+        """
+
+        super().__init__(nombre, ayuda, etiquetas)
+        self.funcion = funcion
+
+    def establecer(self, valor, **etiquetas):
+        """Función para fijar el valor del indicador
+
+        Args:
+            valor (float): Valor
+        """
+
+        clave = self._clave(etiquetas)
+
+        with self._lock:
+            self._series[clave] = valor
+
+    def muestras(self):
+        if self.funcion is not None:
+            return [f"{self.nombre} {formatear_valor(self.funcion())}"]
+
+        return super().muestras()
+
+
+class Histograma(Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES_POR_DEFECTO):
+        """Inicializador de un histograma: observaciones contadas por intervalos, con su suma y su número
+
+        Args:
+            nombre (string): Nombre de la métrica
+            ayuda (string): Descripción
+            etiquetas (tuple, optional): Nombres de las etiquetas. Por defecto ninguna.
+            limites (tuple, optional): Límites superiores de los intervalos. Por defecto LIMITES_POR_DEFECTO.
+        """
+
+        super().__init__(nombre, ayuda, etiquetas)
+        self.limites = tuple(sorted(limites)) + (math.inf,)
+
+    def observar(self, valor, **etiquetas):
+        """Función para registrar una observación
+
+        Args:
+            valor (float): Valor observado
+        """
+
+        clave = self._clave(etiquetas)
+
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                # Cuentas por intervalo, suma y número de observaciones
+                serie = self._series[clave] = [
+                    [0] * len(self.limites), 0, 0]
+
+            for posicion, limite in enumerate(self.limites):
+                if valor <= limite:
+                    serie[0][posicion] += 1
+                    break
+
+            serie[1] += valor
+            serie[2] += 1
+
+    def muestras(self):
+        with self._lock:
+            series = [(clave, list(cuentas), suma, numero)
+                      for clave, (cuentas, suma, numero) in self._series.items()]
+
+        lineas = []
+
+        for clave, cuentas, suma, numero in series:
+            acumulado = 0
+
+            # Cada intervalo incluye los anteriores
+            for limite, cuenta in zip(self.limites, cuentas):
+                acumulado += cuenta
+                lineas.append(
+                    f"{self.nombre}_bucket{self._formatear_etiquetas(clave, [('le', formatear_valor(limite))])} {acumulado}")
+
+            lineas.append(
+                f"{self.nombre}_sum{self._formatear_etiquetas(clave)} {formatear_valor(suma)}")
+            lineas.append(
+                f"{self.nombre}_count{self._formatear_etiquetas(clave)} {numero}")
+
+        return lineas
+
+
+################################################
+# Registro de métricas
+################################################
+
+
+class RegistroMetricas:
+    def __init__(self, prefijo=PREFIJO_METRICAS):
+        """Inicializador del registro de métricas de un nodo
+
+        Args:
+            prefijo (string, optional): Prefijo del nombre de todas las métricas. Por defecto PREFIJO_METRICAS.
+        """
+
+        self.prefijo = prefijo
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, clase, nombre, *args, **kwargs):
+        with self._lock:
+            if nombre not in self._metricas:
+                self._metricas[nombre] = clase(
+                    self.prefijo + nombre, *args, **kwargs)
+
+            return self._metricas[nombre]
+
+    def contador(self, nombre, ayuda, etiquetas=(), funcion=None):
+        """Función para obtener un contador, creándolo si no existe
+
+        Returns:
+            Contador: Contador
+        """
+
+        return self._registrar(Contador, nombre, ayuda, etiquetas, funcion)
+
+    def indicador(self, nombre, ayuda, etiquetas=(), funcion=None):
+        """Función para obtener un indicador, creándolo si no existe
+
+        Returns:
+            Indicador: Indicador
+        """
+
+        return self._registrar(Indicador, nombre, ayuda, etiquetas, funcion)
+
+    def histograma(self, nombre, ayuda, etiquetas=(), limites=LIMITES_POR_DEFECTO):
+        """Función para obtener un histograma, creándolo si no existe
+
+        Returns:
+            Histograma: Histograma
+        """
+
+        return self._registrar(Histograma, nombre, ayuda, etiquetas, limites)
+
+    def __getitem__(self, nombre):
+        return self._metricas[nombre]
+
+    def exponer(self):
+        """Función para escribir todas las métricas en el formato de texto de Prometheus
+
+        Returns:
+            string: Métricas
+        """
+
+        with self._lock:
+            metricas = list(self._metricas.values())
+
+        return "\n".join(metrica.exponer() for metrica in metricas) + "\n"
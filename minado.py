@@ -0,0 +1,342 @@
+import time
+import threading
+import multiprocessing
+import concurrent.futures
+from hashlib import sha256
+
+################################################
+# Parámetros del motor de minado
+################################################
+
+# Nonces asignados a cada tarea del pool
+TAMANO_RANGO = 1 << 18
+# Nonces evaluados por llamada al núcleo, entre comprobaciones de cancelación
+TAMANO_LOTE = 1 << 16
+# Tareas en vuelo por proceso
+TAREAS_POR_TRABAJADOR = 2
+# Segundos máximos de espera del pool entre comprobaciones de detención
+INTERVALO_DETENCION = 0.01
+# Núcleo de hash por defecto
+NUCLEO_POR_DEFECTO = "python"
+# Segundos mínimos sobre los que se calcula el hashrate
+VENTANA_HASHRATE = 5
+
+# Evento de cancelación y contador de hashes compartidos, establecidos en cada proceso del pool
+_evento_cancelacion = None
+_contador_intentos = None
+
+
+def _inicializar_trabajador(evento, contador):
+    """Función de inicialización de cada proceso del pool
+
+    Args:
+        evento (multiprocessing.Event): Evento de cancelación compartido
+        contador (multiprocessing.Value): Hashes calculados por todos los procesos
+    """
+
+    global _evento_cancelacion, _contador_intentos
+    _evento_cancelacion = evento
+    _contador_intentos = contador
+
+
+################################################
+# Núcleos de hash
+################################################
+
+
+class NucleoPython:
+    """Núcleo de hash en Python puro, comprueba nonce a nonce y sale en el primer acierto
+    """
+
+    nombre = "python"
+
+    def preparar(self, bloque, dificultad):
+        """Función para preparar el contexto constante de la búsqueda de un bloque
+
+        Args:
+            bloque (Bloque): Bloque a trabajar
+            dificultad (integer): Dificultad de la blockchain
+
+        Returns:
+            tuple: Contexto a pasar a evaluar_lote
+        """
+
+        # Cabecera antigua en texto, sin midstate posible
+        if bloque.cabecera["version"] == 1:
+            return (None, bloque.preparar_hash(), '0' * dificultad, dificultad)
+
+        return (sha256(bloque.prefijo_cabecera()), None, '0' * dificultad, dificultad)
+
+    def evaluar_lote(self, contexto, inicio, cantidad):
+        """Función que evalúa un lote de nonces consecutivos
+
+        Args:
+            contexto (tuple): Contexto devuelto por preparar
+            inicio (integer): Primer nonce del lote
+            cantidad (integer): Número de nonces del lote
+
+        Returns:
+            integer, integer: Primer nonce válido (None si no hay) y hashes calculados
+        """
+
+        midstate, calcular_hash, objetivo, dificultad = contexto
+
+        if midstate is None:
+            for nonce in range(inicio, inicio + cantidad):
+                if calcular_hash(nonce).startswith(objetivo):
+                    return nonce, nonce - inicio + 1
+            return None, cantidad
+
+        # Comparación sobre el digest binario: bytes a cero y medio byte final
+        bytes_cero = bytes(dificultad // 2)
+        longitud = dificultad // 2
+        medio_byte = dificultad % 2
+        copiar = midstate.copy
+
+        for nonce in range(inicio, inicio + cantidad):
+            primer_hash = copiar()
+            primer_hash.update(nonce.to_bytes(8, "big"))
+            digest = sha256(primer_hash.digest()).digest()
+
+            if digest[:longitud] == bytes_cero and (not medio_byte or digest[longitud] < 16):
+                return nonce, nonce - inicio + 1
+
+        return None, cantidad
+
+
+NUCLEOS = {NucleoPython.nombre: NucleoPython}
+
+
+def obtener_nucleo(nombre):
+    """Función para obtener un núcleo de hash por su nombre
+
+    Args:
+        nombre (string): Nombre del núcleo: python
+
+    Returns:
+        NucleoPython: Núcleo de hash
+    """
+
+    if nombre not in NUCLEOS:
+        raise ValueError(f"Núcleo de hash desconocido: {nombre}")
+
+    return NUCLEOS[nombre]()
+
+
+def buscar_nonce_en_rango(bloque, dificultad, inicio, fin, nucleo=NUCLEO_POR_DEFECTO, tamano_lote=TAMANO_LOTE, contador=None):
+    """Función que busca un nonce válido dentro de un rango disjunto, por lotes.
+    Los hashes de cada lote se suman al contador compartido, una suma con lock por lote
+
+    Args:
+        bloque (Bloque): Bloque a trabajar
+        dificultad (integer): Dificultad de la blockchain
+        inicio (integer): Primer nonce del rango
+        fin (integer): Nonce final del rango (no incluido)
+        nucleo (string, optional): Nombre del núcleo de hash. Por defecto NUCLEO_POR_DEFECTO.
+        tamano_lote (integer, optional): Nonces por llamada al núcleo. Por defecto TAMANO_LOTE.
+        contador (multiprocessing.Value, optional): Contador de hashes. Por defecto el del proceso del pool.
+
+    Returns:
+        integer, integer: Nonce encontrado (None si no hay) y hashes calculados
+    """
+
+    contador = contador if contador is not None else _contador_intentos
+    nucleo = obtener_nucleo(nucleo)
+    # Midstate del prefijo constante calculado una sola vez por rango
+    contexto = nucleo.preparar(bloque, dificultad)
+    intentos = 0
+
+    for lote in range(inicio, fin, tamano_lote):
+        nonce, calculados = nucleo.evaluar_lote(
+            contexto, lote, min(tamano_lote, fin - lote))
+        intentos += calculados
+
+        if contador is not None:
+            with contador.get_lock():
+                contador.value += calculados
+
+        if nonce is not None:
+            return nonce, intentos
+
+        # Comprobación barata de cancelación entre lotes
+        if _evento_cancelacion is not None and _evento_cancelacion.is_set():
+            break
+
+    return None, intentos
+
+
+################################################
+# Motor de minado
+################################################
+
+
+class MotorMinado:
+    def __init__(self, trabajadores=1, nucleo=NUCLEO_POR_DEFECTO, tamano_rango=TAMANO_RANGO, tamano_lote=TAMANO_LOTE):
+        """Inicializador del motor de minado
+
+        Args:
+            trabajadores (integer, optional): Número de procesos de minado. Por defecto 1.
+            nucleo (string, optional): Nombre del núcleo de hash. Por defecto NUCLEO_POR_DEFECTO.
+            tamano_rango (integer, optional): Nonces por tarea. Por defecto TAMANO_RANGO.
+            tamano_lote (integer, optional): Nonces por llamada al núcleo. Por defecto TAMANO_LOTE.
+        """
+
+        # Fallar al arrancar si el núcleo no está disponible
+        obtener_nucleo(nucleo)
+
+        self.trabajadores = max(1, trabajadores)
+        self.nucleo = nucleo
+        self.tamano_rango = tamano_rango
+        self.tamano_lote = tamano_lote
+        self._pool = None
+        self._evento = None
+
+        # Hashes calculados desde el arranque, compartido con los procesos del pool
+        self._contador = multiprocessing.Value("Q", 0)
+        # Muestras (segundos, hashes) anterior y actual para el hashrate
+        self._muestras = [(time.monotonic(), 0)] * 2
+        self._lock_muestras = threading.Lock()
+
+    def _obtener_pool(self):
+        """Función para crear el pool de procesos la primera vez que se necesita
+
+        Returns:
+            ProcessPoolExecutor: Pool de procesos
+        """
+
+        if self._pool is None:
+            self._evento = multiprocessing.Event()
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.trabajadores, initializer=_inicializar_trabajador, initargs=(self._evento, self._contador))
+
+        return self._pool
+
+    def buscar(self, bloque, dificultad, inicio=0, detener=None):
+        """Función que busca un nonce válido repartiendo el espacio de nonces
+
+        Args:
+            bloque (Bloque): Bloque a trabajar
+            dificultad (integer): Dificultad de la blockchain
+            inicio (integer, optional): Primer nonce a probar. Por defecto 0.
+            detener (function, optional): Recibe los hashes calculados y devuelve True para abortar
+
+        Returns:
+            integer, integer: Nonce encontrado (None si se aborta) y hashes calculados en total
+        """
+
+        if self.trabajadores == 1:
+            return self._buscar_local(bloque, dificultad, inicio, detener)
+
+        return self._buscar_paralelo(bloque, dificultad, inicio, detener)
+
+    def _buscar_local(self, bloque, dificultad, inicio, detener):
+        """Función de búsqueda en el propio proceso, sin pool
+
+        Returns:
+            integer, integer: Nonce encontrado (None si se aborta) y hashes calculados en total
+        """
+
+        intentos = 0
+        siguiente = inicio
+
+        while True:
+            nonce, calculados = buscar_nonce_en_rango(
+                bloque, dificultad, siguiente, siguiente + self.tamano_lote, self.nucleo, self.tamano_lote, self._contador)
+            intentos += calculados
+            siguiente += self.tamano_lote
+
+            if nonce is not None:
+                return nonce, intentos
+
+            if detener is not None and detener(intentos):
+                return None, intentos
+
+    def _buscar_paralelo(self, bloque, dificultad, inicio, detener):
+        """Función de búsqueda en rangos disjuntos sobre el pool de procesos
+
+        Returns:
+            integer, integer: Nonce encontrado (None si se aborta) y hashes calculados en total
+        """
+
+        pool = self._obtener_pool()
+        self._evento.clear()
+
+        intentos = 0
+        encontrado = None
+        siguiente = inicio
+        pendientes = set()
+
+        # Llenar el pool con rangos disjuntos
+        for _ in range(self.trabajadores * TAREAS_POR_TRABAJADOR):
+            pendientes.add(pool.submit(buscar_nonce_en_rango, bloque, dificultad,
+                           siguiente, siguiente + self.tamano_rango, self.nucleo, self.tamano_lote))
+            siguiente += self.tamano_rango
+
+        try:
+            while encontrado is None:
+                terminados, pendientes = concurrent.futures.wait(
+                    pendientes, timeout=INTERVALO_DETENCION, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for futuro in terminados:
+                    nonce, calculados = futuro.result()
+                    intentos += calculados
+
+                    if nonce is not None and encontrado is None:
+                        encontrado = nonce
+
+                if encontrado is not None:
+                    break
+
+                if detener is not None and detener(intentos):
+                    break
+
+                # Reponer tantos rangos como tareas terminadas
+                for _ in terminados:
+                    pendientes.add(pool.submit(buscar_nonce_en_rango, bloque, dificultad,
+                                   siguiente, siguiente + self.tamano_rango, self.nucleo, self.tamano_lote))
+                    siguiente += self.tamano_rango
+        finally:
+            # Cancelar al resto de procesos y esperar a que liberen el pool
+            self._evento.set()
+            for futuro in concurrent.futures.as_completed(pendientes):
+                intentos += futuro.result()[1]
+
+        return encontrado, intentos
+
+    def hashes_totales(self):
+        """Función para obtener los hashes calculados desde el arranque, actualizados lote a lote
+
+        Returns:
+            integer: Hashes calculados
+        """
+
+        return self._contador.value
+
+    def hashrate(self):
+        """Función para obtener los hashes por segundo a partir del contador, sobre una ventana
+        de entre VENTANA_HASHRATE y el doble de segundos hasta el momento de la consulta
+
+        Returns:
+            float: Hashes por segundo
+        """
+
+        ahora = time.monotonic()
+        total = self.hashes_totales()
+
+        with self._lock_muestras:
+            # La muestra actual pasa a anterior al cumplir la ventana
+            if ahora - self._muestras[1][0] >= VENTANA_HASHRATE:
+                self._muestras = [self._muestras[1], (ahora, total)]
+
+            tiempo, hashes = self._muestras[0]
+
+        return (total - hashes) / max(ahora - tiempo, 1e-9)
+
+    def cerrar(self):
+        """Función para liberar el pool de procesos
+        """
+
+        if self._pool is not None:
+            self._evento.set()
+            self._pool.shutdown(wait=True)
+            self._pool = None
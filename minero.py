@@ -1,16 +1,20 @@
 import procesador
 import sys
-import concurrent.futures
 import threading
 import json
 import os
 import logging
 import requests
 import argparse
+import asyncio
+from urllib.parse import parse_qs
 from configparser import ConfigParser
 from tracemalloc import start
 from blockchain import BlockchainMaliciosa as blockchain
-from flask import Flask, request, render_template
+from servidor import ServidorNodo, AvisoAsincrono, esperar_desconexion, SERVIDORES, SERVIDOR_POR_DEFECTO, TRABAJADORES_SERVIDOR
+from metricas import TIPO_CONTENIDO
+from serializacion import flujo_ndjson, evento_sse, TAMANO_PAGINA, MAXIMO_PAGINA, TAMANO_PAGINA_EXPLORADOR, MAXIMO_PAGINA_EXPLORADOR, ESPERA_EVENTOS
+from flask import Flask, Response, request, render_template
 from time import sleep
 
 ################################################
@@ -38,6 +42,24 @@ parser.add_argument("-nonodos", "--nonodos",
                     help="Deshabilitar nodos. Utilizar en ejecución sola o incompleta.", action='store_true')
 parser.add_argument("-noprints", "--noprints",
                     help="Deshabilitar salidas por consola.", action='store_true')
+parser.add_argument("-w", "--workers", type=int, default=1,
+                    help="[int] Número de procesos de minado: 1, 2, 3, ... Por defecto 1")
+parser.add_argument("-legacy", "--legacy",
+                    help="Minar con la cabecera antigua en texto (versión 1) en lugar de la cabecera binaria.", action='store_true')
+parser.add_argument("-intervalo", "--intervalo", type=float, default=1,
+                    help="[float] Segundos entre rondas de consenso en segundo plano. Por defecto 1")
+parser.add_argument("-nucleo", "--nucleo", default="python", choices=["python"],
+                    help="Núcleo de hash del minado: python. Por defecto python")
+parser.add_argument("-auditar", "--auditar",
+                    help="Validar al inicio la Blockchain completa: enlaces, prueba de trabajo, raíz Merkle y firmas.", action='store_true')
+parser.add_argument("-persistir", "--persistir",
+                    help="Habilitar almacén de bloques en disco (datos/minero-<número>), se retoma la Blockchain al reiniciar.", action='store_true')
+parser.add_argument("-saldos", "--saldos",
+                    help="Rechazar transacciones cuyo emisor no tenga saldo suficiente. (El emisor de pruebas no tiene saldo)", action='store_true')
+parser.add_argument("-servidor", "--servidor", default=SERVIDOR_POR_DEFECTO, choices=SERVIDORES,
+                    help="Servidor HTTP del nodo: werkzeug (hilos), asgi (uvicorn). Por defecto werkzeug")
+parser.add_argument("-hilos", "--hilos", type=int, default=TRABAJADORES_SERVIDOR,
+                    help=f"[int] Hilos que ejecutan las rutas en el servidor asgi. Por defecto {TRABAJADORES_SERVIDOR}")
 
 # Establecer parámetros
 args = parser.parse_args()
@@ -102,26 +124,308 @@ cartera_malicioso = configuracion_malicioso.read(
 
 # App & endpoints
 node = Flask(__name__, static_folder="templates/estilos")
+# Servidor HTTP del nodo, creado al iniciar la aplicación
+servidor_nodo = None
+# Aviso de cambios de la Blockchain para los eventos del servidor ASGI
+aviso_cambios = AvisoAsincrono()
 
 
 @node.route('/', methods=['GET'])
 def interfaz_grafica():
-    datos_blockchain = []
+    # Los bloques se piden por páginas desde el navegador
+    return render_template('ver-blockchain.html', limite=TAMANO_PAGINA_EXPLORADOR)
+
+
+@node.route('/api/bloques', methods=['GET'])
+def obtener_pagina_explorador():
+    antes = request.args.get("antes", type=int)
+    limite = min(request.args.get(
+        "limite", default=TAMANO_PAGINA_EXPLORADOR, type=int), MAXIMO_PAGINA_EXPLORADOR)
+
+    bloques, cursor = blockchain.obtener_pagina_explorador(antes, limite)
+
+    return Response(json.dumps({"bloques": [bloque.a_dict() for bloque in bloques], "cursor": cursor}),
+                    mimetype="application/json")
+
+
+@node.route('/eventos', methods=['GET'])
+def obtener_eventos():
+    # Último bloque que tiene el navegador, también al reconectar
+    hash = request.headers.get("Last-Event-ID") or request.args.get("hash")
+
+    def generar(hash):
+        version = blockchain.version_blockchain
+        if hash is None:
+            hash = blockchain.ultimo_bloque.hash
+
+        # Comentario inicial, las cabeceras se envían sin esperar al primer bloque
+        yield b": \n\n"
+
+        while True:
+            eventos, hash = eventos_pendientes(hash)
+            if eventos:
+                yield eventos
+
+            nueva_version = blockchain.esperar_cambios(version, ESPERA_EVENTOS)
+
+            # Comentario para mantener la conexión abierta
+            if nueva_version == version:
+                yield b": \n\n"
+            version = nueva_version
+
+    respuesta = Response(generar(hash), mimetype="text/event-stream")
+    respuesta.headers["Cache-Control"] = "no-cache"
+    respuesta.headers["X-Accel-Buffering"] = "no"
+
+    return respuesta
+
+
+def eventos_pendientes(hash):
+    """Función para obtener los eventos de los bloques posteriores al último que tiene el navegador
+
+    Args:
+        hash (string): Hash del último bloque enviado
+
+    Returns:
+        bytes, string: Eventos codificados y hash del nuevo último bloque enviado
+    """
+
+    eventos = []
+    bloques = blockchain.obtener_bloques_posteriores(hash)
+
+    # El bloque ya no está en la Blockchain, el navegador vuelve a cargar las páginas
+    if bloques is None:
+        ultimo = blockchain.ultimo_bloque
+        eventos.append(evento_sse("reorganizacion", {
+                       "indice": ultimo.indice}, ultimo.hash))
+        hash = ultimo.hash
+        bloques = []
+
+    for bloque in bloques:
+        eventos.append(evento_sse("bloque", bloque.a_dict(), bloque.hash))
+        hash = bloque.hash
+
+    return b"".join(eventos), hash
+
+
+async def eventos_asincronos(scope, receive, send):
+    """Función de la ruta /eventos en el servidor ASGI: la espera de cambios se hace en el bucle de eventos,
+    cada navegador solo ocupa un hilo mientras se preparan sus eventos
+
+    Args:
+        scope (dict): Scope ASGI de la petición
+        receive (function): Canal de mensajes del cliente
+        send (function): Canal de mensajes al cliente
+    """
+
+    # Último bloque que tiene el navegador, también al reconectar
+    cabeceras = dict(scope.get("headers", []))
+    hash = cabeceras.get(b"last-event-id", b"").decode("latin1") or parse_qs(
+        scope["query_string"].decode("latin1")).get("hash", [None])[0]
+
+    bucle = asyncio.get_running_loop()
+    aviso = aviso_cambios.suscribir()
+    desconexion = asyncio.ensure_future(esperar_desconexion(receive))
+
+    try:
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream; charset=utf-8"),
+                                (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")]})
+        await send({"type": "http.response.body", "body": b": \n\n", "more_body": True})
+
+        if hash is None:
+            hash = (await bucle.run_in_executor(None, lambda: blockchain.ultimo_bloque)).hash
+
+        while not desconexion.done():
+            # Los cambios posteriores a limpiar el aviso lo vuelven a activar
+            aviso.clear()
 
-    for bloque in blockchain.blockchain:
-        datos_blockchain.append(bloque.__dict__)
+            # Consulta breve en un hilo, el lock de la Blockchain no detiene el bucle de eventos
+            eventos, hash = await bucle.run_in_executor(None, eventos_pendientes, hash)
+            if eventos:
+                await send({"type": "http.response.body", "body": eventos, "more_body": True})
 
-    return render_template('ver-blockchain.html', blockchain=json.dumps(datos_blockchain, separators=(',', ':')))
+            espera = asyncio.ensure_future(aviso.wait())
+            hechas, _ = await asyncio.wait({espera, desconexion}, timeout=ESPERA_EVENTOS,
+                                           return_when=asyncio.FIRST_COMPLETED)
+            espera.cancel()
+
+            # Comentario para mantener la conexión abierta
+            if not hechas:
+                await send({"type": "http.response.body", "body": b": \n\n", "more_body": True})
+    finally:
+        desconexion.cancel()
+        aviso_cambios.cancelar(aviso)
 
 
 @node.route('/blockchain', methods=['GET'])
 def obtener_blockchain():
-    datos_blockchain = []
+    # Serialización en caché, igual para todos los nodos mientras no cambie la Blockchain
+    comprimir = request.accept_encodings["gzip"] > 0
+    cuerpo, etag = blockchain.serializar_blockchain(comprimir)
+
+    respuesta = Response(cuerpo, mimetype="application/json")
+    respuesta.set_etag(etag)
+    respuesta.vary.add("Accept-Encoding")
+    if comprimir:
+        respuesta.content_encoding = "gzip"
+
+    # 304 sin cuerpo si el nodo ya tiene esta versión
+    return respuesta.make_conditional(request)
+
+
+@node.route('/bloques', methods=['GET'])
+def obtener_bloques():
+    desde = request.args.get("desde", default=0, type=int)
+    despues = request.args.get("despues")
+
+    # Bloques posteriores a un hash conocido
+    if despues is not None:
+        altura = blockchain.obtener_altura(despues)
+        if altura is None:
+            return json.dumps([]), 404
+        desde = altura + 1
+
+    return blockchain.serializar_bloques(desde)
+
+
+@node.route('/flujo', methods=['GET'])
+def obtener_flujo():
+    desde = request.args.get("desde", default=0, type=int)
+    limite = min(request.args.get(
+        "limite", default=TAMANO_PAGINA, type=int), MAXIMO_PAGINA)
+    cursor = request.args.get("cursor")
+    hash_previo = None
+
+    # Cursor "altura:hash" del último bloque de la página anterior
+    if cursor is not None:
+        try:
+            altura, hash_previo = cursor.split(":", 1)
+            desde = int(altura) + 1
+        except ValueError:
+            return json.dumps({"error": "Cursor mal formado"}), 400
+
+    pagina = blockchain.obtener_pagina_bloques(desde, limite, hash_previo)
+
+    if pagina is None:
+        return json.dumps({"error": "Cursor no válido, la Blockchain ha cambiado"}), 409
+
+    bloques, siguiente = pagina
+
+    # Un bloque por línea, enviado por trozos según se serializa
+    respuesta = Response(flujo_ndjson(bloques),
+                         mimetype="application/x-ndjson")
+    if siguiente is not None:
+        respuesta.headers["X-Cursor-Siguiente"] = siguiente
+
+    return respuesta
+
+
+@node.route('/cabeceras', methods=['GET'])
+def obtener_cabeceras():
+    desde = request.args.get("desde", default=0, type=int)
+
+    datos_cabeceras = []
+
+    for bloque in blockchain.obtener_bloques(desde):
+        datos_cabeceras.append(bloque.a_dict_cabecera())
+
+    return json.dumps(datos_cabeceras)
 
-    for bloque in blockchain.blockchain:
-        datos_blockchain.append(bloque.__dict__)
 
-    return json.dumps(datos_blockchain)
+@node.route('/transacciones', methods=['POST'])
+def recibir_transacciones():
+    transacciones = request.get_json(force=True, silent=True)
+
+    if not isinstance(transacciones, list):
+        return json.dumps({"error": "Se esperaba un listado de transacciones"}), 400
+
+    try:
+        anadidas = blockchain.anadir_transacciones_firmadas(transacciones)
+    except (KeyError, TypeError):
+        return json.dumps({"error": "Transacción mal formada"}), 400
+
+    return json.dumps({"recibidas": len(transacciones), "anadidas": anadidas})
+
+
+@node.route('/bloque', methods=['POST'])
+def recibir_bloque():
+    datos = request.get_json(force=True, silent=True)
+
+    if not isinstance(datos, dict) or not isinstance(datos.get("bloque"), dict):
+        return json.dumps({"error": "Se esperaba un bloque"}), 400
+
+    try:
+        resultado = blockchain.recibir_bloque(
+            datos["bloque"], datos.get("origen"))
+    except (KeyError, TypeError, ValueError):
+        return json.dumps({"error": "Bloque mal formado"}), 400
+
+    return json.dumps({"resultado": resultado})
+
+
+@node.route('/prueba/<txid>', methods=['GET'])
+def obtener_prueba(txid):
+    prueba = blockchain.obtener_prueba_inclusion(txid)
+
+    if prueba is None:
+        return json.dumps({"error": "Transacción no encontrada"}), 404
+
+    return json.dumps(prueba)
+
+
+@node.route('/bloque/<hash>', methods=['GET'])
+def obtener_bloque(hash):
+    bloque = blockchain.obtener_bloque(hash=hash)
+
+    if bloque is None:
+        return json.dumps({"error": "Bloque no encontrado"}), 404
+
+    return json.dumps(bloque.a_dict())
+
+
+@node.route('/altura/<int:altura>', methods=['GET'])
+def obtener_bloque_altura(altura):
+    bloque = blockchain.obtener_bloque(altura=altura)
+
+    if bloque is None:
+        return json.dumps({"error": "Bloque no encontrado"}), 404
+
+    return json.dumps(bloque.a_dict())
+
+
+@node.route('/tx/<txid>', methods=['GET'])
+def obtener_transaccion(txid):
+    transaccion = blockchain.obtener_transaccion(txid)
+
+    if transaccion is None:
+        return json.dumps({"error": "Transacción no encontrada"}), 404
+
+    return json.dumps(transaccion)
+
+
+# Las direcciones en base64 pueden contener "/"
+@node.route('/direccion/<path:direccion>', methods=['GET'])
+def obtener_direccion(direccion):
+    desde = request.args.get("desde", default=0, type=int)
+    limite = request.args.get("limite", default=100, type=int)
+
+    return json.dumps(blockchain.obtener_transacciones_direccion(direccion, desde, limite))
+
+
+@node.route('/saldo/<path:direccion>', methods=['GET'])
+def obtener_saldo(direccion):
+    return json.dumps(blockchain.obtener_saldo(direccion))
+
+
+@node.route('/estadisticas', methods=['GET'])
+def obtener_estadisticas():
+    return json.dumps(blockchain.estadisticas())
+
+
+@node.route('/metrics', methods=['GET'])
+def obtener_metricas():
+    return Response(blockchain.metricas.exponer(), content_type=TIPO_CONTENIDO)
 
 
 # @node.route('/blockchain-maliciosa', methods=['GET'])
@@ -129,18 +433,15 @@ def obtener_blockchain():
 #     datos_blockchain = []
 
 #     for bloque in blockchain.blockchain_maliciosa:
-#         datos_blockchain.append(bloque.__dict__)
+#         datos_blockchain.append(bloque.a_dict())
 
 #     return json.dumps(datos_blockchain)
 
 
 @node.get('/apagado')
 def apagado():
-    func = request.environ.get('werkzeug.server.shutdown')
-
-    if func is None:
-        raise RuntimeError('Not running with the Werkzeug Server')
-    func()
+    # Se detiene desde otro hilo para poder responder a esta petición
+    threading.Thread(target=servidor_nodo.detener).start()
 
     return 'Server shutting down...'
 
@@ -158,8 +459,9 @@ def almacenar_blockchain(blockchain):
 
     datos_blockchain = []
 
-    for bloque in blockchain.blockchain:
-        datos_blockchain.append(bloque.__dict__)
+    # Copia bajo el lock, la Blockchain se modifica en el sitio en las reorganizaciones
+    for bloque in blockchain.obtener_bloques():
+        datos_blockchain.append(bloque.a_dict())
 
     file = open("resultados/normal/blockchains/blockchain-" +
                 str(numero_minero) + ".json", "w")
@@ -176,7 +478,7 @@ def almacenar_blockchain_maliciosa(blockchain):
     datos_blockchain = []
 
     for bloque in blockchain.blockchain_maliciosa:
-        datos_blockchain.append(bloque.__dict__)
+        datos_blockchain.append(bloque.a_dict())
 
     file = open("resultados/malicioso/blockchains/blockchain-" +
                 str(numero_minero) + ".json", "w")
@@ -235,6 +537,9 @@ def minar_blockchain(blockchain):
             else:
                 nodos_listos = True
 
+        # Consenso en segundo plano, cancela el minado si gana otra Blockchain
+        blockchain.iniciar_sincronizacion(args.intervalo)
+
     # Bucle para minar en base a las iteraciones
     while blockchain.ultimo_bloque.indice < numero_iteraciones:
         print("---------------------")
@@ -256,10 +561,19 @@ def minar_blockchain(blockchain):
                                             configuracion_emisor.get('configuracion', 'clave_privada_cartera'), 
                                             configuracion_receptor.get('configuracion', 'direccion_cartera'), "0.02", "Transaccion normal")
 
-        # blockchain.minar()
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            for index in range(1):
-                executor.submit(blockchain.minar)
+        # El paralelismo lo aporta el pool de procesos del motor de minado
+        blockchain.minar()
+
+    blockchain.detener_sincronizacion()
+    blockchain.motor_minado.cerrar()
+    blockchain.verificador_firmas.cerrar()
+    blockchain.validador.cerrar()
+
+    # Consenso final antes de almacenar
+    if not args.nonodos:
+        blockchain.consenso()
+
+    blockchain.cliente_nodos.cerrar()
 
     almacenar_blockchain(blockchain)
 
@@ -342,12 +656,42 @@ def iniciar_app(blockchain):
         blockchain (list): Blockchain utilizada en la aplicación
     """
 
+    global servidor_nodo
+
     # Evitar salida por consola de POST/GET
     logging.getLogger('werkzeug').disabled = True
-    os.environ['WERKZEUG_RUN_MAIN'] = 'true'
 
-    node.run(debug=False, port=blockchain.puerto,
-             use_reloader=False, host="0.0.0.0")
+    # En el servidor ASGI los eventos del explorador esperan en el bucle, sin ocupar hilos
+    rutas_asincronas = None
+    if args.servidor == "asgi":
+        blockchain.registrar_observador(aviso_cambios.avisar)
+        rutas_asincronas = {"/eventos": eventos_asincronos}
+
+    servidor_nodo = ServidorNodo(
+        node, blockchain.puerto, servidor=args.servidor, trabajadores=args.hilos, rutas_asincronas=rutas_asincronas)
+    servidor_nodo.iniciar()
+
+
+def auditar_blockchain(blockchain):
+    """Función para validar la Blockchain completa mostrando el progreso
+
+    Args:
+        blockchain (Blockchain): Blockchain a auditar
+    """
+
+    print("|------ AUDITANDO BLOCKCHAIN... ------|")
+
+    def progreso(validados, total, bloques_por_segundo):
+        print(
+            f"Validados {validados}/{total} bloques [{round(bloques_por_segundo)} bloques/s]")
+
+    informe = blockchain.auditar(progreso)
+
+    for indice, motivo in informe["errores"]:
+        print(f"Bloque {indice} no válido: {motivo}")
+
+    print(
+        f'¡Auditoría terminada! [{"{:.3f}".format(informe["segundos"])}s, {informe["bloques_por_segundo"]} bloques/s], errores: {len(informe["errores"])}\n')
 
 
 def inicializar_blockchain():
@@ -372,8 +716,12 @@ def inicializar_blockchain():
     clave_privada_minero = configuracion_minero.get(
         'minero', 'clave_privada_minero')
 
+    ruta_datos = None
+    if args.persistir:
+        ruta_datos = f"datos/minero-{numero_minero}"
+
     bc = blockchain(
-        dificultad, ip, puerto, listado_nodos, numero_minero, direccion_minero, clave_privada_minero)
+        dificultad, ip, puerto, listado_nodos, numero_minero, direccion_minero, clave_privada_minero, args.workers, args.legacy, args.nucleo, ruta_datos=ruta_datos, comprobar_saldos=args.saldos)
 
     return bc
 
@@ -396,6 +744,9 @@ if __name__ == '__main__':
 
     blockchain = inicializar_blockchain()
 
+    if args.auditar:
+        auditar_blockchain(blockchain)
+
     first = threading.Thread(target=iniciar_app, args=(blockchain,))
     first.start()
 
@@ -411,4 +762,8 @@ if __name__ == '__main__':
     if args.parar:
         sleep(30)
         requests.get(
-            url=f"http://{blockchain.ip}:{blockchain.puerto}/apagado", timeout=1)
\ No newline at end of file
+            url=f"http://{blockchain.ip}:{blockchain.puerto}/apagado", timeout=1)
+
+    # El almacén se cierra cuando ya no se atienden peticiones que lean bloques de él
+    first.join()
+    blockchain.cerrar_almacen()
@@ -236,7 +236,8 @@ def crear_informe_xlsx(ruta, blockchain):
     worksheet.set_column(8, 8, 12, formato2)
     worksheet.set_column(9, 9, 12, formato1)
     worksheet.set_column(10, 10, 12, formato1)
-    writer.save()
+    # close() guarda el libro, save() ya no existe en pandas 2
+    writer.close()
 
 
 def crear_informes(ruta, blockchain):
@@ -0,0 +1,250 @@
+import time
+import threading
+import requests
+import concurrent.futures
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+from metricas import RegistroMetricas
+
+################################################
+# Parámetros de red
+################################################
+
+# Segundos de espera por petición a un nodo
+TIMEOUT_NODO = 1
+# Hilos máximos para consultar nodos a la vez
+MAXIMO_HILOS = 16
+# Fallos seguidos antes de abrir el circuito de un nodo
+FALLOS_MAXIMOS = 3
+# Segundos con el circuito abierto antes de volver a intentarlo
+TIEMPO_APERTURA = 5
+
+
+class CircuitoAbierto(ConnectionError):
+    """Excepción de un nodo con el circuito abierto por fallos seguidos
+    """
+
+
+################################################
+# Cliente de nodos
+################################################
+
+
+class ClienteNodos:
+    def __init__(self, listado_nodos, timeout=TIMEOUT_NODO, maximo_hilos=MAXIMO_HILOS, fallos_maximos=FALLOS_MAXIMOS, tiempo_apertura=TIEMPO_APERTURA, metricas=None):
+        """Inicializador del cliente de nodos
+
+        Args:
+            listado_nodos (list): Listado de URLs de nodos
+            timeout (float, optional): Segundos de espera por petición. Por defecto TIMEOUT_NODO.
+            maximo_hilos (integer, optional): Hilos máximos de consulta. Por defecto MAXIMO_HILOS.
+            fallos_maximos (integer, optional): Fallos seguidos para abrir el circuito. Por defecto FALLOS_MAXIMOS.
+            tiempo_apertura (float, optional): Segundos de circuito abierto. Por defecto TIEMPO_APERTURA.
+            metricas (RegistroMetricas, optional): Registro de métricas del nodo. Por defecto uno propio.
+        """
+
+        self.listado_nodos = listado_nodos
+        self.timeout = timeout
+        self.fallos_maximos = fallos_maximos
+        self.tiempo_apertura = tiempo_apertura
+
+        # Sesión con conexiones persistentes por nodo
+        self._sesiones = {}
+        # Fallos seguidos y fin de apertura del circuito por nodo
+        self._fallos = {}
+        self._abierto_hasta = {}
+        self._lock = threading.Lock()
+
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, min(len(listado_nodos), maximo_hilos)), thread_name_prefix="cliente-nodos")
+
+        # Latencia y errores de las peticiones por nodo
+        metricas = metricas if metricas is not None else RegistroMetricas()
+        self._latencia = metricas.histograma(
+            "peticion_nodo_segundos", "Latencia hasta la respuesta de las peticiones a otros nodos", ("nodo", "metodo"))
+        self._errores = metricas.contador(
+            "errores_nodo_total", "Peticiones a otros nodos sin respuesta o rechazadas por el circuito abierto", ("nodo", "motivo"))
+
+    def _obtener_sesion(self, url_nodo):
+        """Función para obtener la sesión keep-alive de un nodo, creándola la primera vez
+
+        Args:
+            url_nodo (string): URL del nodo
+
+        Returns:
+            requests.Session: Sesión del nodo
+        """
+
+        with self._lock:
+            if url_nodo not in self._sesiones:
+                sesion = requests.Session()
+                sesion.mount(url_nodo, HTTPAdapter(
+                    pool_connections=1, pool_maxsize=4))
+                self._sesiones[url_nodo] = sesion
+
+            return self._sesiones[url_nodo]
+
+    def esta_disponible(self, url_nodo):
+        """Función que comprueba si el circuito de un nodo permite peticiones
+
+        Args:
+            url_nodo (string): URL del nodo
+
+        Returns:
+            bool: True o False
+        """
+
+        return time.monotonic() >= self._abierto_hasta.get(url_nodo, 0)
+
+    def _registrar_resultado(self, url_nodo, correcto):
+        """Función para actualizar el circuito de un nodo tras una petición
+
+        Args:
+            url_nodo (string): URL del nodo
+            correcto (bool): Si la petición ha tenido respuesta
+        """
+
+        with self._lock:
+            if correcto:
+                self._fallos[url_nodo] = 0
+                self._abierto_hasta.pop(url_nodo, None)
+                return
+
+            self._fallos[url_nodo] = self._fallos.get(url_nodo, 0) + 1
+
+            # Circuito abierto, o reabierto si falla el intento tras la apertura
+            if self._fallos[url_nodo] >= self.fallos_maximos:
+                self._abierto_hasta[url_nodo] = time.monotonic() + \
+                    self.tiempo_apertura
+
+    def obtener(self, url_nodo, ruta, params=None, stream=False):
+        """Función para hacer una petición GET a un nodo
+
+        Args:
+            url_nodo (string): URL del nodo
+            ruta (string): Ruta del endpoint
+            params (dict, optional): Parámetros de la petición. Por defecto ninguno.
+            stream (bool, optional): Leer el cuerpo a medida que llega, hay que cerrar la respuesta. Por defecto False.
+
+        Returns:
+            requests.Response: Respuesta del nodo
+        """
+
+        if not self.esta_disponible(url_nodo):
+            self._errores.incrementar(nodo=url_nodo, motivo="circuito")
+            raise CircuitoAbierto(f"Circuito abierto para {url_nodo}")
+
+        inicio = time.perf_counter()
+
+        try:
+            respuesta = self._obtener_sesion(url_nodo).get(
+                url=url_nodo + ruta, params=params, timeout=self.timeout, stream=stream)
+        except (ConnectionError, Timeout) as error:
+            self._errores.incrementar(
+                nodo=url_nodo, motivo="timeout" if isinstance(error, Timeout) else "conexion")
+            self._registrar_resultado(url_nodo, False)
+            raise
+
+        self._latencia.observar(time.perf_counter() - inicio,
+                                nodo=url_nodo, metodo="GET")
+        self._registrar_resultado(url_nodo, True)
+
+        return respuesta
+
+    def enviar(self, url_nodo, ruta, datos):
+        """Función para hacer una petición POST con JSON a un nodo
+
+        Args:
+            url_nodo (string): URL del nodo
+            ruta (string): Ruta del endpoint
+            datos (dict): Datos a enviar
+
+        Returns:
+            requests.Response: Respuesta del nodo
+        """
+
+        if not self.esta_disponible(url_nodo):
+            self._errores.incrementar(nodo=url_nodo, motivo="circuito")
+            raise CircuitoAbierto(f"Circuito abierto para {url_nodo}")
+
+        inicio = time.perf_counter()
+
+        try:
+            respuesta = self._obtener_sesion(url_nodo).post(
+                url=url_nodo + ruta, json=datos, timeout=self.timeout)
+        except (ConnectionError, Timeout) as error:
+            self._errores.incrementar(
+                nodo=url_nodo, motivo="timeout" if isinstance(error, Timeout) else "conexion")
+            self._registrar_resultado(url_nodo, False)
+            raise
+
+        self._latencia.observar(time.perf_counter() - inicio,
+                                nodo=url_nodo, metodo="POST")
+        self._registrar_resultado(url_nodo, True)
+
+        return respuesta
+
+    def difundir(self, ruta, datos, excluir=()):
+        """Función para enviar los mismos datos a todos los nodos sin esperar las respuestas
+
+        Args:
+            ruta (string): Ruta del endpoint
+            datos (dict): Datos a enviar
+            excluir (iterable, optional): URLs de nodos a los que no enviar. Por defecto ninguno.
+
+        Returns:
+            list: Futuros de los envíos
+        """
+
+        futuros = []
+
+        for url_nodo in self.listado_nodos:
+            if url_nodo in excluir or not self.esta_disponible(url_nodo):
+                continue
+
+            try:
+                futuros.append(self._pool.submit(
+                    self.enviar, url_nodo, ruta, datos))
+            except RuntimeError:
+                # Cliente ya cerrado al terminar la ejecución
+                break
+
+        return futuros
+
+    def repartir(self, funcion, nodos=None):
+        """Función para ejecutar una función sobre varios nodos a la vez
+
+        Args:
+            funcion (function): Recibe la URL de un nodo
+            nodos (list, optional): URLs de los nodos. Por defecto todo el listado.
+
+        Returns:
+            dict: Resultado o excepción de cada nodo, por URL
+        """
+
+        if nodos is None:
+            nodos = self.listado_nodos
+
+        futuros = {url_nodo: self._pool.submit(
+            funcion, url_nodo) for url_nodo in nodos}
+        resultados = {}
+
+        for url_nodo, futuro in futuros.items():
+            try:
+                resultados[url_nodo] = futuro.result()
+            except Exception as error:
+                resultados[url_nodo] = error
+
+        return resultados
+
+    def cerrar(self):
+        """Función para liberar los hilos y las conexiones
+        """
+
+        self._pool.shutdown(wait=True)
+
+        with self._lock:
+            for sesion in self._sesiones.values():
+                sesion.close()
+            self._sesiones = {}
@@ -0,0 +1,193 @@
+import gzip
+import json
+import threading
+from hashlib import sha256
+
+################################################
+# Parámetros de la caché de serialización
+################################################
+
+# Nivel de compresión gzip de las respuestas
+NIVEL_GZIP = 6
+# Bloques por trozo enviado en el flujo NDJSON
+TAMANO_TROZO = 64
+# Bloques por página del flujo NDJSON, por defecto y como máximo
+TAMANO_PAGINA = 1000
+MAXIMO_PAGINA = 10000
+# Bloques por página del explorador, por defecto y como máximo
+TAMANO_PAGINA_EXPLORADOR = 20
+MAXIMO_PAGINA_EXPLORADOR = 100
+# Segundos sin eventos tras los que se envía un comentario para mantener la conexión
+ESPERA_EVENTOS = 15
+
+
+def flujo_ndjson(bloques, tamano_trozo=TAMANO_TROZO):
+    """Función generadora de bloques en NDJSON, un bloque por línea, por trozos
+
+    Args:
+        bloques (list): Bloques a enviar
+        tamano_trozo (integer, optional): Bloques por trozo. Por defecto TAMANO_TROZO.
+
+    Yields:
+        bytes: Trozo de líneas NDJSON
+    """
+
+    for desde in range(0, len(bloques), tamano_trozo):
+        yield b"".join(json.dumps(bloque.a_dict(), separators=(',', ':'), ensure_ascii=False).encode() + b"\n"
+                       for bloque in bloques[desde:desde + tamano_trozo])
+
+
+def leer_ndjson(lineas):
+    """Función generadora que analiza un flujo NDJSON a medida que llega
+
+    Args:
+        lineas (iterable): Líneas en bytes, como las de requests.Response.iter_lines
+
+    Yields:
+        dict: Objeto JSON de cada línea
+    """
+
+    for linea in lineas:
+        if linea:
+            yield json.loads(linea)
+
+
+def evento_sse(evento, datos, id=None):
+    """Función para codificar un evento server-sent events con datos JSON
+
+    Args:
+        evento (string): Nombre del evento
+        datos (dict): Datos del evento
+        id (string, optional): Id del evento, el navegador lo reenvía al reconectar. Por defecto sin id.
+
+    Returns:
+        bytes: Evento codificado
+    """
+
+    cabecera = f"id: {id}\n" if id is not None else ""
+
+    return f"{cabecera}event: {evento}\ndata: {json.dumps(datos, separators=(',', ':'))}\n\n".encode()
+
+
+class CacheSerializacion:
+    def __init__(self, nivel_gzip=NIVEL_GZIP):
+        """Inicializador de la caché de serialización de la Blockchain propia: un fragmento JSON por bloque,
+        que crece al añadir bloques y se trunca en las reorganizaciones, y la respuesta completa del último estado
+
+        Args:
+            nivel_gzip (integer, optional): Nivel de compresión gzip. Por defecto NIVEL_GZIP.
+        """
+
+        self.nivel_gzip = nivel_gzip
+
+        # Bloque en JSON por altura
+        self._fragmentos = []
+        # Cambia con cada truncado, invalida las copias de la Blockchain anteriores
+        self.generacion = 0
+
+        # Respuesta del último estado (generación, longitud)
+        self._estado = None
+        self._cuerpo = None
+        self._etag = None
+        self._comprimido = None
+
+        # Las peticiones iguales a la vez esperan a una sola serialización
+        self._lock = threading.Lock()
+
+    def truncar(self, altura):
+        """Función para descartar los fragmentos desde una altura, tras una reorganización
+
+        Args:
+            altura (integer): Primera altura que ha cambiado
+        """
+
+        with self._lock:
+            if altura < len(self._fragmentos):
+                del self._fragmentos[altura:]
+                self.generacion += 1
+                self._estado = None
+
+    def actualizar(self, blockchain, desde, huerfanos=()):
+        """Función para descartar los fragmentos que han cambiado, los nuevos se serializan al pedirlos
+
+        Args:
+            blockchain (list): Blockchain propia
+            desde (integer): Primera altura que ha cambiado
+            huerfanos (list, optional): Bloques descartados. Por defecto ninguno.
+        """
+
+        self.truncar(desde)
+
+    def _extender(self, blockchain):
+        """Función para serializar los bloques que aún no tienen fragmento
+        """
+
+        for bloque in blockchain[len(self._fragmentos):]:
+            self._fragmentos.append(json.dumps(bloque.a_dict()).encode())
+
+    def fragmentos(self, blockchain, generacion, desde=0):
+        """Función para obtener los bloques serializados desde una altura
+
+        Args:
+            blockchain (list): Copia de la Blockchain propia
+            generacion (integer): Generación de la caché al copiar la Blockchain
+            desde (integer, optional): Primera altura. Por defecto 0.
+
+        Returns:
+            bytes: Listado JSON de los bloques
+        """
+
+        with self._lock:
+            # Copia anterior a una reorganización, se serializa sin caché
+            if generacion != self.generacion:
+                return json.dumps([bloque.a_dict() for bloque in blockchain[desde:]]).encode()
+
+            self._extender(blockchain)
+
+            return b"[" + b", ".join(self._fragmentos[desde:len(blockchain)]) + b"]"
+
+    def respuesta(self, blockchain, generacion, comprimir=False):
+        """Función para obtener la Blockchain serializada con su ETag, construida una sola vez por estado
+
+        Args:
+            blockchain (list): Copia de la Blockchain propia
+            generacion (integer): Generación de la caché al copiar la Blockchain
+            comprimir (bool, optional): Cuerpo comprimido con gzip. Por defecto False.
+
+        Returns:
+            bytes, string: Cuerpo y ETag fuerte del cuerpo
+        """
+
+        with self._lock:
+            estado = (generacion, len(blockchain))
+
+            if estado != self._estado:
+                if generacion != self.generacion:
+                    cuerpo = json.dumps([bloque.a_dict()
+                                        for bloque in blockchain]).encode()
+                    return self._codificar(cuerpo, sha256(cuerpo).hexdigest(), comprimir)
+
+                self._extender(blockchain)
+                self._cuerpo = b"[" + \
+                    b", ".join(self._fragmentos[:len(blockchain)]) + b"]"
+                self._etag = sha256(self._cuerpo).hexdigest()
+                self._comprimido = None
+                self._estado = estado
+
+            if comprimir and self._comprimido is None:
+                self._comprimido = gzip.compress(
+                    self._cuerpo, self.nivel_gzip)
+
+            return (self._comprimido, self._etag + "-gzip") if comprimir else (self._cuerpo, self._etag)
+
+    def _codificar(self, cuerpo, etag, comprimir):
+        """Función para comprimir, si se pide, una respuesta que no se guarda en caché
+
+        Returns:
+            bytes, string: Cuerpo y ETag fuerte del cuerpo
+        """
+
+        if comprimir:
+            return gzip.compress(cuerpo, self.nivel_gzip), etag + "-gzip"
+
+        return cuerpo, etag
@@ -0,0 +1,333 @@
+import sys
+import asyncio
+import threading
+import concurrent.futures
+from io import BytesIO
+
+from werkzeug.serving import make_server
+
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
+################################################
+# Parámetros del servidor del nodo
+################################################
+
+# Servidores disponibles: hilos de Werkzeug o ASGI sobre uvicorn
+SERVIDORES = ("werkzeug", "asgi")
+SERVIDOR_POR_DEFECTO = "werkzeug"
+# Hilos que ejecutan las rutas en el servidor ASGI
+TRABAJADORES_SERVIDOR = 32
+# Segundos de espera a las conexiones abiertas al detener el servidor ASGI
+ESPERA_DETENCION = 5
+
+
+def construir_entorno(scope, cuerpo):
+    """Función para construir el entorno WSGI de una petición HTTP ASGI
+
+    Args:
+        scope (dict): Scope ASGI de la petición
+        cuerpo (bytes): Cuerpo de la petición
+
+    Returns:
+        dict: Entorno WSGI
+    """
+
+    ruta_raiz = scope.get("root_path", "")
+    ruta = scope["path"]
+    if ruta.startswith(ruta_raiz):
+        ruta = ruta[len(ruta_raiz):]
+
+    servidor = scope.get("server") or ("localhost", 80)
+    entorno = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": ruta_raiz.encode("utf8").decode("latin1"),
+        "PATH_INFO": ruta.encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("ascii"),
+        "SERVER_NAME": servidor[0],
+        "SERVER_PORT": str(servidor[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": BytesIO(cuerpo),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+
+    if scope.get("client"):
+        entorno["REMOTE_ADDR"] = scope["client"][0]
+
+    for nombre, valor in scope.get("headers", []):
+        nombre = nombre.decode("latin1").upper().replace("-", "_")
+        valor = valor.decode("latin1")
+
+        if nombre not in ("CONTENT_LENGTH", "CONTENT_TYPE"):
+            nombre = "HTTP_" + nombre
+
+        entorno[nombre] = entorno[nombre] + "," + \
+            valor if nombre in entorno else valor
+
+    return entorno
+
+
+async def esperar_desconexion(receive):
+    """Función para esperar a que se desconecte el cliente de una petición ASGI
+
+    Args:
+        receive (function): Canal de mensajes del cliente
+    """
+
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+class AvisoAsincrono:
+    def __init__(self):
+        """Inicializador del aviso de cambios para corrutinas: se activa desde cualquier hilo,
+        por ejemplo como observador de la Blockchain, y despierta a las que esperan en el bucle de eventos
+        """
+
+        # (bucle, evento) de cada suscripción
+        self._suscripciones = set()
+        self._lock = threading.Lock()
+
+    def suscribir(self):
+        """Función para suscribirse a los avisos desde una corrutina
+
+        Returns:
+            asyncio.Event: Evento que se activa con cada aviso, se limpia antes de consultar los cambios
+        """
+
+        evento = asyncio.Event()
+
+        with self._lock:
+            self._suscripciones.add((asyncio.get_running_loop(), evento))
+
+        return evento
+
+    def cancelar(self, evento):
+        """Función para cancelar una suscripción
+
+        Args:
+            evento (asyncio.Event): Evento de la suscripción
+        """
+
+        with self._lock:
+            self._suscripciones = {suscripcion for suscripcion in self._suscripciones
+                                   if suscripcion[1] is not evento}
+
+    def avisar(self, *args):
+        """Función para despertar a los suscritos, no bloquea al hilo que avisa
+        """
+
+        with self._lock:
+            suscripciones = list(self._suscripciones)
+
+        for bucle, evento in suscripciones:
+            try:
+                bucle.call_soon_threadsafe(evento.set)
+            except RuntimeError:
+                # Bucle ya cerrado al detener el servidor
+                pass
+
+
+################################################
+# Aplicación ASGI
+################################################
+
+
+class AplicacionAsgi:
+    def __init__(self, aplicacion, trabajadores=TRABAJADORES_SERVIDOR, rutas_asincronas=None):
+        """Inicializador del adaptador ASGI de la aplicación Flask: cada ruta se ejecuta
+        en un pool de hilos y el envío al cliente lo hace el bucle de eventos, de forma que
+        un cliente lento no ocupa un hilo mientras recibe la respuesta. Los flujos que esperan
+        sin límite, como los eventos del explorador, se atienden en el bucle con rutas asíncronas.
+
+        Args:
+            aplicacion (Flask): Aplicación WSGI del nodo
+            trabajadores (integer, optional): Hilos que ejecutan las rutas. Por defecto TRABAJADORES_SERVIDOR.
+            rutas_asincronas (dict, optional): Ruta GET -> aplicación ASGI que la atiende en lugar de Flask. Por defecto ninguna.
+        """
+
+        self.aplicacion = aplicacion
+        self.trabajadores = max(1, trabajadores)
+        self.rutas_asincronas = rutas_asincronas or {}
+        self._pool = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._ciclo_de_vida(receive, send)
+        elif scope["type"] == "http":
+            ruta = self.rutas_asincronas.get(scope["path"])
+
+            if ruta is not None and scope["method"] == "GET":
+                await ruta(scope, receive, send)
+            else:
+                await self._atender(scope, receive, send)
+
+    async def _ciclo_de_vida(self, receive, send):
+        """Función para crear el pool de hilos al arrancar el servidor y liberarlo al detenerlo
+        """
+
+        while True:
+            mensaje = await receive()
+
+            if mensaje["type"] == "lifespan.startup":
+                self._pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.trabajadores, thread_name_prefix="servidor")
+                await send({"type": "lifespan.startup.complete"})
+
+            elif mensaje["type"] == "lifespan.shutdown":
+                # Las rutas aún en curso, como los flujos de eventos, no se esperan
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _atender(self, scope, receive, send):
+        """Función para atender una petición HTTP con la aplicación Flask
+        """
+
+        bucle = asyncio.get_running_loop()
+
+        # 1 - Cuerpo completo de la petición
+        partes = []
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "http.disconnect":
+                return
+            partes.append(mensaje.get("body", b""))
+            if not mensaje.get("more_body"):
+                break
+
+        # 2 - Ruta en un hilo del pool, hasta el primer trozo de la respuesta
+        estado, cabeceras, primero, iterador, salida = await bucle.run_in_executor(
+            self._pool, self._ejecutar, construir_entorno(scope, b"".join(partes)))
+
+        # El envío a un cliente desconectado no falla, se vigila aparte para cortar los flujos
+        desconectado = asyncio.Event()
+        vigilancia = asyncio.ensure_future(
+            self._vigilar_desconexion(receive, desconectado))
+
+        try:
+            await send({"type": "http.response.start", "status": estado, "headers": cabeceras})
+
+            # 3 - Resto de trozos, uno a uno para no acumular respuestas en streaming
+            while primero is not None and not desconectado.is_set():
+                await send({"type": "http.response.body", "body": primero, "more_body": True})
+                primero = await bucle.run_in_executor(self._pool, self._siguiente, iterador)
+
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            vigilancia.cancel()
+
+            if hasattr(salida, "close"):
+                try:
+                    self._pool.submit(salida.close)
+                except RuntimeError:
+                    # Pool ya liberado al detener el servidor
+                    pass
+
+    async def _vigilar_desconexion(self, receive, desconectado):
+        """Función para marcar cuándo se desconecta el cliente
+        """
+
+        await esperar_desconexion(receive)
+        desconectado.set()
+
+    def _ejecutar(self, entorno):
+        """Función para ejecutar la aplicación Flask en un hilo del pool
+
+        Returns:
+            integer, list, bytes, iterator, iterable: Estado, cabeceras, primer trozo, resto de trozos y salida a cerrar
+        """
+
+        respuesta = {}
+
+        def iniciar_respuesta(estado, cabeceras, exc_info=None):
+            respuesta["estado"] = int(estado.split(" ", 1)[0])
+            respuesta["cabeceras"] = [(nombre.lower().encode("latin1"), valor.encode("latin1"))
+                                      for nombre, valor in cabeceras]
+
+        salida = self.aplicacion(entorno, iniciar_respuesta)
+        iterador = iter(salida)
+        primero = self._siguiente(iterador)
+
+        return respuesta["estado"], respuesta["cabeceras"], primero, iterador, salida
+
+    def _siguiente(self, iterador):
+        """Función para obtener el siguiente trozo no vacío de la respuesta
+
+        Returns:
+            bytes: Trozo, None al terminar
+        """
+
+        for trozo in iterador:
+            if trozo:
+                return trozo
+
+        return None
+
+
+################################################
+# Servidor del nodo
+################################################
+
+
+class ServidorNodo:
+    def __init__(self, aplicacion, puerto, host="0.0.0.0", servidor=SERVIDOR_POR_DEFECTO, trabajadores=TRABAJADORES_SERVIDOR, rutas_asincronas=None):
+        """Inicializador del servidor HTTP del nodo
+
+        Args:
+            aplicacion (Flask): Aplicación del nodo
+            puerto (integer): Puerto de escucha
+            host (string, optional): Dirección de escucha. Por defecto todas.
+            servidor (string, optional): Servidor: werkzeug, asgi. Por defecto SERVIDOR_POR_DEFECTO.
+            trabajadores (integer, optional): Hilos que ejecutan las rutas en el servidor ASGI. Por defecto TRABAJADORES_SERVIDOR.
+            rutas_asincronas (dict, optional): Rutas atendidas en el bucle de eventos del servidor ASGI. Por defecto ninguna.
+        """
+
+        if servidor not in SERVIDORES:
+            raise ValueError(f"Servidor desconocido: {servidor}")
+
+        if servidor == "asgi" and uvicorn is None:
+            raise ValueError("El servidor asgi necesita tener uvicorn instalado")
+
+        self.servidor = servidor
+
+        if servidor == "asgi":
+            configuracion = uvicorn.Config(AplicacionAsgi(aplicacion, trabajadores, rutas_asincronas), host=host, port=puerto,
+                                           lifespan="on", log_level="warning", access_log=False,
+                                           timeout_graceful_shutdown=ESPERA_DETENCION)
+            self._servidor = uvicorn.Server(configuracion)
+        else:
+            self._servidor = make_server(
+                host, puerto, aplicacion, threaded=True)
+
+        self._iniciado = threading.Event()
+
+    def iniciar(self):
+        """Función para atender peticiones hasta que se detenga el servidor
+        """
+
+        self._iniciado.set()
+
+        if self.servidor == "asgi":
+            self._servidor.run()
+        else:
+            self._servidor.serve_forever()
+
+    def detener(self):
+        """Función para detener el servidor, desde otro hilo
+        """
+
+        if not self._iniciado.is_set():
+            return
+
+        if self.servidor == "asgi":
+            self._servidor.should_exit = True
+        else:
+            self._servidor.shutdown()
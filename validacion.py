@@ -0,0 +1,198 @@
+import time
+import struct
+import concurrent.futures
+
+from firmas import verificar_firma, mensaje_campos
+from indices import campos_transaccion
+from mempool import EMISOR_RED
+
+################################################
+# Parámetros de validación en paralelo
+################################################
+
+# Bloques enviados a cada tarea del pool
+TAMANO_TRAMO = 256
+# Bloques nuevos a partir de los cuales compensa validar en paralelo
+UMBRAL_PARALELO = 1024
+
+
+def motivo_invalidez(bloque, dificultad, transacciones=False):
+    """Función para comprobar un bloque por sí solo, sin sus enlaces con otros bloques
+
+    Args:
+        bloque (Bloque): Bloque a comprobar
+        dificultad (integer): Dificultad de la Blockchain
+        transacciones (bool, optional): Comprobar también la raíz Merkle y las firmas. Por defecto False.
+
+    Returns:
+        string: Motivo por el que no es válido, None si es válido
+    """
+
+    # La dificultad declarada da el trabajo del bloque en el consenso, debe ser la de la Blockchain
+    try:
+        if bloque.cabecera["dificultad"] != dificultad:
+            return "Dificultad no válida"
+    except (TypeError, KeyError):
+        return "Bloque mal formado"
+
+    # El génesis tiene valores preestablecidos que no cumplen la prueba de trabajo
+    if bloque.indice == 0:
+        return None
+
+    try:
+        if not bloque.hash.startswith('0' * dificultad) or bloque.hash != bloque.hash_cabecera():
+            return "Prueba de trabajo no válida"
+
+        if not transacciones:
+            return None
+
+        if bloque.raiz_merkle_transacciones() != bloque.cabecera["raiz_merkle"]:
+            return "Raíz Merkle no válida"
+    except (ValueError, TypeError, KeyError, struct.error):
+        return "Bloque mal formado"
+
+    # Cabecera antigua en texto: las cadenas antiguas no guardaban la firma en la transacción
+    firma_obligatoria = bloque.cabecera["version"] != 1
+
+    # Toda transacción que no emite la red lleva la firma de su emisor sobre su contenido
+    for posicion, transaccion in enumerate(bloque.transacciones):
+        campos = campos_transaccion(transaccion)
+
+        if campos.get("de") == EMISOR_RED:
+            continue
+
+        if "firma" not in campos:
+            if firma_obligatoria:
+                return f"Falta la firma en la transacción {posicion}"
+            continue
+
+        if not verificar_firma(campos.get("de", ""), campos["firma"], mensaje_campos(campos)):
+            return f"Firma no válida en la transacción {posicion}"
+
+    return None
+
+
+def validar_tramo(bloques, dificultad, transacciones):
+    """Función para comprobar un tramo de bloques en un proceso del pool
+
+    Args:
+        bloques (list): Bloques a comprobar
+        dificultad (integer): Dificultad de la Blockchain
+        transacciones (bool): Comprobar también la raíz Merkle y las firmas
+
+    Returns:
+        integer, list: Bloques comprobados y errores (índice, motivo)
+    """
+
+    errores = []
+
+    for bloque in bloques:
+        motivo = motivo_invalidez(bloque, dificultad, transacciones)
+        if motivo is not None:
+            errores.append((bloque.indice, motivo))
+
+    return len(bloques), errores
+
+
+def son_enlaces_validos(bloques, hash_previo=None):
+    """Función para comprobar en orden los índices y el hash previo de unos bloques consecutivos
+
+    Args:
+        bloques (list): Bloques consecutivos
+        hash_previo (string, optional): Hash del bloque anterior al primero. Por defecto no se comprueba el primero.
+
+    Returns:
+        integer: Índice del primer bloque mal enlazado, None si todos enlazan
+    """
+
+    for posicion, bloque in enumerate(bloques):
+        if posicion > 0 and bloque.indice != bloques[posicion - 1].indice + 1:
+            return bloque.indice
+        if hash_previo is not None and bloque.cabecera["hash_previo"] != hash_previo:
+            return bloque.indice
+        hash_previo = bloque.hash
+
+    return None
+
+
+################################################
+# Validador de Blockchains
+################################################
+
+
+class ValidadorBlockchain:
+    def __init__(self, trabajadores=1, tamano_tramo=TAMANO_TRAMO):
+        """Inicializador del validador: enlaces en orden y hashes y firmas por tramos en paralelo
+
+        Args:
+            trabajadores (integer, optional): Número de procesos de validación. Por defecto 1.
+            tamano_tramo (integer, optional): Bloques por tarea. Por defecto TAMANO_TRAMO.
+        """
+
+        self.trabajadores = max(1, trabajadores)
+        self.tamano_tramo = tamano_tramo
+        self._pool = None
+
+    def validar(self, bloques, dificultad, transacciones=False, hash_previo=None, enlaces=True, progreso=None):
+        """Función para validar bloques consecutivos
+
+        Args:
+            bloques (list): Bloques consecutivos a validar
+            dificultad (integer): Dificultad de la Blockchain
+            transacciones (bool, optional): Comprobar también la raíz Merkle y las firmas. Por defecto False.
+            hash_previo (string, optional): Hash del bloque anterior al primero. Por defecto no se comprueba.
+            enlaces (bool, optional): Comprobar los enlaces, no con bloques sueltos. Por defecto True.
+            progreso (function, optional): Recibe bloques validados, total y bloques por segundo. Por defecto ninguna.
+
+        Returns:
+            dict: Bloques, segundos, bloques por segundo y errores (índice, motivo) en orden de altura
+        """
+
+        inicio = time.time()
+        errores = []
+
+        # 1 - Enlaces en orden, baratos y secuenciales
+        mal_enlazado = son_enlaces_validos(
+            bloques, hash_previo) if enlaces else None
+        if mal_enlazado is not None:
+            errores.append((mal_enlazado, "Enlace con el bloque anterior no válido"))
+
+        # 2 - Hashes y firmas por tramos
+        tramos = [bloques[desde:desde + self.tamano_tramo]
+                  for desde in range(0, len(bloques), self.tamano_tramo)]
+        validados = 0
+
+        if self.trabajadores == 1 or len(tramos) <= 1:
+            resultados = (validar_tramo(tramo, dificultad, transacciones)
+                          for tramo in tramos)
+        else:
+            if self._pool is None:
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.trabajadores)
+
+            futuros = [self._pool.submit(validar_tramo, tramo, dificultad, transacciones)
+                       for tramo in tramos]
+            resultados = (futuro.result()
+                          for futuro in concurrent.futures.as_completed(futuros))
+
+        for cantidad, errores_tramo in resultados:
+            validados += cantidad
+            errores.extend(errores_tramo)
+
+            if progreso is not None:
+                progreso(validados, len(bloques), validados /
+                         max(time.time() - inicio, 1e-9))
+
+        segundos = time.time() - inicio
+        errores.sort()
+
+        return {"bloques": len(bloques), "segundos": round(segundos, 3),
+                "bloques_por_segundo": round(len(bloques) / max(segundos, 1e-9)), "errores": errores}
+
+    def cerrar(self):
+        """Función para liberar el pool de procesos
+        """
+
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None